@@ -5,17 +5,26 @@ for the plpipes framework.
 Action drivers are responsible for executing specific types of actions defined
 within the project. The supported action drivers include simple actions, SQL
 actions, downloading actions, quarto processing, file downloading, archive
-unpacking, and loop actions.
+unpacking, loop actions and DAGs of actions run in parallel.
 
+Driver modules are only imported when an action of some of their types
+is used, so that the dependencies of the unused ones do not slow down
+the startup.
 """
 
-from .driver import simple
-from .driver import sql
-from .driver import downloader
-from .driver import quarto
-from .driver import file_downloader
-from .driver import archive_unpacker
-from .driver import loop
+from .registry import register_lazy
+
+register_lazy("python_script", "plpipes.action.driver.simple", "py")
+register_lazy("sequence", "plpipes.action.driver.simple", "dir")
+register_lazy("sql_script", "plpipes.action.driver.sql", "sql")
+register_lazy("sql_table_creator", "plpipes.action.driver.sql", "table_sql", "table.sql")
+register_lazy("sql_view_creator", "plpipes.action.driver.sql", "view_sql", "view.sql")
+register_lazy("downloader", "plpipes.action.driver.downloader")
+register_lazy("quarto", "plpipes.action.driver.quarto", "qmd")
+register_lazy("file_downloader", "plpipes.action.driver.file_downloader")
+register_lazy("archive_unpacker", "plpipes.action.driver.archive_unpacker")
+register_lazy("loop", "plpipes.action.driver.loop")
+register_lazy("dag", "plpipes.action.driver.dag")
 
 # import the runner
 from .runner import run
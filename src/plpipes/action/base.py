@@ -1,6 +1,24 @@
 import logging
 import time
 import re
+from contextlib import nullcontext
+
+from plpipes.config import cfg, record_access
+from plpipes.action import buildstate
+from plpipes.profiling import action_stats
+from plpipes.database.tablecache import action_formats
+
+def _parse_table_refs(refs):
+    """
+    Converts a list of table references as `table` or `db:table` into a set of (db, table) tuples.
+    """
+    if isinstance(refs, str):
+        refs = [refs]
+    parsed = set()
+    for ref in refs:
+        db, _, table = ref.rpartition(":")
+        parsed.add((db or "work", table))
+    return parsed
 
 class Action:
     """
@@ -56,20 +74,98 @@ class Action:
         """
         ...
 
+    def table_references(self):
+        """
+        Returns the tables read and written by the action.
+
+        By default, they are taken from the `reads` and `writes` entries
+        of the action configuration. Every entry is a table name in the
+        `work` database or `db:table` for tables in other database
+        instances. Drivers able to find out the tables by themselves
+        (i.e. SQL actions) extend this method.
+
+        Returns:
+            tuple: A pair of sets (reads, writes) of (db, table) tuples.
+        """
+        return (_parse_table_refs(self._cfg.get("reads", [])),
+                _parse_table_refs(self._cfg.get("writes", [])))
+
+    def fingerprint(self):
+        """
+        Returns a string identifying the inputs of the action.
+
+        It is used for skipping the action on incremental runs (see
+        `plpipes.action.buildstate`) when neither the fingerprint, the
+        configuration entries read by the action nor the tables it reads
+        have changed since the last run.
+
+        Returns:
+            str: The fingerprint or None when the action inputs can not be
+            determined. In that case the action is always run.
+
+        Raises:
+            UnhashableValueError: When the action configuration contains
+            values that can not be fingerprinted. The action is always
+            run in that case too.
+        """
+        return None
+
+    def _fingerprint_hash(self, *paths):
+        """
+        Returns a hash object initialized with the action type, configuration and the contents of the given files.
+
+        Args:
+            *paths: The action source files.
+
+        Returns:
+            hashlib object: The hash object.
+        """
+        h = buildstate.hash_files(*paths)
+        h.update(type(self).__name__.encode("utf8"))
+        h.update(buildstate.canonical_json(self._cfg.to_tree()).encode("utf8"))
+        return h
+
     def run(self, indent=0):
         """
         Executes the action and logs its execution time.
 
+        On incremental runs, the action is skipped when it is up to date.
+        Statistics about the run are collected when `run.stats` or
+        `run.profile` are enabled (see `plpipes.profiling`).
+
         Args:
             indent (int): The indentation level for logging.
         """
         name = self.name()
+
+        state = buildstate.build_state()
+        if state is not None:
+            fingerprint = None
+            if self._cfg.get("incremental", True):
+                try:
+                    fingerprint = self.fingerprint()
+                except buildstate.UnhashableValueError as ex:
+                    logging.debug(f"Action {name} can not be fingerprinted, it will be run: {ex}")
+            reads, writes = self.table_references()
+            reads = reads - writes
+            if (fingerprint is not None and
+                not cfg.get("run.force", False) and
+                state.up_to_date_p(name, fingerprint, reads)):
+                logging.info(f"{' '*indent}Action {name} is up to date, skipping it")
+                return
+
         logging.info(f"{' '*indent}Action {name} started")
         start = time.time()
-        self._do_it(indent=indent)
+        with action_stats(name), record_access() as config_used, \
+             action_formats(self._cfg.to_tree("table_cache")), \
+             (buildstate.tracking_writes() if state is not None else nullcontext(set())) as written:
+            self._do_it(indent=indent)
         lapse = int(10 * (time.time() - start) + 0.5) / 10.0
         logging.info(f"{' '*indent}Action {name} done ({lapse}s)")
 
+        if state is not None:
+            state.record(name, fingerprint, config_used, reads, writes | written)
+
     def __str__(self):
         """
         Returns a string representation of the Action instance.
@@ -0,0 +1,301 @@
+"""
+This module implements the persistent build state used for incremental runs.
+
+When `run.incremental` is enabled, after every successful action run
+the following data is stored in a SQLite database under the `work`
+directory:
+
+- The action fingerprint (see `Action.fingerprint`).
+- The configuration entries read by the action and their values.
+- The versions of the tables read by the action.
+
+Also, a new version is assigned to every table written by the
+action, either declared in its `writes` entry or changed through the
+`Transaction` methods while it runs (see `note_write`), so that
+actions not declaring their targets (i.e. Python scripts) also
+invalidate the actions reading their tables.
+
+In later runs, an action whose fingerprint, configuration entries and
+upstream table versions are unchanged is skipped, make-style. Tables
+without a known version (i.e. loaded from outside the project) are
+always considered changed.
+"""
+
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import pathlib
+import sqlite3
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+
+from plpipes.config import cfg, accessed_value
+
+_SCHEMA = """
+create table if not exists action_state (
+    name text primary key,
+    fingerprint text not null,
+    config text not null,
+    upstream text not null,
+    updated_at real not null
+);
+create table if not exists table_version (
+    ref text primary key,
+    version text not null,
+    action text,
+    updated_at real not null
+);
+"""
+
+# Sets collecting the tables written by the actions being run:
+_written_tables = contextvars.ContextVar("plpipes.action.buildstate.written_tables", default=())
+
+@contextmanager
+def tracking_writes():
+    """
+    Context manager collecting the tables changed through `Transaction`
+    methods inside it.
+
+    Yields a set which is filled with (db, table) tuples. When nested,
+    the tables are also added to the outer sets.
+    """
+    tables = set()
+    token = _written_tables.set(_written_tables.get() + (tables,))
+    try:
+        yield tables
+    finally:
+        _written_tables.reset(token)
+
+def tracking_writes_p():
+    """
+    Checks whether the tables written are being collected.
+    """
+    return bool(_written_tables.get())
+
+_replaced_tables = contextvars.ContextVar("plpipes.action.buildstate.replaced_tables", default=())
+
+@contextmanager
+def tracking_replacements():
+    """
+    Context manager collecting the tables replaced (created with
+    `if_exists="replace"` or dropped) through `Transaction` methods
+    inside it.
+
+    Yields a set which is filled with (db, table) tuples.
+    """
+    tables = set()
+    token = _replaced_tables.set(_replaced_tables.get() + (tables,))
+    try:
+        yield tables
+    finally:
+        _replaced_tables.reset(token)
+
+def note_write(db, table_name, replace=False):
+    """
+    Records that the given table has been changed, see `tracking_writes`.
+
+    Args:
+        db (str): The database instance name.
+        table_name (str): The table name.
+        replace (bool, optional): Whether the previous contents of the
+            table have been discarded, see `tracking_replacements`.
+    """
+    for tables in _written_tables.get():
+        tables.add((db, table_name))
+    if replace:
+        for tables in _replaced_tables.get():
+            tables.add((db, table_name))
+
+class UnhashableValueError(ValueError):
+    """
+    Raised when some value can not be represented in a fingerprint.
+    """
+
+def _json_default(obj):
+    # Types are tagged so that, for instance, a date and its ISO
+    # representation as a string do not compare equal.
+    if isinstance(obj, (datetime.date, datetime.time)):
+        value = obj.isoformat()
+    elif isinstance(obj, pathlib.PurePath):
+        value = str(obj)
+    elif isinstance(obj, (set, frozenset)):
+        value = sorted(canonical_json(e) for e in obj)
+    elif isinstance(obj, bytes):
+        value = obj.hex()
+    elif isinstance(obj, decimal.Decimal):
+        value = str(obj)
+    else:
+        raise UnhashableValueError(f"Value of type {type(obj).__name__} can not be fingerprinted")
+    return {"__type__": type(obj).__name__, "value": value}
+
+def canonical_json(obj):
+    """
+    Serializes the given value into a canonical JSON representation.
+
+    Besides the JSON types, dates, times, paths, sets, bytes and
+    decimals are supported.
+
+    Raises:
+        UnhashableValueError: When the value contains objects of other types.
+    """
+    return json.dumps(obj, sort_keys=True, default=_json_default)
+
+def hash_files(*paths):
+    """
+    Calculates a hash for the contents of the given files.
+
+    Args:
+        *paths: The file paths.
+
+    Returns:
+        hashlib object: An unfinished sha256 hash object which can be further updated.
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(str(path).encode("utf8"))
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h
+
+def _ref_key(ref):
+    db, table = ref
+    return f"{db}:{table.lower()}"
+
+class BuildState:
+    """
+    Persistent store of the state of the actions run.
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the build state stored in the given file.
+
+        Args:
+            path (pathlib.Path): The SQLite database file.
+        """
+        self._path = pathlib.Path(path)
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=60)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _versions(self, conn, refs):
+        versions = {}
+        for ref in refs:
+            key = _ref_key(ref)
+            row = conn.execute("select version from table_version where ref = ?", (key,)).fetchone()
+            versions[key] = row[0] if row else None
+        return versions
+
+    def up_to_date_p(self, name, fingerprint, reads):
+        """
+        Checks whether an action can be skipped.
+
+        Args:
+            name (str): The action name.
+            fingerprint (str): The current action fingerprint.
+            reads (set): (db, table) tuples for the tables read by the action.
+
+        Returns:
+            bool: True when nothing has changed since the last successful run.
+        """
+        with self._connect() as conn:
+            row = conn.execute("select fingerprint, config, upstream from action_state where name = ?",
+                               (name,)).fetchone()
+            if row is None:
+                logging.debug(f"Action {name} has never been run before")
+                return False
+            last_fingerprint, config, upstream = row
+            if last_fingerprint != fingerprint:
+                logging.debug(f"Action {name} fingerprint has changed")
+                return False
+            versions = self._versions(conn, reads)
+            if None in versions.values():
+                unknown = sorted(k for k, v in versions.items() if v is None)
+                logging.debug(f"Tables read by action {name} with unknown version: {', '.join(unknown)}")
+                return False
+            if json.loads(upstream) != versions:
+                logging.debug(f"Some table read by action {name} has changed")
+                return False
+        for key, value in json.loads(config).items():
+            try:
+                changed = canonical_json(accessed_value(key)) != canonical_json(value)
+            except UnhashableValueError:
+                changed = True
+            if changed:
+                logging.debug(f"Configuration entry {key} used by action {name} has changed")
+                return False
+        return True
+
+    def record(self, name, fingerprint, config, reads, writes):
+        """
+        Records a successful action run.
+
+        Args:
+            name (str): The action name.
+            fingerprint (str): The action fingerprint. When None, only the versions of the tables written are updated.
+            config (dict): The configuration entries read by the action as returned by `plpipes.config.record_access`.
+            reads (set): (db, table) tuples for the tables read by the action.
+            writes (set): (db, table) tuples for the tables written by the action.
+        """
+        now = time.time()
+        if fingerprint is not None:
+            try:
+                config = canonical_json(config)
+            except UnhashableValueError as ex:
+                logging.debug(f"Action {name} read configuration entries that can not be fingerprinted: {ex}")
+                fingerprint = None
+        with self._connect() as conn:
+            if fingerprint is None:
+                conn.execute("delete from action_state where name = ?", (name,))
+            else:
+                upstream = self._versions(conn, reads)
+                conn.execute("insert or replace into action_state (name, fingerprint, config, upstream, updated_at) "
+                             "values (?, ?, ?, ?, ?)",
+                             (name, fingerprint, config,
+                              json.dumps(upstream, sort_keys=True), now))
+            for ref in writes:
+                conn.execute("insert or replace into table_version (ref, version, action, updated_at) values (?, ?, ?, ?)",
+                             (_ref_key(ref), uuid.uuid4().hex, name, now))
+
+    def reset(self, name=None):
+        """
+        Forgets the state of the given action or of all the actions.
+
+        Args:
+            name (str, optional): The action name. When None, the full state is discarded.
+        """
+        with self._connect() as conn:
+            if name is None:
+                conn.execute("delete from action_state")
+            else:
+                conn.execute("delete from action_state where name = ?", (name,))
+
+_build_state = None
+
+def build_state():
+    """
+    Returns the build state object when incremental runs are enabled.
+
+    Returns:
+        BuildState: The build state or None when `run.incremental` is not set.
+    """
+    global _build_state
+    if not cfg.get("run.incremental", False):
+        return None
+    if _build_state is None:
+        fn = cfg.get("run.build_state_file", "plpipes-build-state.sqlite")
+        _build_state = BuildState(pathlib.Path(cfg["fs.work"]) / fn)
+    return _build_state
@@ -0,0 +1,183 @@
+"""
+This module implements the detection of dependencies between actions.
+
+Every action reports the tables it reads and writes (see
+`Action.table_references`) and, from that information, a graph is
+built where an action depends on another when it reads some table
+written by it.
+"""
+
+import logging
+import pathlib
+
+from plpipes.action.index import action_index
+
+def _normalize_ref(ref):
+    db, table = ref
+    return (db, table.lower())
+
+class DependencyGraph:
+    """
+    Graph of the dependencies between actions derived from the tables they read and write.
+    """
+
+    def __init__(self):
+        """Initializes an empty graph."""
+        self._reads = {}
+        self._writes = {}
+        self._writers = {}
+        self._deps = None
+
+    def add_action(self, name, reads, writes):
+        """
+        Adds an action to the graph.
+
+        Args:
+            name (str): The full action name.
+            reads (set): (db, table) tuples for the tables read by the action.
+            writes (set): (db, table) tuples for the tables written by the action.
+        """
+        reads = {_normalize_ref(r) for r in reads}
+        writes = {_normalize_ref(w) for w in writes}
+        self._reads[name] = reads
+        self._writes[name] = writes
+        for ref in writes:
+            self._writers.setdefault(ref, set()).add(name)
+        self._deps = None
+
+    def __contains__(self, name):
+        return name in self._reads
+
+    def actions(self):
+        """
+        Returns the names of the actions in the graph.
+        """
+        return list(self._reads)
+
+    def reads(self, name):
+        """
+        Returns the tables read by the given action as (db, table) tuples.
+        """
+        return self._reads[name]
+
+    def writes(self, name):
+        """
+        Returns the tables written by the given action as (db, table) tuples.
+        """
+        return self._writes[name]
+
+    def writers(self, db, table):
+        """
+        Returns the names of the actions writing into the given table.
+        """
+        return set(self._writers.get(_normalize_ref((db, table)), ()))
+
+    def _dependencies(self):
+        if self._deps is None:
+            self._deps = {name: {writer
+                                 for ref in reads
+                                 for writer in self._writers.get(ref, ())
+                                 if writer != name}
+                          for name, reads in self._reads.items()}
+        return self._deps
+
+    def dependencies(self, name):
+        """
+        Returns the names of the actions the given one depends on directly.
+        """
+        return set(self._dependencies()[name])
+
+    def dependants(self, name):
+        """
+        Returns the names of the actions depending directly on the given one.
+        """
+        return {other for other, deps in self._dependencies().items() if name in deps}
+
+    def _closure(self, names, step):
+        seen = set()
+        queue = list(names)
+        while queue:
+            for next_name in step(queue.pop()):
+                if next_name not in seen:
+                    seen.add(next_name)
+                    queue.append(next_name)
+        return seen - set(names)
+
+    def upstream(self, names):
+        """
+        Returns the names of all the actions the given ones depend on, directly or indirectly.
+        """
+        return self._closure(names, self.dependencies)
+
+    def downstream(self, names):
+        """
+        Returns the names of all the actions depending on the given ones, directly or indirectly.
+        """
+        return self._closure(names, self.dependants)
+
+    def sorted(self, names=None):
+        """
+        Sorts actions so that every one comes after its dependencies.
+
+        Args:
+            names (iterable, optional): The actions to sort. Defaults to all the actions in the graph.
+
+        Returns:
+            list: The sorted action names. Ties are broken alphabetically.
+
+        Raises:
+            ValueError: If the dependencies contain a cycle.
+        """
+        names = set(self.actions() if names is None else names)
+        deps = {name: self.dependencies(name) & names for name in names}
+        result = []
+        while deps:
+            ready = sorted(name for name, d in deps.items() if not d)
+            if not ready:
+                raise ValueError(f"Dependency cycle detected between actions {', '.join(sorted(deps))}")
+            for name in ready:
+                del deps[name]
+            for d in deps.values():
+                d.difference_update(ready)
+            result += ready
+        return result
+
+def _scan_action_names(actions_dir, suffixes):
+    """
+    Finds the names of all the actions stored under the actions directory.
+
+    Args:
+        actions_dir (pathlib.Path): The actions directory.
+        suffixes (set): The file suffixes associated to action types.
+
+    Returns:
+        list: The action names.
+    """
+    return action_index(actions_dir).names(suffixes)
+
+def build_dependency_graph(actions_dir, lookup, suffixes):
+    """
+    Scans the actions directory and builds the dependency graph for all the actions found.
+
+    Actions that fail to load or that do not reference any table are
+    not included in the graph.
+
+    Args:
+        actions_dir (pathlib.Path): The actions directory.
+        lookup (callable): Function returning the action object for a given name.
+        suffixes (set): The file suffixes associated to action types.
+
+    Returns:
+        DependencyGraph: The dependency graph.
+    """
+    graph = DependencyGraph()
+    for name in _scan_action_names(pathlib.Path(actions_dir), suffixes):
+        try:
+            reads, writes = lookup(name).table_references()
+        except Exception as ex:
+            logging.warning(f"Unable to find out the tables referenced by action {name}: {ex}")
+            continue
+        if reads or writes:
+            logging.debug(f"Action {name} reads {reads} and writes {writes}")
+            graph.add_action(name, reads, writes)
+    return graph
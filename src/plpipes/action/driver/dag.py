@@ -0,0 +1,287 @@
+"""
+This module implements the `dag` action driver.
+
+A `dag` action runs a set of child actions honoring the dependencies
+declared between them (the `depends_on` entry in every child action
+configuration, or the ones inferred from the tables they read and
+write when `infer_dependencies` is set) and dispatching the ones that
+are ready to a pool of thread or process workers.
+
+Writes into databases that can not handle concurrent writers (i.e.
+SQLite or DuckDB files) are serialized by the scheduler.
+"""
+
+import logging
+import contextvars
+import concurrent.futures
+
+from plpipes.config import cfg
+from plpipes.action.base import Action
+from plpipes.action.registry import register_class
+from plpipes.action.runner import lookup, resolve_action_name
+from plpipes.action.dependencies import DependencyGraph
+from plpipes.exceptions import ActionError
+import plpipes.database
+
+def _as_list(value):
+    """
+    Normalizes a configuration entry that may be a single string or a list of strings.
+
+    Args:
+        value: None, a string or a list of strings.
+
+    Returns:
+        list: The entry as a list.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+def action_write_dbs(action):
+    """
+    Returns the database instances an action writes into.
+
+    They are taken from the `writes_db` entry of the action
+    configuration. Otherwise, from the tables the action reports as
+    written (declared in the `writes` entry or, for SQL actions,
+    inferred from the SQL code) and, as a last resort, from the
+    `target_db` entry, which defaults to `work`.
+
+    Actions not declaring their targets are assumed to write into
+    `work`, so when it is a file based database they are never run
+    concurrently.
+
+    Args:
+        action (Action): The action.
+
+    Returns:
+        list: The database instance names.
+    """
+    acfg = action._cfg
+    if "writes_db" in acfg:
+        return _as_list(acfg["writes_db"])
+    _, writes = action.table_references()
+    if writes:
+        return sorted({db for db, _ in writes})
+    if "target_db" not in acfg:
+        logging.debug(f"Action {action.name()} does not declare the databases it writes into, assuming work")
+    return [acfg.get("target_db", "work")]
+
+def _run_action(name):
+    """
+    Looks up and runs an action by name. Used as the worker entry point.
+
+    Args:
+        name (str): The full name of the action.
+    """
+    try:
+        lookup(name).run()
+    finally:
+        plpipes.database.release_thread()
+
+def _init_process_worker(tree):
+    """
+    Initializes the configuration of a process worker.
+
+    When the pool uses the `spawn` start method, the worker process
+    starts with an empty configuration, so the one from the parent is
+    copied over.
+
+    Args:
+        tree (dict): The configuration tree of the parent process.
+    """
+    import sys
+    cfg.merge(tree)
+    sys.path.append(cfg["fs.lib"])
+
+def make_executor(executor, workers):
+    """
+    Creates the worker pool.
+
+    Args:
+        executor (str): Either `thread` or `process`.
+        workers (int): Maximum number of workers. None lets Python decide.
+
+    Returns:
+        concurrent.futures.Executor: The worker pool.
+
+    Raises:
+        ValueError: If the executor type is not supported.
+    """
+    if executor == "thread":
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    if executor == "process":
+        return concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                      initializer=_init_process_worker,
+                                                      initargs=(cfg.to_tree(),))
+    raise ValueError(f"Unsupported executor type {executor}")
+
+def _check_acyclic(deps):
+    """
+    Checks that the dependency graph does not contain cycles.
+
+    Args:
+        deps (dict): Maps every node to the list of nodes it depends on.
+
+    Raises:
+        ValueError: If a cycle is found.
+    """
+    state = {}
+
+    def visit(node, path):
+        s = state.get(node)
+        if s == "done":
+            return
+        if s == "visiting":
+            cycle = path[path.index(node):] + [node]
+            raise ValueError(f"Dependency cycle detected: {' -> '.join(cycle)}")
+        state[node] = "visiting"
+        for dep in deps[node]:
+            visit(dep, path + [node])
+        state[node] = "done"
+
+    for node in deps:
+        visit(node, [])
+
+def run_graph(names, deps, writes, workers=None, executor="thread", on_error="fail_fast"):
+    """
+    Runs a set of actions in parallel honoring their dependencies.
+
+    Actions are dispatched in the order given by `names` as soon as all
+    their dependencies have completed. Actions writing into a database
+    whose writes must be serialized are never run concurrently.
+
+    Args:
+        names (list): Full names of the actions to run.
+        deps (dict): Maps every action name to the names of the actions it depends on.
+        writes (dict): Maps every action name to the database instances it writes into.
+        workers (int, optional): Maximum number of concurrent actions.
+        executor (str, optional): Either `thread` (default) or `process`.
+        on_error (str, optional): Either `fail_fast` (default), which stops
+            dispatching new actions after the first failure, or
+            `continue`, which keeps running the actions that do not
+            depend on the failed ones.
+
+    Raises:
+        ValueError: If the graph contains cycles or `on_error` is invalid.
+        ActionError: If some action failed when running in `continue` mode.
+    """
+    if on_error not in ("fail_fast", "continue"):
+        raise ValueError(f"Bad value {on_error} for on_error")
+
+    _check_acyclic(deps)
+
+    serialized = {db: plpipes.database.serialize_writes_p(db)
+                  for name in names
+                  for db in writes[name]}
+
+    pending = list(names)
+    done = set()
+    failed = {}
+    blocked = set()
+    busy_dbs = set()
+    running = {}
+    aborting = False
+
+    with make_executor(executor, workers) as pool:
+        while True:
+            if not aborting:
+                for name in list(pending):
+                    if not all(dep in done for dep in deps[name]):
+                        continue
+                    locked = [db for db in writes[name] if serialized[db]]
+                    if any(db in busy_dbs for db in locked):
+                        continue
+                    busy_dbs.update(locked)
+                    pending.remove(name)
+                    logging.debug(f"Dispatching action {name}")
+                    if executor == "thread":
+                        # Thread workers run in a copy of the current
+                        # context so that configuration overlays are
+                        # honored.
+                        future = pool.submit(contextvars.copy_context().run, _run_action, name)
+                    else:
+                        future = pool.submit(_run_action, name)
+                    running[future] = (name, locked)
+
+            if not running:
+                break
+
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name, locked = running.pop(future)
+                busy_dbs.difference_update(locked)
+                try:
+                    future.result()
+                    done.add(name)
+                except Exception as ex:
+                    logging.error(f"Action {name} failed: {ex}")
+                    failed[name] = ex
+                    if on_error == "fail_fast":
+                        aborting = True
+
+            # Actions depending (maybe indirectly) on failed ones
+            # will never be ready, discard them.
+            blocked.update(failed)
+            while True:
+                skipped = [name for name in pending
+                           if any(dep in blocked for dep in deps[name])]
+                if not skipped:
+                    break
+                for name in skipped:
+                    logging.warning(f"Skipping action {name} as some of its dependencies failed")
+                    blocked.add(name)
+                    pending.remove(name)
+
+    if failed:
+        if on_error == "fail_fast":
+            raise next(iter(failed.values()))
+        raise ActionError(f"Actions {', '.join(failed)} failed")
+
+class _Dag(Action):
+    """
+    Action class that runs its children in parallel honoring the
+    dependencies declared between them.
+    """
+
+    def do_it(self):
+        """
+        Runs the child actions declared under the `sequence` entry.
+
+        Raises:
+            ValueError: If some child depends on an action not included in the DAG.
+        """
+        name = self._name
+
+        children = [lookup(child_name, parent=name)
+                    for child_name in self._cfg["sequence"]]
+        names = [child.name() for child in children]
+
+        if self._cfg.get("infer_dependencies", False):
+            graph = DependencyGraph()
+            for child in children:
+                graph.add_action(child.name(), *child.table_references())
+        else:
+            graph = None
+
+        deps = {}
+        writes = {}
+        for child in children:
+            child_deps = [resolve_action_name(dep, name)
+                          for dep in _as_list(child._cfg.get("depends_on"))]
+            for dep in child_deps:
+                if dep not in names:
+                    raise ValueError(f"Action {child.name()} depends on {dep} which is not part of {name}")
+            if graph is not None:
+                child_deps += sorted(graph.dependencies(child.name()) - set(child_deps))
+            deps[child.name()] = child_deps
+            writes[child.name()] = action_write_dbs(child)
+
+        run_graph(names, deps, writes,
+                  workers=self._cfg.get("workers"),
+                  executor=self._cfg.get("executor", "thread"),
+                  on_error=self._cfg.get("on_error", "fail_fast"))
+
+register_class("dag", _Dag)
@@ -13,6 +13,7 @@ import datetime
 from plpipes.action.base import Action
 from plpipes.action.registry import register_class
 from plpipes.config import cfg
+from plpipes import profiling
 
 class _FileDownloader(Action):
     """
@@ -131,6 +132,7 @@ def _download_file(url, destination, method="get", max_retries=3, timeout=30):
                         for chunk in resp.iter_bytes():
                             f.write(chunk)
                             local_file_size = f.tell()
+                            profiling.add(http_bytes=len(chunk))
                     try:
                         remote_last_modified = httpx.utils.parse_date_time(resp.headers['Last-Modified'])
                         destination.touch(times=(remote_last_modified, remote_last_modified))
@@ -1,11 +1,20 @@
+import json
 import logging
+import pathlib
+import time
+import contextvars
+import collections
+from contextlib import contextmanager, nullcontext
 
 from plpipes.config import cfg
 from plpipes.action.base import Action
+from plpipes.action import buildstate
 from plpipes.action.registry import register_class
 from plpipes.action.runner import lookup
+from plpipes.action.driver.dag import make_executor
 from plpipes.init import init_run_as_of_date
 import plpipes
+import plpipes.database
 
 class _Iterator:
     """
@@ -50,6 +59,16 @@ class _Iterator:
         """
         return self._key
 
+    def settings(self):
+        """
+        Returns the configuration entries set by the iterator for the
+        current value.
+
+        Returns:
+            dict: Maps configuration keys to their values.
+        """
+        return {}
+
 class _ListIterator(_Iterator):
     """
     Iterator for a list of values.
@@ -102,6 +121,16 @@ class _ListIterator(_Iterator):
         """
         return f"{self._key}={self._values[self._ix]}"
 
+    def settings(self):
+        """
+        Returns the configuration entries set by the iterator for the
+        current value.
+
+        Returns:
+            dict: Maps the target key to the current value.
+        """
+        return {self._target: cfg[self._target]}
+
 class _ValuesIterator(_ListIterator):
     """
     Iterator for a list of values obtained from the configuration.
@@ -201,7 +230,7 @@ class RunAsOfDateIterator(_ListIterator):
 
         if more_values is None:
             more_values = []
-        values = set(fdp.parse_date(v) for v in more_values)
+        values = set(parse_date(v) for v in more_values)
         value = start
         while value <= end:
             values.add(value)
@@ -228,6 +257,18 @@ class RunAsOfDateIterator(_ListIterator):
             return True
         return False
 
+    def settings(self):
+        """
+        Returns the configuration entries set by the iterator for the
+        current date.
+
+        Returns:
+            dict: Maps configuration keys to their values.
+        """
+        return {**super().settings(),
+                'run.as_of_date': cfg['run.as_of_date'],
+                'run.as_of_date_normalized': cfg['run.as_of_date_normalized']}
+
 def _init_iterator(key, icfg):
     """
     Initializes an iterator based on the specified type in configuration.
@@ -274,6 +315,196 @@ def _iterate(iterators):
             iterators[level].reset()
             level -= 1
 
+_log_buffer = contextvars.ContextVar("loop_log_buffer", default=None)
+
+# Iterations of the loops enclosing the running code, as a tuple of
+# (loop name, iteration description) pairs.
+_enclosing_iterations = contextvars.ContextVar("loop_enclosing_iterations", default=())
+
+def _context_key(enclosing):
+    """
+    Returns the string identifying the given enclosing iterations in the loop journals.
+    """
+    return "/".join(f"{name}[{where}]" for name, where in enclosing)
+
+class _BufferingFilter(logging.Filter):
+    """
+    Handler filter diverting the log records emitted from a context
+    with an active buffer into it.
+    """
+
+    def filter(self, record):
+        buffer = _log_buffer.get()
+        if buffer is None:
+            return True
+        # The filter is installed in several handlers, so the same
+        # record may be seen more than once.
+        if not buffer or buffer[-1] is not record:
+            buffer.append(record)
+        return False
+
+@contextmanager
+def _diverted_logs():
+    """
+    Context manager installing a `_BufferingFilter` in the root logger handlers.
+    """
+    root = logging.getLogger()
+    null_handler = None
+    if not root.handlers:
+        # Records only reach the filters when some handler is installed.
+        null_handler = logging.NullHandler()
+        root.addHandler(null_handler)
+    handlers = list(root.handlers)
+    filter = _BufferingFilter()
+    for handler in handlers:
+        handler.addFilter(filter)
+    try:
+        yield
+    finally:
+        for handler in handlers:
+            handler.removeFilter(filter)
+        if null_handler is not None:
+            root.removeHandler(null_handler)
+
+def _portable_record(record):
+    """
+    Makes a log record picklable, so that it can be sent back from a process worker.
+    """
+    if record.exc_info:
+        if not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+    record.msg = record.getMessage()
+    record.args = None
+    return record
+
+def _run_iteration(where, settings, children, redirections, divert_logs, enclosing):
+    """
+    Runs the loop children for one iteration. Used as the worker entry point.
+
+    The log records emitted are buffered so that they can be replayed
+    in iteration order.
+
+    Args:
+        where (str): The iteration description.
+        settings (dict): The configuration entries set by the iterators.
+        children (list): The full names of the actions to run.
+        redirections (dict): Database instance redirections (see `plpipes.database.redirect`).
+        divert_logs (bool): Whether the log filters have to be installed by the worker.
+        enclosing (tuple): The enclosing loop iterations, this one included.
+
+    Returns:
+        tuple: The log records, the exception raised, if any, the
+            start time and the tables replaced by the iteration, as
+            (db, table) tuples (see `_Loop._merge_mode`).
+    """
+    records = []
+    error = None
+    started_at = time.time()
+    replaced = set()
+    with _diverted_logs() if divert_logs else nullcontext():
+        token = _log_buffer.set(records)
+        enclosing_token = _enclosing_iterations.set(enclosing)
+        try:
+            with cfg.overlay(), buildstate.tracking_replacements() as replaced:
+                for key, value in settings.items():
+                    cfg[key] = value
+                with plpipes.database.redirect(redirections):
+                    try:
+                        logging.info(f"Iterating at {where}")
+                        for name in children:
+                            lookup(name).run()
+                    finally:
+                        for db in redirections.values():
+                            plpipes.database.release(db)
+        except Exception as ex:
+            error = ex
+        finally:
+            plpipes.database.release_thread()
+            _enclosing_iterations.reset(enclosing_token)
+            _log_buffer.reset(token)
+    replaced = {(db, table.lower()) for db, table in replaced}
+    return [_portable_record(r) for r in records], error, started_at, replaced
+
+class _Journal:
+    """
+    Checkpoint journal recording the outcome of the iterations of a
+    loop, so that it can be resumed skipping the ones already
+    completed.
+
+    It is stored as a JSON lines file with an entry per iteration
+    run. When an iteration appears several times, the last entry wins.
+
+    A loop nested inside another one runs once per iteration of the
+    outer loop, so entries also record the enclosing iterations
+    (`context`) and only the ones matching the current context are
+    considered.
+    """
+
+    def __init__(self, path, context="", reset=False):
+        """
+        Loads the journal from the given file.
+
+        Args:
+            path (pathlib.Path): The journal file.
+            context (str): The enclosing iterations, see `_context_key`.
+            reset (bool): Whether to discard the entries already in the journal for the context.
+        """
+        self._path = pathlib.Path(path)
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        self._context = context
+        self._done = set()
+        if reset:
+            # Entries for other contexts are kept, a marker makes
+            # later loads discard the ones for this context.
+            self._append({"context": context, "outcome": "reset"})
+        elif self._path.exists():
+            with open(self._path, "r", encoding="utf8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be truncated if the process was killed.
+                        continue
+                    if entry.get("context", "") != context:
+                        continue
+                    if entry["outcome"] == "reset":
+                        self._done.clear()
+                    elif entry["outcome"] == "ok":
+                        self._done.add(entry["where"])
+                    else:
+                        self._done.discard(entry["where"])
+
+    def done_p(self, where):
+        """
+        Checks whether the given iteration was already completed successfully.
+        """
+        return where in self._done
+
+    def record(self, where, started_at, error=None):
+        """
+        Appends the outcome of an iteration to the journal.
+
+        Args:
+            where (str): The iteration description.
+            started_at (float): The iteration start time.
+            error (Exception, optional): The exception raised by the iteration, if any.
+        """
+        entry = {"where": where,
+                 "context": self._context,
+                 "outcome": "ok" if error is None else "failed",
+                 "started_at": started_at,
+                 "finished_at": time.time()}
+        if error is not None:
+            entry["error"] = repr(error)
+        else:
+            self._done.add(where)
+        self._append(entry)
+
+    def _append(self, entry):
+        with open(self._path, "a", encoding="utf8") as f:
+            f.write(json.dumps(entry) + "\n")
+
 class _Loop(Action):
     """
     Action class that represents a loop of operations, utilizing specified iterators.
@@ -292,21 +523,217 @@ class _Loop(Action):
         children = [lookup(name, parent=self._name)
                     for name in self._cfg["sequence"]]
 
-        iterators = []
-        iicfg = self._cfg.cd("iterator")
-        for key in iicfg.keys():
-            icfg = iicfg.cd(key)
-            iterators.append(_init_iterator(key, icfg))
+        # The iterators set their values inside a configuration
+        # overlay, and every iteration runs inside a nested one, so
+        # changes do not leak between iterations nor out of the loop.
+        with cfg.overlay():
+            iterators = []
+            iicfg = self._cfg.cd("iterator")
+            for key in iicfg.keys():
+                icfg = iicfg.cd(key)
+                iterators.append(_init_iterator(key, icfg))
+
+            journal = None
+            if self._cfg.get("checkpoint", False):
+                path = pathlib.Path(cfg["fs.work"]) / "loops" / f"{self._name}.journal.jsonl"
+                journal = _Journal(path, _context_key(_enclosing_iterations.get()),
+                                   reset=cfg.get("run.reset_checkpoints", False))
+
+            parallel = self._cfg.get("parallel", 1)
+            if parallel > 1:
+                self._run_parallel(children, iterators, parallel, journal)
+                return
+
+            for where in _iterate(iterators):
+                if journal is not None and journal.done_p(where):
+                    logging.info(f"Skipping iteration {where}, already completed")
+                    continue
+                logging.info(f"Iterating at {where}")
+                started_at = time.time()
+                token = _enclosing_iterations.set((*_enclosing_iterations.get(), (self._name, where)))
+                try:
+                    with cfg.overlay():
+                        for child in children:
+                            child.run()
+                except Exception as ex:
+                    if journal is not None:
+                        journal.record(where, started_at, ex)
+                    if self._cfg.get("ignore_errors", False):
+                        logging.exception(f"Iteration {where} failed")
+                    else:
+                        raise
+                else:
+                    if journal is not None:
+                        journal.record(where, started_at)
+                finally:
+                    _enclosing_iterations.reset(token)
+
+    def _isolated_dbs(self):
+        """
+        Returns the names of the database instances isolated per iteration.
+        """
+        isolate = self._cfg.get("isolate_db", False)
+        if isolate is True:
+            return ["work"]
+        if not isolate:
+            return []
+        if isinstance(isolate, str):
+            return [isolate]
+        return list(isolate)
+
+    def _setup_isolated_db(self, db, ix):
+        """
+        Declares a new database instance, with the configuration of
+        the given one but backed by a new file, for the given iteration.
 
+        For SQLite databases, the original database is attached in
+        read-only mode to the new one, so that the tables already
+        there can still be read using unqualified names.
+
+        Returns:
+            str: The name of the new instance.
+        """
+        name = f"{db}_{self._name.replace('.', '_')}_{ix}"
+        tree = cfg.to_tree(f"db.instance.{db}")
+        driver = tree.setdefault("driver", "sqlite")
+        path = pathlib.Path(cfg["fs.work"]) / "loops" / f"{name}.{driver}"
+        # Remove leftovers from previous runs:
+        path.unlink(missing_ok=True)
+        tree["file"] = str(path)
+        if driver in ("sqlite", "spatialite"):
+            sqlite_tree = tree.setdefault("sqlite", {})
+            attach = sqlite_tree.get("attach") or {}
+            if isinstance(attach, str):
+                attach = [attach]
+            if isinstance(attach, list):
+                attach = {instance: instance for instance in attach}
+            sqlite_tree["attach"] = {**attach, "loop_origin": db}
+        else:
+            logging.warning(f"Database {db} uses the {driver} driver, its tables will not "
+                            f"be visible from the isolated databases of loop {self._name}")
+        cfg.merge(tree, key=f"db.instance.{name}")
+        return name
+
+    def _run_parallel(self, children, iterators, workers, journal):
+        """
+        Runs the loop iterations using a pool of workers.
+
+        Every iteration runs with its own configuration overlay and,
+        optionally, its own database instances. Logs are replayed,
+        databases merged and errors handled in iteration order.
+        """
+        executor = self._cfg.get("executor", "thread")
+        isolated = self._isolated_dbs()
+        enclosing = _enclosing_iterations.get()
+        children = [child._name for child in children]
+
+        iterations = []
+        resumed = False
         for where in _iterate(iterators):
-            logging.info(f"Iterating at {where}")
-            try:
-                for child in children:
-                    child.run()
-            except Exception as ex:
-                if self._cfg.get("ignore_errors", False):
-                    logging.exception(f"Iteration {where} failed")
-                else:
+            if journal is not None and journal.done_p(where):
+                logging.info(f"Skipping iteration {where}, already completed")
+                resumed = True
+                continue
+            settings = {}
+            for iterator in iterators:
+                settings.update(iterator.settings())
+            iterations.append((where, settings))
+
+        # Tables already merged in this run, see _merge_mode. When
+        # resuming, the rows of the iterations completed in previous
+        # runs are already in the tables, so everything is appended.
+        merged = None if resumed else set()
+
+        redirections = [{db: self._setup_isolated_db(db, ix) for db in isolated}
+                        for ix in range(len(iterations))]
+
+        logging.info(f"Running {len(iterations)} iterations using {workers} {executor} workers")
+        pending = collections.deque()
+        # Keep every worker busy while bounding the buffered logs:
+        max_pending = 2 * workers
+        with _diverted_logs() if executor == "thread" else nullcontext():
+            with make_executor(executor, workers) as pool:
+                try:
+                    for (where, settings), redirs in zip(iterations, redirections):
+                        iteration_enclosing = (*enclosing, (self._name, where))
+                        if executor == "thread":
+                            future = pool.submit(contextvars.copy_context().run, _run_iteration,
+                                                 where, settings, children, redirs, False,
+                                                 iteration_enclosing)
+                        else:
+                            future = pool.submit(_run_iteration, where, settings, children, redirs, True,
+                                                 iteration_enclosing)
+                        pending.append((where, redirs, future))
+                        if len(pending) >= max_pending:
+                            self._complete_iteration(*pending.popleft(), journal, merged)
+                    while pending:
+                        self._complete_iteration(*pending.popleft(), journal, merged)
+                except:
+                    for _, _, future in pending:
+                        future.cancel()
                     raise
 
+    def _merge_mode(self, db, table, merged, replaced):
+        """
+        Returns how a table written by an iteration has to be merged
+        into the original database.
+
+        By default, the first merge of every table in a run replaces
+        it and the following ones append to it, so the table ends
+        holding the rows written by all the iterations, as when they
+        are run serially appending to a table initially empty.
+
+        Tables replaced by the iteration (created with
+        `if_exists="replace"` or dropped) are always merged replacing
+        them, so that, as in a serial run, the copy written by the
+        last iteration wins.
+
+        The `isolate_db_merge` setting can be used to always `append`
+        or `replace` instead.
+        """
+        merge = self._cfg.get("isolate_db_merge", None)
+        if merge is not None:
+            return merge
+        key = (db, table.lower())
+        if key[1] in replaced:
+            if merged is not None:
+                merged.add(key)
+            return "replace"
+        if merged is None or key in merged:
+            return "append"
+        merged.add(key)
+        return "replace"
+
+    def _complete_iteration(self, where, redirections, future, journal, merged):
+        """
+        Waits for an iteration to finish, replays its logs, merges its
+        isolated databases and records its outcome in the journal.
+        """
+        records, error, started_at, replaced = future.result()
+        for record in records:
+            logging.getLogger(record.name).handle(record)
+        try:
+            if error is None:
+                for db, iso in redirections.items():
+                    iso_replaced = {table for name, table in replaced if name == iso}
+                    for table in plpipes.database.list_tables(iso)["name"]:
+                        merge = self._merge_mode(db, table, merged, iso_replaced)
+                        logging.debug(f"Merging table {table} from {iso} into {db} ({merge})")
+                        plpipes.database.copy_table_between(iso, db, from_table_name=table,
+                                                            if_exists=merge)
+        except Exception as ex:
+            error = ex
+        finally:
+            for iso in redirections.values():
+                path = plpipes.database.lookup(iso).backing_filename()
+                plpipes.database.release(iso)
+                pathlib.Path(path).unlink(missing_ok=True)
+        if journal is not None:
+            journal.record(where, started_at, error)
+        if error is not None:
+            if self._cfg.get("ignore_errors", False):
+                logging.error(f"Iteration {where} failed", exc_info=error)
+            else:
+                raise error
+
 register_class("loop", _Loop)
@@ -18,7 +18,6 @@ import tempfile
 import json
 import shutil
 import datetime
-import friendlydateparser
 
 def _read_yaml_header(fn):
     """
@@ -169,6 +168,7 @@ class _QuartoRunner(Action):
             if date_raw is None:
                 date = datetime.datetime.strptime(cfg['run.as_of_date_normalized'], "%Y%m%dT%H%M%SZ0")
             else:
+                import friendlydateparser
                 date = friendlydateparser.parse_datetime(date_raw)
                 if date is None:
                     raise ValueError(f"Unable to parse date {date_raw}")
@@ -8,7 +8,14 @@ specific actions defined in the project.
 
 """
 
+import hashlib
+import importlib.util
 import logging
+import marshal
+import os
+import pathlib
+import sys
+import threading
 
 from plpipes.config import cfg
 from plpipes.action.base import Action
@@ -30,6 +37,79 @@ def _action_namespace_setup(action_cfg=None):
     """
     return {"cfg": cfg, "action_cfg": action_cfg, "db": plpipes.database, "plpipes": plpipes}
 
+_code_cache = {}
+_code_cache_lock = threading.Lock()
+
+def _code_cache_path(path):
+    """
+    Returns the file where the compiled code for the given script is
+    stored or None when the disk cache is disabled.
+    """
+    if not cfg.get("run.python_code_cache", True):
+        return None
+    work_dir = cfg.get("fs.work")
+    if work_dir is None:
+        return None
+    digest = hashlib.sha256(str(pathlib.Path(path).absolute()).encode("utf8")).hexdigest()[:32]
+    return pathlib.Path(work_dir) / "pycache" / f"{digest}.{sys.implementation.cache_tag}.marshal"
+
+def _load_code(cache_path, stamp):
+    try:
+        with open(cache_path, "rb") as f:
+            magic, cached_stamp, code = marshal.load(f)
+        if magic == importlib.util.MAGIC_NUMBER and tuple(cached_stamp) == stamp:
+            return code
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    return None
+
+def _save_code(cache_path, stamp, code):
+    try:
+        cache_path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            marshal.dump((importlib.util.MAGIC_NUMBER, stamp, code), f)
+        os.replace(tmp_path, cache_path)
+    except OSError as ex:
+        logging.debug(f"Unable to save compiled code to {cache_path}: {ex}")
+
+def compile_script(path):
+    """
+    Compiles a Python script.
+
+    Code objects are cached in memory and, like `__pycache__` does for
+    modules, on disk under the `work` directory (unless
+    `run.python_code_cache` is set to false). Both are invalidated when
+    the script modification time or size change.
+
+    Args:
+        path (str): The script path.
+
+    Returns:
+        code: The code object.
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _code_cache_lock:
+        cached = _code_cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    cache_path = _code_cache_path(path)
+    code = _load_code(cache_path, stamp) if cache_path is not None else None
+    if code is None:
+        with open(path, "r", encoding="utf8") as f:
+            py_code = f.read()
+        code = compile(py_code, path, 'exec')
+        if cache_path is not None:
+            _save_code(cache_path, stamp, code)
+    else:
+        logging.debug(f"Compiled code for {path} loaded from {cache_path}")
+
+    with _code_cache_lock:
+        _code_cache[path] = (stamp, code)
+    return code
+
 class _PythonRunner(Action):
     """
     Class to run Python scripts as actions in the plpipes framework.
@@ -48,23 +128,36 @@ class _PythonRunner(Action):
         Raises:
             Exception: Raises an exception if there is an error during compilation or execution of the script.
         """
-        if not hasattr(self, "_code"):
-            self._path = self._cfg["files.py"]
-            try:
-                with open(self._path, "r", encoding="utf8") as f:
-                    py_code = f.read()
-                self._code = compile(py_code, self._path, 'exec')
-            except Exception as ex:
-                logging.error(f"Action of type python_script failed while compiling {self._path}")
-                raise ex
+        self._path = self._cfg["files.py"]
+        try:
+            code = compile_script(self._path)
+        except Exception as ex:
+            logging.error(f"Action of type python_script failed while compiling {self._path}")
+            raise ex
         try:
             logging.debug(f"Running python code at {self._path}")
-            exec(self._code, _action_namespace_setup(action_cfg=self._cfg))
-            del self._code
+            exec(code, _action_namespace_setup(action_cfg=self._cfg))
         except Exception as ex:
             logging.error(f"Action of type python_script failed while executing {self._path}")
             raise ex
 
+    def fingerprint(self):
+        """
+        Returns the action fingerprint, derived from the script source code.
+
+        Python scripts can read any table, so unless they declare the
+        tables they use (`reads` or `writes` entries) or they are
+        explicitly marked as `incremental`, a change in their inputs can
+        not be detected and they are never skipped.
+
+        Returns:
+            str: The fingerprint or None when the action must always be run.
+        """
+        if not (self._cfg.get("incremental", False) or
+                "reads" in self._cfg or "writes" in self._cfg):
+            return None
+        return self._fingerprint_hash(self._cfg["files.py"]).hexdigest()
+
 class _Sequencer(Action):
     """
     Class to execute a sequence of actions defined in the action configuration.
@@ -8,6 +8,7 @@ against the specified database.
 """
 
 import logging
+import os
 import pathlib
 
 from plpipes.action.base import Action
@@ -15,6 +16,9 @@ from plpipes.action.registry import register_class
 
 from plpipes.config import cfg
 
+# Source files already parsed, indexed by file name:
+_source_cache = {}
+
 class _SqlTemplated(Action):
     """
     Base class for SQL templated actions.
@@ -39,6 +43,9 @@ class _SqlTemplated(Action):
         """
         Extracts the YAML header from the source file.
 
+        The result is cached until the file modification time or size
+        change.
+
         Returns:
             A tuple containing the extracted configuration and the remaining
             lines of the source file.
@@ -46,11 +53,23 @@ class _SqlTemplated(Action):
         Raises:
             ValueError: If the YAML header is not properly closed.
         """
+        fn = self._source_fn()
+        st = os.stat(fn)
+        stamp = (st.st_mtime_ns, st.st_size)
+        try:
+            cached_stamp, acfg, source = _source_cache[fn]
+            if cached_stamp == stamp:
+                return acfg, source
+        except KeyError:
+            pass
+        acfg, source = self._parse_source_file(fn)
+        _source_cache[fn] = (stamp, acfg, source)
+        return acfg, source
+
+    def _parse_source_file(self, fn):
         # Extract the YAML header from the source file.
         # This is a hacky state machine.
 
-        fn = self._source_fn()
-
         with open(fn, "r") as f:
             in_yaml = False
             yaml = []
@@ -100,10 +119,52 @@ class _SqlTemplated(Action):
 
         if engine == "jinja2":
             from . import jinja2
-            return jinja2.render_template(self._source, {'cfg': cfg, 'acfg': self._cfg, 'str': str})
+            name = str(self._source_fn()) if self._cfg.get("render_cache", True) else None
+            return jinja2.render_template(self._source, {'cfg': cfg, 'acfg': self._cfg, 'str': str}, name=name)
 
         raise ValueError(f"Unsupported SQL template engine {engine}")
 
+    def fingerprint(self):
+        """
+        Returns the action fingerprint, derived from the source file and the rendered SQL code.
+
+        Returns:
+            str: The fingerprint.
+        """
+        h = self._fingerprint_hash(self._source_fn())
+        h.update(self._render_source_template().encode("utf8"))
+        return h.hexdigest()
+
+    def _source_db(self):
+        """
+        Returns the name of the database instance the SQL code reads from.
+        """
+        return "work"
+
+    def _target_db(self):
+        """
+        Returns the name of the database instance the SQL code writes into.
+        """
+        return "work"
+
+    def table_references(self):
+        """
+        Returns the tables read and written by the action.
+
+        Besides the ones declared in the action configuration, the
+        rendered SQL code is analyzed in order to find out the tables
+        it references.
+
+        Returns:
+            tuple: A pair of sets (reads, writes) of (db, table) tuples.
+        """
+        from plpipes.util.sqlrefs import table_references
+        reads, writes = super().table_references()
+        sql_reads, sql_writes = table_references(self._render_source_template())
+        reads |= {(self._source_db(), t) for t in sql_reads}
+        writes |= {(self._target_db(), t) for t in sql_writes}
+        return reads, writes
+
     def _short_name_to_table(self):
         """
         Converts the short name to a valid table name.
@@ -127,6 +188,29 @@ class _SqlTableCreator(_SqlTemplated):
         """
         return self._cfg["files.table_sql"]
 
+    def _source_db(self):
+        """
+        Returns the name of the database instance the SQL code is run on.
+        """
+        return self._cfg.get("source_db", "work")
+
+    def _target_db(self):
+        """
+        Returns the name of the database instance where the table is created.
+        """
+        return self._cfg.get("target_db", "work")
+
+    def table_references(self):
+        """
+        Returns the tables read and written by the action, including the one created.
+
+        Returns:
+            tuple: A pair of sets (reads, writes) of (db, table) tuples.
+        """
+        reads, writes = super().table_references()
+        writes.add((self._target_db(), self._short_name_to_table()))
+        return reads, writes
+
     def _run_sql(self, sql_code):
         """
         Executes the SQL code to create a table in the specified database.
@@ -136,13 +220,16 @@ class _SqlTableCreator(_SqlTemplated):
         """
         import plpipes.database as db
 
-        source_db = self._cfg.get("source_db", "work")
-        target_db = self._cfg.get("target_db", "work")
+        source_db = self._source_db()
+        target_db = self._target_db()
         if source_db == target_db:
             db.create_table(self._short_name_to_table(), sql_code, db=source_db)
         else:
-            iter = db.query(sql_code, db=source_db)
-            db.create_table(self._short_name_to_table(), iter, db=target_db)
+            kws = {}
+            if "chunksize" in self._cfg:
+                kws["chunksize"] = self._cfg["chunksize"]
+            db.copy_table_between(source_db, target_db, sql=sql_code,
+                                  to_table_name=self._short_name_to_table(), **kws)
 
 class _SqlViewCreator(_SqlTemplated):
     """
@@ -167,6 +254,17 @@ class _SqlViewCreator(_SqlTemplated):
         from plpipes.database import create_view
         create_view(self._short_name_to_table(), sql_code)
 
+    def table_references(self):
+        """
+        Returns the tables read and written by the action, including the view created.
+
+        Returns:
+            tuple: A pair of sets (reads, writes) of (db, table) tuples.
+        """
+        reads, writes = super().table_references()
+        writes.add((self._target_db(), self._short_name_to_table()))
+        return reads, writes
+
 class _SqlRunner(_SqlTemplated):
     """
     Action for executing raw SQL scripts.
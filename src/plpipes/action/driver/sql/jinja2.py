@@ -6,11 +6,21 @@ It provides several convenient helpers for easing SQL generation.
 import jinja2
 import re
 import logging
+import pathlib
 import importlib
+import threading
+import collections
 
-from plpipes.config import cfg
+from plpipes.config import cfg, record_access, accessed_value
 from plpipes.util import pluralsingular
 
+_env = None
+_env_lock = threading.Lock()
+
+# Maximum number of rendered outputs kept per template:
+_MAX_RENDERED = 32
+_rendered = {}
+
 _SQL_RESERVED_WORDS = {'select', 'from', 'where', 'join', 'order', 'group', 'having'}
 
 def _quote(val):
@@ -162,24 +172,91 @@ def _cfg_list(key):
     assert isinstance(tree, list)
     return tree
 
-def render_template(src, global_vars):
+class _SourceLoader(jinja2.BaseLoader):
+    """
+    Loader for templates whose source is passed explicitly by the caller.
+
+    A template stays up to date for as long as the same source string
+    object is passed, so callers should cache it (i.e. by file mtime).
+    """
+
+    def __init__(self):
+        self._sources = {}
+
+    def set_source(self, name, src):
+        self._sources[name] = src
+
+    def get_source(self, environment, name):
+        try:
+            src = self._sources[name]
+        except KeyError:
+            raise jinja2.TemplateNotFound(name)
+        return src, name, lambda: self._sources.get(name) is src
+
+def _environment():
+    """
+    Returns the Jinja2 environment shared by all the SQL actions.
+
+    Compiled templates are cached in memory and, when the `work`
+    directory is available, also on disk.
+    """
+    global _env
+    with _env_lock:
+        if _env is None:
+            bytecode_cache = None
+            work_dir = cfg.get("fs.work")
+            if work_dir is not None:
+                cache_dir = pathlib.Path(work_dir) / "jinja2-cache"
+                cache_dir.mkdir(exist_ok=True, parents=True)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(str(cache_dir))
+            env = jinja2.Environment(loader=_SourceLoader(),
+                                     bytecode_cache=bytecode_cache)
+            env.filters['cols'] = _join_columns
+            env.filters['esc'] = _escape
+            env.filters['quote'] = _quote
+            env.filters['debug'] = _debug
+            env.filters['pluralize'] = _pluralize
+            env.filters['singularize'] = _singularize
+            env.globals['cfg_tree'] = _cfg_tree
+            env.globals['cfg_list'] = _cfg_list
+            env.globals['logging'] = logging
+            _env = env
+        return _env
+
+def _still_valid(accessed):
+    return all(accessed_value(key) == value for key, value in accessed.items())
+
+def render_template(src, global_vars, name=None):
     """Render a Jinja2 template with the given source and global variables.
 
+    When a name is given, the parsed template is cached and reused for
+    as long as the same `src` object is passed. Also, the rendered
+    output is memoized together with the configuration entries read
+    while rendering it, and reused while those entries keep the same
+    values.
+
     Args:
         src (str): The source template string.
         global_vars (dict): A dictionary of global variables to be passed to the template.
+        name (str, optional): A name identifying the template, usually its file name.
 
     Returns:
         str: The rendered template output.
     """
-    env = jinja2.Environment()
-    env.filters['cols'] = _join_columns
-    env.filters['esc'] = _escape
-    env.filters['quote'] = _quote
-    env.filters['debug'] = _debug
-    env.filters['pluralize'] = _pluralize
-    env.filters['singularize'] = _singularize
-    env.globals['cfg_tree'] = _cfg_tree
-    env.globals['cfg_list'] = _cfg_list
-    env.globals['logging'] = logging
-    return env.from_string(src).render(**global_vars)
+    env = _environment()
+    if name is None:
+        return env.from_string(src).render(**global_vars)
+
+    env.loader.set_source(name, src)
+    memo = _rendered.get(name)
+    if memo is None or memo[0] is not src:
+        memo = _rendered[name] = (src, collections.deque(maxlen=_MAX_RENDERED))
+    for accessed, output in list(memo[1]):
+        if _still_valid(accessed):
+            logging.debug(f"Reusing rendered output for template {name}")
+            return output
+
+    with record_access() as accessed:
+        output = env.get_template(name).render(**global_vars)
+    memo[1].append((accessed, output))
+    return output
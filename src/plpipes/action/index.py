@@ -0,0 +1,183 @@
+"""
+This module implements the index of the actions available under the
+actions directory.
+
+The directory tree is scanned once and the files found are indexed by
+action name, so that looking up the files of an action does not
+require touching the file system.
+
+The index can also be cached on disk, together with the modification
+times of all the directories scanned. On later runs the cached index
+is used when none of the directories has changed (adding, removing or
+renaming a file changes the modification time of its directory).
+"""
+
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+
+from plpipes.config import cfg
+
+_CACHE_VERSION = 1
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def _split_name(fn):
+    """
+    Splits a file name into the action name part and the suffix key
+    used in the `files` entry of the action configuration.
+
+    Returns:
+        tuple: The stem and the suffix key or None when the file is not a candidate.
+    """
+    path = pathlib.PurePath(fn)
+    suffixes = path.suffixes
+    if not suffixes:
+        return None
+    suffix = "".join(suffixes)[1:].replace(".", "_")
+    if not re.match(r"[a-z0-9_\.]+$", suffix, re.IGNORECASE):
+        return None
+    return fn[:-len("".join(suffixes))], suffix
+
+class ActionIndex:
+    """
+    In-memory index of the action files found under a directory.
+    """
+
+    def __init__(self, root, cache_path=None):
+        """
+        Builds the index for the given directory, reusing the cached
+        one from `cache_path` when it is still valid.
+
+        Args:
+            root (pathlib.Path): The actions directory.
+            cache_path (pathlib.Path, optional): The file where the index is cached.
+        """
+        self._root = pathlib.Path(root).absolute()
+        self._entries = None
+        if cache_path is not None:
+            self._load(cache_path)
+        if self._entries is None:
+            self._scan()
+            if cache_path is not None:
+                self._save(cache_path)
+
+    def _scan(self):
+        entries = {}
+        dirs = {}
+        visited = set()
+
+        def scan(dir, prefix):
+            # Protect against symlink loops:
+            real = os.path.realpath(dir)
+            if real in visited:
+                return
+            visited.add(real)
+            try:
+                dirs[str(dir)] = os.stat(dir).st_mtime_ns
+                with os.scandir(dir) as it:
+                    children = sorted(it, key=lambda e: e.name)
+            except OSError as ex:
+                logging.debug(f"Unable to scan directory {dir}: {ex}")
+                return
+            for entry in children:
+                if entry.is_dir():
+                    name = prefix + entry.name
+                    entries.setdefault(name, {}).setdefault("dir", entry.path)
+                    scan(entry.path, name + ".")
+                elif entry.is_file():
+                    split = _split_name(entry.name)
+                    if split is not None:
+                        stem, suffix = split
+                        entries.setdefault(prefix + stem, {}).setdefault(suffix, entry.path)
+
+        scan(self._root, "")
+        logging.debug(f"Scanned {len(dirs)} directories under {self._root}, {len(entries)} entries found")
+        self._entries = entries
+        self._dirs = dirs
+
+    def _load(self, cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf8") as f:
+                data = json.load(f)
+            if data["version"] != _CACHE_VERSION or data["root"] != str(self._root):
+                return
+            for dir, mtime in data["dirs"].items():
+                if os.stat(dir).st_mtime_ns != mtime:
+                    logging.debug(f"Directory {dir} has changed, discarding the cached action index")
+                    return
+        except (OSError, ValueError, KeyError):
+            return
+        self._entries = data["entries"]
+        self._dirs = data["dirs"]
+        logging.debug(f"Action index loaded from {cache_path}")
+
+    def _save(self, cache_path):
+        data = {"version": _CACHE_VERSION,
+                "root": str(self._root),
+                "dirs": self._dirs,
+                "entries": self._entries}
+        try:
+            cache_path.parent.mkdir(exist_ok=True, parents=True)
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as ex:
+            logging.debug(f"Unable to save the action index to {cache_path}: {ex}")
+
+    def files(self, name):
+        """
+        Returns the files for the given action.
+
+        Args:
+            name (str): The full action name.
+
+        Returns:
+            dict: Maps suffix keys (or `dir`) to file paths or None when the action is not in the index.
+        """
+        files = self._entries.get(name)
+        return None if files is None else dict(files)
+
+    def names(self, suffixes=None):
+        """
+        Returns the names of the actions in the index.
+
+        Args:
+            suffixes (set, optional): Only the actions having a file with some of these suffixes are returned.
+
+        Returns:
+            list: The sorted action names.
+        """
+        return sorted(name for name, files in self._entries.items()
+                      if suffixes is None or any(s in suffixes for s in files))
+
+def action_index(root=None):
+    """
+    Returns the index for the given actions directory, building it the
+    first time.
+
+    The index is cached on disk under the `work` directory unless
+    `run.action_index_cache` is set to false.
+
+    Args:
+        root (pathlib.Path, optional): The actions directory. Defaults to `fs.actions`.
+
+    Returns:
+        ActionIndex: The index.
+    """
+    if root is None:
+        root = cfg["fs.actions"]
+    root = pathlib.Path(root).absolute()
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            cache_path = None
+            if cfg.get("run.action_index_cache", True) and "fs.work" in cfg:
+                cache_path = pathlib.Path(cfg["fs.work"]) / "action-index.json"
+            index = _indexes[root] = ActionIndex(root, cache_path)
+        return index
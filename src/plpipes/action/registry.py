@@ -1,9 +1,19 @@
+import importlib
 import logging
 
 _class_registry = {}
 
+_lazy_registry = {}  # action type -> module defining the action class
+
 _suffix_registry = []  # vector of pairs (suffix, action type)
 
+def _register_suffixes(action_type, suffixes):
+    for suffix in suffixes:
+        if (suffix, action_type) not in _suffix_registry:
+            _suffix_registry.append((suffix, action_type))
+
+    _suffix_registry.sort(key=lambda x: len(x[0]), reverse=True)
+
 def register_class(action_type, action_class, *suffixes):
     """
     Register a new action class with its associated action type and suffixes.
@@ -14,11 +24,21 @@ def register_class(action_type, action_class, *suffixes):
     suffixes (str): One or more file suffixes associated with the action type.
     """
     _class_registry[action_type] = action_class
+    _register_suffixes(action_type, suffixes)
 
-    for suffix in suffixes:
-        _suffix_registry.append((suffix, action_type))
+def register_lazy(action_type, module, *suffixes):
+    """
+    Register an action type whose class is defined in the given
+    module. The module is not imported until an action of that type is
+    used, and it must call `register_class` for the action type.
 
-    _suffix_registry.sort(key=lambda x: len(x[0]), reverse=True)
+    Parameters:
+    action_type (str): The type of action being registered.
+    module (str): The name of the module implementing the action.
+    suffixes (str): One or more file suffixes associated with the action type.
+    """
+    _lazy_registry[action_type] = module
+    _register_suffixes(action_type, suffixes)
 
 def _action_type_lookup(files):
     """
@@ -50,6 +70,9 @@ def _action_class_lookup(type):
     Raises:
     ValueError: If the action type is not supported.
     """
+    if type not in _class_registry and type in _lazy_registry:
+        logging.debug(f"loading module {_lazy_registry[type]} for action type {type}")
+        importlib.import_module(_lazy_registry[type])
     if type in _class_registry:
         return _class_registry[type]
     raise ValueError(f"Unsupported action type {type}")
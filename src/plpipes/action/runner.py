@@ -1,11 +1,17 @@
 import pathlib
 import logging
 import re
+import threading
 
 from plpipes.config import cfg
-from plpipes.action.registry import _action_class_lookup, _action_type_lookup
+from plpipes.action.registry import _action_class_lookup, _action_type_lookup, _suffix_registry
+from plpipes.action.index import action_index
 
 _action_cache = {}
+# Actions are looked up concurrently from the dag and loop workers.
+# The lock is reentrant because building an action may look up others.
+_action_cache_lock = threading.RLock()
+_dependency_graph = None
 
 def _find_action_files(action_root, name):
     """
@@ -74,28 +80,40 @@ def lookup(name, parent=""):
         ValueError: If the action type is not declared or the action file is not found.
     """
     name = resolve_action_name(name, parent)
-    if name not in _action_cache:
-        actions_dir = pathlib.Path(cfg["fs.actions"])
-        files = _find_action_files(actions_dir, name)
+    action = _action_cache.get(name)
+    if action is not None:
+        return action
 
-        cfg_path = "actions." + ".children.".join(name.split("."))
-        acfg = cfg.cd(cfg_path)
+    with _action_cache_lock:
+        if name not in _action_cache:
+            # Actions are cached globally, so their configuration must be
+            # set up outside of any overlay active (i.e. inside a loop).
+            with cfg.no_overlay():
+                actions_dir = pathlib.Path(cfg["fs.actions"])
+                files = action_index(actions_dir).files(name)
+                if files is None:
+                    # The action files may have been created after the
+                    # index was built.
+                    files = _find_action_files(actions_dir, name)
 
-        for ext in ("yaml", "json"):
-            if ext in files:
-                acfg.merge_file(files[ext], frame=-1)
+                cfg_path = "actions." + ".children.".join(name.split("."))
+                acfg = cfg.cd(cfg_path)
 
-        for k, v in files.items():
-            acfg.setdefault(f"files.{k}", v)
+                for ext in ("yaml", "json"):
+                    if ext in files:
+                        acfg.merge_file(files[ext], frame=-1)
 
-        action_type = acfg.setdefault("type", _action_type_lookup(files))
-        if action_type is None:
-            raise ValueError(f"Action {name} has no type declared or action file not found")
+                for k, v in files.items():
+                    acfg.setdefault(f"files.{k}", v)
 
-        logging.debug(f"action_type: {action_type}")
-        _action_cache[name] = _action_class_lookup(action_type)(name, acfg)
+                action_type = acfg.setdefault("type", _action_type_lookup(files))
+                if action_type is None:
+                    raise ValueError(f"Action {name} has no type declared or action file not found")
 
-    return _action_cache[name]
+                logging.debug(f"action_type: {action_type}")
+                _action_cache[name] = _action_class_lookup(action_type)(name, acfg)
+
+        return _action_cache[name]
 
 def run(name):
     """
@@ -105,3 +123,59 @@ def run(name):
         name (str): The name of the action to run.
     """
     lookup(name).run()
+
+def dependency_graph(refresh=False):
+    """
+    Return the graph of dependencies between the actions under `fs.actions`.
+
+    The graph is built from the tables every action reads and writes
+    (see `plpipes.action.dependencies`) and cached.
+
+    Args:
+        refresh (bool): Rescan the actions directory even if the graph was already built.
+
+    Returns:
+        DependencyGraph: The dependency graph.
+    """
+    global _dependency_graph
+    if _dependency_graph is None or refresh:
+        from plpipes.action.dependencies import build_dependency_graph
+        suffixes = {suffix for suffix, _ in _suffix_registry if suffix != "dir"}
+        _dependency_graph = build_dependency_graph(cfg["fs.actions"], lookup, suffixes)
+    return _dependency_graph
+
+def run_with_dependencies(names, upstream=False, downstream=False, workers=1, on_error="fail_fast"):
+    """
+    Execute the given actions in the order required by the dependency graph.
+
+    Args:
+        names (list): The names of the actions to run.
+        upstream (bool): Also run the actions the given ones depend on.
+        downstream (bool): Also run the actions depending on the given ones.
+        workers (int): Maximum number of actions run in parallel.
+        on_error (str): Either `fail_fast` or `continue`. See `plpipes.action.driver.dag.run_graph`.
+    """
+    from plpipes.action.driver.dag import run_graph, action_write_dbs
+
+    if upstream or downstream:
+        graph = dependency_graph()
+    else:
+        # Only the dependencies between the given actions matter, so
+        # there is no need to scan the full actions directory.
+        from plpipes.action.dependencies import DependencyGraph
+        graph = DependencyGraph()
+    for name in names:
+        if name not in graph:
+            graph.add_action(name, *lookup(name).table_references())
+
+    selected = set(names)
+    if upstream:
+        selected |= graph.upstream(names)
+    if downstream:
+        selected |= graph.downstream(names)
+
+    ordered = graph.sorted(selected)
+    logging.info(f"Running actions {', '.join(ordered)}")
+    deps = {name: sorted(graph.dependencies(name) & selected) for name in ordered}
+    writes = {name: action_write_dbs(lookup(name)) for name in ordered}
+    run_graph(ordered, deps, writes, workers=workers, on_error=on_error)
@@ -1,4 +1,5 @@
 from plpipes.config import cfg
+from plpipes import profiling
 
 import plpipes.cloud.azure.auth
 from dateutil.parser import isoparse as __dt
@@ -774,6 +775,7 @@ class _FS:
         """
         res = self._send_raw('GET', url, **kwargs)
         if res.status_code < 300:
+            profiling.add(http_bytes=len(res.content))
             return res.json()
         raise ValueError(f"Invalid response from server, status code: {res.status_code}")
 
@@ -813,6 +815,7 @@ class _FS:
                     for chunk in res.iter_bytes():
                         if len(chunk) > 0:
                             f.write(chunk)
+                            profiling.add(http_bytes=len(chunk))
                 return True
             except httpx.HTTPStatusError as ex:
                 if last or ex.response.status_code not in _TRANSITORY_HTTP_CODES:
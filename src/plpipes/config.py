@@ -10,6 +10,56 @@ import logging
 import re
 import copy
 import collections.abc
+import contextvars
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+_access_log = contextvars.ContextVar("config_access_log", default=None)
+
+@contextmanager
+def record_access():
+    """
+    Context manager recording the configuration entries read inside it.
+
+    Yields a dictionary which is filled with the keys accessed. Values
+    are stored wrapped in a list and missing keys as an empty list.
+
+    When nested, the entries recorded are also passed to the outer
+    log.
+    """
+    log = {}
+    token = _access_log.set(log)
+    try:
+        yield log
+    finally:
+        _access_log.reset(token)
+        outer = _access_log.get()
+        if outer is not None:
+            for key, value in log.items():
+                outer.setdefault(key, value)
+
+def _log_access(key, value):
+    """Register a configuration access in the active log, if any."""
+    log = _access_log.get()
+    if log is not None:
+        log.setdefault(key, value)
+
+def accessed_value(key, stack=None):
+    """
+    Returns the current value of a configuration entry in the format
+    used by `record_access`, so that it can be compared with a
+    recorded one.
+    """
+    if stack is None:
+        stack = cfg_stack
+    try:
+        return [stack._get(key)]
+    except KeyError:
+        return []
+    except ValueError:
+        return [stack._to_tree(key)]
 
 def _merge_any(tree, new):
     """Merge new configuration data into the existing tree structure."""
@@ -40,13 +90,151 @@ def _flatten_tree(tree):
     return flat
 
 
+def _prefix_match(parts, key_parts):
+    """
+    Check whether a configuration change at the path given by `parts`
+    may affect the lookup of the key given by `key_parts`.
+    """
+    for p, k in zip(parts, key_parts):
+        if p != k and p != '*':
+            return False
+    return True
+
+def _merge_at(root, key, newtree):
+    """
+    Merge new configuration data into the given key of the tree.
+
+    Returns:
+        tuple: The new root of the tree and the key of the shallowest
+               entry changed.
+    """
+    if key == "":
+        if not isinstance(newtree, dict):
+            raise ValueError("Top configuration must be a dictionary")
+        return _merge_any(root, newtree), key
+    tree = root
+    parts = key.split(".")
+    last = parts.pop()
+    for ix, p in enumerate(parts):
+        if (p not in tree) or (not isinstance(tree[p], dict)):
+            if p in tree:
+                # Replacing a terminal value changes the
+                # lookup of every key below it.
+                key = ".".join(parts[:ix + 1])
+            tree[p] = {}
+        tree = tree[p]
+    tree[last] = _merge_any(tree.get(last, None), newtree)
+    return root, key
+
+class _LookupCache:
+    """
+    Cache for the outcome of configuration lookups, including the
+    exceptions raised for missing or non terminal keys.
+
+    Entries are also indexed by the first component of the key for
+    fast invalidation.
+
+    The lookups are run without holding the lock, and their outcome is
+    only stored when no invalidation happened in the meantime, so that
+    a value read before a concurrent change is never cached.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._index = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, lookup):
+        """Return the cached value for the key, calling `lookup` on misses."""
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+        if entry is None:
+            try:
+                entry = (True, lookup(key))
+            except (KeyError, ValueError) as ex:
+                entry = (False, ex)
+            with self._lock:
+                if self._generation == generation:
+                    self._entries[key] = entry
+                    self._index.setdefault(key.split(".", 1)[0], set()).add(key)
+        is_value, value = entry
+        if is_value:
+            return value
+        raise value.with_traceback(None)
+
+    def invalidate(self, key):
+        """Discard the entries which may be affected by a change at the given key."""
+        with self._lock:
+            self._generation += 1
+            if key == "":
+                self._entries = {}
+                self._index = {}
+                return
+            parts = key.split(".")
+            if parts[0] == '*':
+                buckets = list(self._index.values())
+            else:
+                buckets = [self._index.get(parts[0], ())]
+            for bucket in buckets:
+                for cached_key in [k for k in bucket if _prefix_match(parts, k.split("."))]:
+                    bucket.discard(cached_key)
+                    del self._entries[cached_key]
+
+class _Overlay:
+    """
+    Context local configuration frame stacked on top of the frames of
+    a ConfigStack.
+
+    Changes done while the overlay is active go into its own tree, so
+    they are not seen from other contexts, parent overlays included,
+    and they do not invalidate the cache of the stack.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.tree = {}
+        self.version = 0
+        self.frames = [self.tree] + (parent.frames if parent is not None else [])
+        self._cache = _LookupCache()
+        self._stamp = None
+
+    def _parent_versions(self):
+        versions = []
+        parent = self.parent
+        while parent is not None:
+            versions.append(parent.version)
+            parent = parent.parent
+        return versions
+
+    def get(self, key, stack):
+        """Look up the key in the overlay and then in the stack frames."""
+        # Changes in the stack or in some parent overlay invalidate
+        # the full cache.
+        stamp = (stack._generation, self._parent_versions())
+        if stamp != self._stamp:
+            self._cache.invalidate("")
+            self._stamp = stamp
+        return self._cache.get(key, lambda key: stack._search(key, self.frames + stack._frames))
+
+    def merge(self, key, newtree):
+        """Merge new configuration data into the overlay tree."""
+        # Merging dictionaries is done in place, so the tree object
+        # referenced from the frames of the child overlays is kept.
+        _, key = _merge_at(self.tree, key, newtree)
+        self.version += 1
+        self._cache.invalidate(key)
+
 class ConfigStack:
     """Manage a stack of configuration frames."""
 
     def __init__(self):
         """Initialize a new ConfigStack with empty frames and cache."""
         self._frames = []
-        self._cache = {}
+        self._generation = 0
+        self._overlay = contextvars.ContextVar("config_overlay", default=None)
+        self.reset_cache()
 
     def _cd(self, path):
         """Change directory to the given path in the configuration stack."""
@@ -58,18 +246,75 @@ class ConfigStack:
 
     def reset_cache(self):
         """Reset the caching mechanism for configuration retrieval."""
-        self._cache = {}
+        self._cache = _LookupCache()
+        self._generation += 1
+
+    def _invalidate_cache(self, key):
+        """Discard the cached entries which may be affected by a change at the given key."""
+        self._cache.invalidate(key)
+        self._generation += 1
+
+    @contextmanager
+    def overlay(self, key="", tree=None):
+        """
+        Context manager activating a new configuration overlay for the
+        current context.
+
+        Inside it, configuration changes go into the overlay and are
+        discarded on exit. Overlays are copy-on-write: nothing is
+        copied when they are created and they can be nested.
+
+        The overlay is stored in a context variable, so it is not seen
+        from other threads unless the context is explicitly passed
+        (for instance, running the code with
+        `contextvars.copy_context().run`). Concurrent workers sharing
+        a context should still enter their own overlays.
+
+        Args:
+            key (str): Key where the tree is merged.
+            tree: Optional configuration data to merge into the new overlay.
+        """
+        token = self._overlay.set(_Overlay(self._overlay.get()))
+        try:
+            if tree is not None:
+                self._merge(key, tree)
+            yield
+        finally:
+            self._overlay.reset(token)
+
+    @contextmanager
+    def no_overlay(self):
+        """
+        Context manager disabling the active configuration overlays,
+        so that changes go again into the global configuration.
+        """
+        token = self._overlay.set(None)
+        try:
+            yield
+        finally:
+            self._overlay.reset(token)
+
+    def _active_frames(self):
+        """Return the overlay frames followed by the stack frames."""
+        overlay = self._overlay.get()
+        if overlay is None:
+            return self._frames
+        return overlay.frames + self._frames
 
     def _get(self, key, frame=0):
         """Get the value of a configuration key, with caching."""
-        if frame == 0:
-            if key not in self._cache:
-                self._cache[key] = self._get_nocache(key, 0)
-            return self._cache[key]
-        else:
+        if frame != 0:
             return self._get_nocache(key, frame)
+        overlay = self._overlay.get()
+        if overlay is not None:
+            return overlay.get(key, self)
+        return self._cache.get(key, self._get_nocache)
 
-    def _get_nocache(self, key, frame):
+    def _get_nocache(self, key, frame=0):
+        """Get the value of a configuration key from the given frame, without caching."""
+        return self._search(key, self._frames[frame:])
+
+    def _search(self, key, frames):
         """
         Retrieve the value associated with a given configuration key
         while considering wildcard entries and frame specificity.
@@ -87,7 +332,7 @@ class ConfigStack:
         Parameters:
         key (str): The configuration key to look up, expressed in
                    dotted notation.
-        frame: The frame context from which to retrieve the key.
+        frames (list): The frames to search, the first one has the highest priority.
 
         Returns:
         The value associated with the specified key.
@@ -98,14 +343,16 @@ class ConfigStack:
         """
 
         (key_part, *right) = key.split(".")
-        # queue structure:
-        #   specificity, frame_ix, tree, left_path, frozen_key, rigth_path
-        queue = [(('!', '*')[k], ix, f, (key_part, '*')[k], (key_part, '*')[k], right)
-                 for ix, f in enumerate(self._frames[frame:])
+        # The queue is a heap with entries:
+        #   specificity, frame_ix, counter, tree, left_path, frozen_key, rigth_path
+        # The counter avoids comparing the trees.
+        counter = itertools.count()
+        queue = [(('!', '*')[k], ix, next(counter), f, (key_part, '*')[k], (key_part, '*')[k], right)
+                 for ix, f in enumerate(frames)
                  for k in (0, 1)]
+        heapq.heapify(queue)
         while queue:
-            queue.sort(reverse=True)
-            (specifity, frame_ix, tree, left, key_part, right) = queue.pop()
+            (specifity, frame_ix, _, tree, left, key_part, right) = heapq.heappop(queue)
             while True:
                 try:
                     if isinstance(tree, dict):
@@ -123,7 +370,8 @@ class ConfigStack:
 
                 if right:
                     (key_part, *right) = right
-                    queue.append((specifity + "*", frame_ix, tree, left + ".*", '*', right))
+                    if isinstance(tree, dict) and '*' in tree:
+                        heapq.heappush(queue, (specifity + "*", frame_ix, next(counter), tree, left + ".*", '*', right))
                     left = left + "." + key_part
                     specifity += "!"
                 else:
@@ -142,24 +390,15 @@ class ConfigStack:
 
     def _merge(self, key, newtree, frame=0):
         """Merge new configuration data into the specified key of the frame."""
+        overlay = self._overlay.get()
+        if overlay is not None and frame == 0:
+            overlay.merge(key, newtree)
+            return
         # Auto-allocate frames
         if len(self._frames) <= frame:
             self._frames += [{} for _ in range(frame - len(self._frames) + 1)]
-        tree = self._frames[frame]
-
-        if key != "":
-            parts = key.split(".")
-            last = parts.pop()
-            for p in parts:
-                if (p not in tree) or (not isinstance(tree[p], dict)):
-                    tree[p] = {}
-                tree = tree[p]
-            tree[last] = _merge_any(tree.get(last, None), newtree)
-        else:
-            if not isinstance(newtree, dict):
-                raise ValueError("Top configuration must be a dictionary")
-            self._frames[frame] = _merge_any(tree, newtree)
-        self._cache = {}
+        self._frames[frame], key = _merge_at(self._frames[frame], key, newtree)
+        self._invalidate_cache(key)
 
     def _set(self, key, value):
         """Set the value for a given configuration key."""
@@ -173,7 +412,7 @@ class ConfigStack:
         """Change directory to a key, considering all matching frames."""
         # queue structure:
         #   specificity, frame_ix, tree
-        queue = [("", ix, f) for ix, f in enumerate(self._frames)]
+        queue = [("", ix, f) for ix, f in enumerate(self._active_frames())]
         if key != "":
             right = key.split(".")
             while right:
@@ -228,6 +467,7 @@ class ConfigStack:
         while self._frames:
             tree = _merge_any(tree, self._frames.pop())
         self._frames.append(tree)
+        self.reset_cache()
 
 
 class _Ptr(collections.abc.MutableMapping):
@@ -252,11 +492,24 @@ class _Ptr(collections.abc.MutableMapping):
 
     def __getitem__(self, key):
         """Retrieve the value of the specified key."""
-        return self._stack._get(self._mkkey(key))
+        key = self._mkkey(key)
+        try:
+            value = self._stack._get(key)
+        except KeyError:
+            _log_access(key, [])
+            raise
+        _log_access(key, [value])
+        return value
 
     def __contains__(self, key):
         """Check if the pointer contains the specified key."""
-        return self._stack._contains(self._mkkey(key))
+        key = self._mkkey(key)
+        found = self._stack._contains(key)
+        if not found:
+            _log_access(key, [])
+        elif _access_log.get() is not None:
+            _log_access(key, accessed_value(key, self._stack))
+        return found
 
     def __setitem__(self, key, value):
         """Set the value for the specified key in the pointer."""
@@ -272,7 +525,12 @@ class _Ptr(collections.abc.MutableMapping):
 
     def to_tree(self, key="", defaults=None):
         """Convert the configuration in the pointer to a tree structure."""
-        return self._stack._to_tree(self._mkkey(key), defaults)
+        key = self._mkkey(key)
+        if _access_log.get() is not None:
+            # Logged in the format used by accessed_value, so that
+            # missing entries compare equal on later runs.
+            _log_access(key, accessed_value(key, self._stack))
+        return self._stack._to_tree(key, defaults)
 
     def to_flat_dict(self, key="", defaults=None):
         """Retrieve the configuration as a flattened dictionary."""
@@ -301,17 +559,46 @@ class _Ptr(collections.abc.MutableMapping):
                 raise ValueError(f"Can't determine file type for {str(fn)}")
         self.merge(tree, key, frame=frame)
 
+    @contextmanager
+    def overlay(self, tree=None):
+        """
+        Context manager activating a copy-on-write configuration
+        overlay for the current context (see `ConfigStack.overlay`).
+
+        Args:
+            tree: Optional configuration data to merge into the overlay at the pointer path.
+
+        Yields:
+            The pointer itself.
+        """
+        with self._stack.overlay(self._path, tree):
+            yield self
+
+    @contextmanager
+    def no_overlay(self):
+        """
+        Context manager disabling the active configuration overlays
+        (see `ConfigStack.no_overlay`).
+
+        Yields:
+            The pointer itself.
+        """
+        with self._stack.no_overlay():
+            yield self
+
     def squash_frames(self):
         """Merge all frames in the stack."""
         self._stack._squash_frames()
 
     def __iter__(self):
         """Iterate over the keys in the current pointer's path."""
-        for k in self._stack._keys(self._mkkey("")):
+        for k in self.__keys__():
             yield k
 
     def __keys__(self):
         """Retrieve the keys of the current pointer's path."""
+        if _access_log.get() is not None:
+            _log_access(self._path, accessed_value(self._path, self._stack))
         return self._stack._keys(self._mkkey(""))
 
     def __str__(self):
@@ -1,11 +1,24 @@
 from plpipes.config import cfg
+import contextvars
 import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 import plpipes.plugin
 import plpipes.database.driver
 import plpipes.database.driver.transaction
 
 _driver_registry = plpipes.plugin.Registry("db_driver", "plpipes.database.driver.plugin")
 _db_registry = {}
+_db_registry_lock = threading.Lock()
+_db_redirections = contextvars.ContextVar("db_redirections", default={})
+
+def _resolve(db):
+    if db is None:
+        db = "work"
+    return _db_redirections.get().get(db, db)
 
 def lookup(db=None):
     """
@@ -17,12 +30,84 @@ def lookup(db=None):
     Returns:
         driver: The database driver instance.
     """
-    if db is None:
-        db = "work"
+    db = _resolve(db)
     if db not in _db_registry:
-        _db_registry[db] = _init_driver(db)
+        with _db_registry_lock:
+            if db not in _db_registry:
+                _db_registry[db] = _init_driver(db)
     return _db_registry[db]
 
+def serialize_writes_p(db=None):
+    """
+    Check whether concurrent writes into the specified database instance must be avoided.
+
+    The value can be set explicitly with the `serialize_writes` entry
+    of the instance configuration. Otherwise it depends on the driver
+    (file based databases as SQLite or DuckDB do not support concurrent
+    writers).
+
+    The driver is not initialized, so this function is cheap to call.
+
+    Args:
+        db (str, optional): The name of the database instance. Defaults to "work".
+
+    Returns:
+        bool: True if writes must be serialized.
+    """
+    db = _resolve(db)
+    drv_cfg = cfg.cd(f"db.instance.{db}")
+    if "serialize_writes" in drv_cfg:
+        return drv_cfg["serialize_writes"]
+    driver_class = _driver_registry.lookup(drv_cfg.get("driver", "sqlite"))
+    return driver_class._serialize_writes
+
+@contextmanager
+def redirect(redirections):
+    """
+    Context manager redirecting database instances to other ones for
+    the current context.
+
+    For instance, inside `redirect({"work": "work_copy"})`, every
+    operation on the `work` database (which is also the default one)
+    goes into the `work_copy` instance.
+
+    Args:
+        redirections (dict): Maps database instance names to the names of the instances to use instead.
+    """
+    token = _db_redirections.set({**_db_redirections.get(), **redirections})
+    try:
+        yield
+    finally:
+        _db_redirections.reset(token)
+
+def release(db=None):
+    """
+    Closes the database driver instance for the specified database and
+    removes it from the registry. It is initialized again when used.
+
+    Args:
+        db (str, optional): The name of the database instance. Defaults to "work".
+    """
+    db = _resolve(db)
+    with _db_registry_lock:
+        driver = _db_registry.pop(db, None)
+    if driver is not None:
+        driver.dispose()
+
+def release_thread():
+    """
+    Closes the connections kept open for the calling thread by the
+    database drivers (i.e. sticky connections, see the `pool.sticky`
+    setting), returning them to their pools.
+
+    It is called by the framework at the end of the tasks run in
+    worker threads.
+    """
+    with _db_registry_lock:
+        drivers = list(_db_registry.values())
+    for driver in drivers:
+        driver.release_thread()
+
 def _init_driver(name):
     """
     Initialize the database driver for the specified instance name.
@@ -301,6 +386,52 @@ def query_group(sql, parameters=None, db=None, by=None, backend=None, **kws):
         for df in txn.query_group(sql, parameters, by, backend, **kws):
             yield df
 
+def map_groups(sql, function, parameters=None, db=None, by=None, backend=None,
+               workers=None, executor="thread", **kws):
+    """
+    Execute a SQL query, split the results in groups and process them with the given function.
+
+    Groups are dispatched to a pool of workers as soon as they are
+    complete, while the next ones are being read from the database.
+    The number of groups waiting to be processed is bounded, so memory
+    usage does not depend on the size of the result set.
+
+    Args:
+        sql (str): The SQL query to execute.
+        function (callable): Function called for every group with its dataframe as argument.
+        parameters (dict, optional): The parameters for the SQL query.
+        db (str, optional): The database instance to use.
+        by (list): The columns to group by.
+        backend (str, optional): The backend to use.
+        workers (int, optional): Maximum number of concurrent workers.
+        executor (str, optional): Either `thread` (default) or `process`. In
+            the later case, the function must be picklable.
+        **kws: Additional keyword arguments.
+
+    Returns:
+        list: The values returned by the function for every group, in the order the groups were read.
+    """
+    import concurrent.futures
+    if executor == "thread":
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    elif executor == "process":
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    else:
+        raise ValueError(f"Unsupported executor type {executor}")
+
+    # Keep every worker busy while bounding the groups in memory:
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+    results = []
+    pending = []
+    with pool:
+        for group in query_group(sql, parameters, db=db, by=by, backend=backend, **kws):
+            pending.append(pool.submit(function, group))
+            if len(pending) >= max_pending:
+                results.append(pending.pop(0).result())
+        for future in pending:
+            results.append(future.result())
+    return results
+
 def copy_table(from_table_name, to_table_name=None,
                from_db=None, to_db=None, db=None,
                if_exists="replace", **kws):
@@ -348,6 +479,172 @@ def copy_table(from_table_name, to_table_name=None,
                     else:
                         to_txn.create_table(to_table_name, df, if_exists="append")
 
+class _ChunkProducer(threading.Thread):
+    """
+    Thread reading query results in chunks and pushing them into a bounded queue.
+
+    The thread runs inside a copy of the context of its creator, so
+    that database redirections, profiling and query statistics apply
+    to it as well.
+    """
+
+    _done = object()
+
+    def __init__(self, db, sql, parameters, backend, queue_size, kws):
+        super().__init__(daemon=True)
+        self._db = db
+        self._sql = sql
+        self._parameters = parameters
+        self._backend = backend
+        self._kws = kws
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._cancelled = threading.Event()
+        self._context = contextvars.copy_context()
+
+    def run(self):
+        self._context.run(self._produce)
+
+    def _produce(self):
+        try:
+            with _begin_or_pass_through(self._db) as txn:
+                for chunk in txn.query_chunked(self._sql, self._parameters, self._backend, **self._kws):
+                    if not self._put(chunk):
+                        return
+            self._put(self._done)
+        except Exception as ex:
+            self._put(ex)
+        finally:
+            release_thread()
+
+    def _put(self, item):
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def chunks(self):
+        """
+        Yields the chunks read by the thread, reraising any exception it may have raised.
+        """
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self._cancelled.set()
+            self.join()
+
+def _copy_table_in_engine(from_db, to_db, from_table_name, to_table_name,
+                          sql, parameters, if_exists):
+    """
+    Copies the data inside the destination database engine when the
+    source database instance is attached to it.
+
+    Returns:
+        int: The number of rows copied or None when the data can not be
+        copied in this way.
+    """
+    if any(isinstance(db, plpipes.database.driver.transaction.Transaction)
+           for db in (from_db, to_db)):
+        return None
+    driver = lookup(to_db)
+    schema = driver.attached_schema(_resolve(from_db))
+    if schema is None:
+        return None
+
+    with driver.begin() as txn:
+        if sql is None:
+            if "." in from_table_name:
+                return None
+            sql = f"select * from {schema}.{from_table_name}"
+        elif not driver._reads_only_from_schema_p(txn, sql, schema):
+            logging.debug(f"Query can not be run in db {_resolve(to_db)} with db {_resolve(from_db)} attached")
+            return None
+
+        logging.debug(f"Copying data from db {_resolve(from_db)} attached as {schema} into table {to_table_name} in db {_resolve(to_db)}")
+        started = time.monotonic()
+        rows_before = 0
+        if if_exists == "append" and txn.table_exists_p(to_table_name):
+            rows_before = txn.query_first_value(f"select count(*) from {to_table_name}")
+        txn.create_table(to_table_name, sql, parameters, if_exists=if_exists)
+        rows = txn.query_first_value(f"select count(*) from {to_table_name}") - rows_before
+    logging.info(f"Copy of {rows} rows into {to_table_name} completed in {time.monotonic() - started:.1f}s")
+    return rows
+
+def copy_table_between(from_db, to_db, from_table_name=None, to_table_name=None,
+                       sql=None, parameters=None, if_exists="replace",
+                       queue_size=2, backend=None, progress=None, **kws):
+    """
+    Copy a table or the result of a query from one database instance to another one.
+
+    The data is streamed in chunks: a background thread reads them from
+    the source database while they are written into the destination,
+    and at most `queue_size` chunks are kept in memory waiting to be
+    written.
+
+    When the source database instance is attached to the destination
+    one (see the `sqlite.attach` setting), the data is copied with a
+    single statement run by the destination database engine instead.
+
+    Args:
+        from_db (str): The source database instance.
+        to_db (str): The destination database instance.
+        from_table_name (str, optional): The name of the table to copy.
+        to_table_name (str, optional): The name of the destination table. Defaults to the source table name.
+        sql (str, optional): A query to run in the source database instead of copying a table.
+        parameters (dict, optional): The parameters for the query.
+        if_exists (str, optional): What to do if the destination table already exists. Defaults to "replace".
+        queue_size (int, optional): Maximum number of chunks waiting to be written. Defaults to 2.
+        backend (str, optional): The backend used to transfer the data.
+        progress (callable, optional): Function called after every chunk is written with the number of rows copied so far.
+        **kws: Additional keyword arguments passed to `query_chunked` (i.e. `chunksize`).
+
+    Returns:
+        int: The number of rows copied.
+    """
+    if sql is None and from_table_name is None:
+        raise ValueError("Either from_table_name or sql must be given")
+    if to_table_name is None:
+        if from_table_name is None:
+            raise ValueError("to_table_name is required when copying the result of a query")
+        to_table_name = from_table_name.split(".")[-1]
+
+    rows = _copy_table_in_engine(from_db, to_db, from_table_name, to_table_name,
+                                 sql, parameters, if_exists)
+    if rows is not None:
+        return rows
+
+    if sql is None:
+        sql = f"select * from {from_table_name}"
+
+    producer = _ChunkProducer(from_db, sql, parameters, backend, queue_size, kws)
+    producer.start()
+
+    rows = 0
+    started = time.monotonic()
+    last_report = started
+    with _begin_or_pass_through(to_db) as to_txn:
+        logging.debug(f"Copying data from db {from_db} into table {to_table_name} in db {to_txn.db_name()}")
+        for chunk in producer.chunks():
+            to_txn.create_table(to_table_name, chunk, if_exists=if_exists)
+            if_exists = "append"
+            rows += len(chunk)
+            if progress is not None:
+                progress(rows)
+            now = time.monotonic()
+            if now - last_report > 10:
+                logging.info(f"{rows} rows copied into {to_table_name} ({rows / (now - started):.0f} rows/s)")
+                last_report = now
+    logging.info(f"Copy of {rows} rows into {to_table_name} completed in {time.monotonic() - started:.1f}s")
+    return rows
+
 _key_dir_unpacked = {
     '>' : (True , True ), # Ascending, Strict
     '>=': (True , False),
@@ -0,0 +1,183 @@
+import logging
+import pyarrow
+import pyarrow.compute as pc
+import sqlalchemy.sql as sas
+
+from plpipes.database.backend import Backend
+from plpipes.database.sqlext import AsSubquery, Wrap
+
+DEFAULT_CHUNKSIZE = 100000
+
+def _table_from_rows(names, rows):
+    columns = list(zip(*rows)) if rows else [[] for _ in names]
+    return pyarrow.table({name: list(column) for name, column in zip(names, columns)})
+
+def _group_boundaries(table, by):
+    """
+    Finds the rows where a new group starts in a table sorted by the given columns.
+
+    Returns:
+        list: The offsets of the first row of every group but the first one.
+    """
+    if table.num_rows < 2:
+        return []
+    starts = None
+    for name in by:
+        col = table.column(name)
+        if pyarrow.types.is_null(col.type):
+            # All the values are null, so they are equal.
+            continue
+        a, b = col.slice(1), col.slice(0, table.num_rows - 1)
+        # Two nulls are considered equal, a null and a value are not.
+        diff = pc.or_kleene(pc.not_equal(a, b),
+                            pc.xor(pc.is_null(a), pc.is_null(b)))
+        diff = pc.fill_null(diff, False)
+        starts = diff if starts is None else pc.or_(starts, diff)
+    if starts is None:
+        return []
+    return [ix + 1 for ix in pc.indices_nonzero(starts).to_pylist()]
+
+def _keys_differ(table1, table2, by):
+    """
+    Checks whether the key of the last row of table1 and the key of the first row of table2 differ.
+    """
+    # Chunks built from rows fetched through SQLAlchemy may have
+    # different column types (i.e. null for columns without values),
+    # so the keys are compared as Python objects.
+    last = table1.num_rows - 1
+    return any(table1.column(name)[last].as_py() != table2.column(name)[0].as_py() for name in by)
+
+def _concat_tables(tables):
+    try:
+        return pyarrow.concat_tables(tables, promote_options="default")
+    except TypeError:
+        # pyarrow < 14
+        return pyarrow.concat_tables(tables, promote=True)
+
+def _closing_batches(cursor, reader):
+    # Keeps the cursor alive while the batches are being read.
+    try:
+        yield from reader
+    finally:
+        cursor.close()
+
+class ArrowBackend(Backend):
+    """
+    Backend reading query results as `pyarrow.Table` objects.
+
+    Results are fetched as Arrow data directly from the database when
+    possible (DuckDB native Arrow interface or ADBC when the `adbc`
+    setting is enabled for the database instance), avoiding the
+    creation of per-cell Python objects.
+    """
+
+    def query(self, txn, sql, parameters, kws):
+        reader = self._record_batch_reader(txn, sql, parameters, None, kws)
+        if reader is not None:
+            return self._coerce_output(reader.read_all())
+        result = txn._conn.execute(Wrap(sql), parameters)
+        return self._coerce_output(_table_from_rows(list(result.keys()), result.fetchall()))
+
+    def query_chunked(self, txn, sql, parameters, kws):
+        for table in self._query_arrow_chunked(txn, sql, parameters, kws):
+            yield self._coerce_output(table)
+
+    def query_group(self, txn, sql, parameters, by, kws):
+        if by is None or not by:
+            raise ValueError("by argument must contain a list of column names")
+        wrapped_sql = sas.select("*").select_from(AsSubquery(Wrap(sql))).order_by(*[sas.column(c) for c in by])
+
+        # Rows arrive sorted, so groups are the runs of consecutive
+        # rows with the same key. The rows of the group being
+        # collected are kept in a list of slices, so that groups
+        # spanning several chunks are concatenated just once.
+        pieces = []
+        for chunk in self._query_arrow_chunked(txn, wrapped_sql, parameters, kws):
+            if chunk.num_rows == 0:
+                continue
+            starts = _group_boundaries(chunk, by)
+            if pieces and _keys_differ(pieces[-1], chunk, by):
+                starts.insert(0, 0)
+            offset = 0
+            for start in starts:
+                if start > offset:
+                    pieces.append(chunk.slice(offset, start - offset))
+                yield self._coerce_output(self._concat_pieces(pieces))
+                pieces = []
+                offset = start
+            if offset < chunk.num_rows:
+                pieces.append(chunk.slice(offset))
+        if pieces:
+            yield self._coerce_output(self._concat_pieces(pieces))
+
+    def _concat_pieces(self, pieces):
+        if len(pieces) == 1:
+            return pieces[0]
+        return _concat_tables(pieces)
+
+    def _query_arrow_chunked(self, txn, sql, parameters, kws):
+        chunksize = txn._driver._pop_kw(kws, "chunksize", DEFAULT_CHUNKSIZE)
+        reader = self._record_batch_reader(txn, sql, parameters, chunksize, kws)
+        if reader is not None:
+            # Readers may return batches of any size, rebatch them.
+            buffer = []
+            buffered = 0
+            for batch in reader:
+                buffer.append(batch)
+                buffered += batch.num_rows
+                while buffered >= chunksize:
+                    table = pyarrow.Table.from_batches(buffer)
+                    yield table.slice(0, chunksize)
+                    rest = table.slice(chunksize)
+                    buffer = rest.to_batches()
+                    buffered = rest.num_rows
+            if buffered:
+                yield pyarrow.Table.from_batches(buffer)
+        else:
+            result = txn._conn.execute(txn._driver._streaming_sql(txn, sql, chunksize), parameters)
+            names = list(result.keys())
+            while True:
+                rows = result.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield _table_from_rows(names, rows)
+
+    def _record_batch_reader(self, txn, sql, parameters, chunksize, kws):
+        """
+        Runs the query and returns a `pyarrow.RecordBatchReader` for
+        the results when the database supports fetching them as Arrow
+        data natively.
+
+        Returns:
+            pyarrow.RecordBatchReader: The reader or None.
+        """
+        cursor = txn._driver._adbc_cursor(txn, sql, parameters)
+        if cursor is not None:
+            reader = cursor.fetch_record_batch()
+            return pyarrow.RecordBatchReader.from_batches(reader.schema, _closing_batches(cursor, reader))
+        if txn._conn.dialect.name == "duckdb":
+            cursor = txn._conn.execute(Wrap(sql), parameters).cursor
+            if hasattr(cursor, "to_arrow_reader"):
+                return cursor.to_arrow_reader(chunksize or DEFAULT_CHUNKSIZE)
+            return cursor.fetch_record_batch(chunksize or DEFAULT_CHUNKSIZE)
+        return None
+
+    def _coerce_output(self, table):
+        return table
+
+    def register_handlers(self, handlers):
+        handlers["create_table"].register(pyarrow.Table, self._create_table_from_arrow)
+
+    def _create_table_from_arrow(self, txn, table_name, table, parameters, if_exists, kws):
+        logging.debug(f"Creating table {table_name} from arrow table (rows: {table.num_rows})")
+        method = kws.pop("method", None)
+        if method is None:
+            method = txn._driver._bulk_load_method()
+        if method == "register" and not kws:
+            return txn._driver._create_table_from_registered(txn, table_name, table, if_exists)
+        # Otherwise, the pandas bulk load methods are used. Converting
+        # numeric columns from Arrow to pandas does not copy the data.
+        pandas_backend = txn._driver._backend("pandas")
+        return pandas_backend._create_table_from_pandas(txn, table_name, table.to_pandas(),
+                                                        parameters, if_exists,
+                                                        {**kws, "method": method})
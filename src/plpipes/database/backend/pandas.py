@@ -1,4 +1,7 @@
+import contextlib
+import io
 import logging
+import numpy
 import pandas
 import sqlalchemy.sql as sas
 
@@ -8,13 +11,150 @@ from plpipes.util.database import split_table_name
 
 DEFAULT_CHUNKSIZE = 5000
 
+# Cache size used by SQLite while bulk loading data (negative values are KiB)
+_SQLITE_BULK_LOAD_CACHE_SIZE = -262144
+
+def _qualified_name(table, conn):
+    quote = conn.dialect.identifier_preparer.quote
+    if table.schema:
+        return f"{quote(table.schema)}.{quote(table.name)}"
+    return quote(table.name)
+
+def _insert_sql(table, conn, keys):
+    quote = conn.dialect.identifier_preparer.quote
+    paramstyle = conn.dialect.paramstyle
+    if paramstyle == "qmark":
+        placeholders = ["?"] * len(keys)
+    elif paramstyle in ("format", "pyformat"):
+        placeholders = ["%s"] * len(keys)
+    elif paramstyle == "numeric":
+        placeholders = [f":{ix + 1}" for ix in range(len(keys))]
+    else:
+        raise ValueError(f"Unsupported DB-API paramstyle {paramstyle}")
+    return (f"insert into {_qualified_name(table, conn)} ({', '.join(quote(k) for k in keys)}) "
+            f"values ({', '.join(placeholders)})")
+
+def _insert_executemany(table, conn, keys, data_iter):
+    """
+    Inserts the rows calling the DB-API `executemany` method directly,
+    bypassing the per-row overhead of SQLAlchemy.
+    """
+    sql = _insert_sql(table, conn, keys)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.executemany(sql, list(data_iter))
+    finally:
+        cursor.close()
+
+def _insert_fast_executemany(table, conn, keys, data_iter):
+    """
+    Inserts the rows using pyodbc `fast_executemany` mode, which sends
+    the parameters to the server in bulk.
+    """
+    sql = _insert_sql(table, conn, keys)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.fast_executemany = True
+        cursor.executemany(sql, list(data_iter))
+    finally:
+        cursor.close()
+
+def _copy_field(value):
+    # In CSV format, COPY reads unquoted empty fields as NULL, so all
+    # the values are quoted and NULLs are written as an unquoted \N.
+    if value is None or (isinstance(value, float) and value != value):
+        return "\\N"
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _insert_copy(table, conn, keys, data_iter):
+    """
+    Inserts the rows using PostgreSQL `COPY ... FROM STDIN`.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    sql = (f"copy {_qualified_name(table, conn)} ({', '.join(quote(k) for k in keys)}) "
+           "from stdin with (format csv, null '\\N')")
+    buf = io.StringIO()
+    for row in data_iter:
+        buf.write(",".join(_copy_field(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            cursor.copy_expert(sql, buf)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buf.getvalue())
+    finally:
+        cursor.close()
+
+def _key_changes(a, b):
+    """
+    Compares two aligned column arrays element-wise. Two nulls are
+    considered equal, a null and a value are not.
+    """
+    a_na = pandas.isna(a)
+    b_na = pandas.isna(b)
+    return ((a != b) & ~(a_na & b_na)) | (a_na != b_na)
+
+def _group_starts(df, by):
+    """
+    Finds the rows where a new group starts in a dataframe sorted by the given columns.
+
+    Returns:
+        list: The positions of the first row of every group but the first one.
+    """
+    if len(df) < 2:
+        return []
+    changes = numpy.zeros(len(df) - 1, dtype=bool)
+    for name in by:
+        values = df[name].to_numpy()
+        changes |= _key_changes(values[1:], values[:-1])
+    return (numpy.flatnonzero(changes) + 1).tolist()
+
+def _keys_differ(df1, df2, by):
+    """
+    Checks whether the key of the last row of df1 and the key of the first row of df2 differ.
+    """
+    return any(_key_changes(df1[name].to_numpy()[-1:], df2[name].to_numpy()[:1])[0] for name in by)
+
+@contextlib.contextmanager
+def _sqlite_bulk_load_pragmas(conn):
+    """
+    Enlarges the SQLite page cache while bulk loading data. The previous
+    value is restored at exit.
+
+    Note that other pragmas relevant for bulk loads (i.e.
+    `synchronous`, `journal_mode` or `temp_store`) can not be changed
+    inside a transaction.
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cache_size = cursor.execute("pragma cache_size").fetchone()[0]
+        cursor.execute(f"pragma cache_size = {_SQLITE_BULK_LOAD_CACHE_SIZE}")
+        try:
+            yield
+        finally:
+            cursor.execute(f"pragma cache_size = {int(cache_size)}")
+    finally:
+        cursor.close()
+
+_to_sql_methods = {'to_sql': None,
+                   'multi': 'multi',
+                   'executemany': _insert_executemany,
+                   'fast_executemany': _insert_fast_executemany,
+                   'copy': _insert_copy}
+
 class PandasBackend(Backend):
     def query(self, txn, sql, parameters, kws):
         return self._df_read_sql(txn, Wrap(sql), params=parameters, **kws)
 
     def query_chunked(self, txn, sql, parameters, kws):
         chunksize = txn._driver._pop_kw(kws, "chunksize", DEFAULT_CHUNKSIZE)
-        for chunk in self._df_read_sql(txn, Wrap(sql), params=parameters, chunksize=chunksize, **kws):
+        sqla = txn._driver._streaming_sql(txn, sql, chunksize)
+        for chunk in self._df_read_sql(txn, sqla, params=parameters, chunksize=chunksize, **kws):
             yield chunk
 
     def query_group(self, txn, sql, parameters, by, kws):
@@ -22,29 +162,61 @@ class PandasBackend(Backend):
             raise ValueError("by argument must contain a list of column names")
         wrapped_sql = sas.select("*").select_from(AsSubquery(Wrap(sql))).order_by(*[sas.column(c) for c in by])
 
-        tail = None
+        # Rows arrive sorted, so groups are the runs of consecutive
+        # rows with the same key. The rows of the group being
+        # collected are kept in a list of slices, so that groups
+        # spanning several chunks are concatenated just once.
+        pieces = []
         for chunk in self.query_chunked(txn, wrapped_sql, parameters, kws):
-            if tail is not None:
-                chunk = self._df_concat([tail, chunk])
-            groups = [g for _, g in chunk.groupby(by)]
-            tail = groups.pop()
-            for group in groups:
-                group = group.reset_index()
-                yield group
-        if tail is not None:
-            yield tail.reset_index()
+            chunk = chunk.reset_index(drop=True)
+            starts = _group_starts(chunk, by)
+            if pieces and _keys_differ(pieces[-1], chunk, by):
+                starts.insert(0, 0)
+            offset = 0
+            for start in starts:
+                if start > offset:
+                    pieces.append(chunk.iloc[offset:start])
+                yield self._concat_pieces(pieces)
+                pieces = []
+                offset = start
+            if offset < len(chunk):
+                pieces.append(chunk.iloc[offset:])
+        if pieces:
+            yield self._concat_pieces(pieces)
+
+    def _concat_pieces(self, pieces):
+        if len(pieces) == 1:
+            return pieces[0].reset_index(drop=True)
+        return self._df_concat(pieces).reset_index(drop=True)
 
     def register_handlers(self, handlers):
         handlers["create_table"].register(pandas.DataFrame, self._create_table_from_pandas)
 
     def _create_table_from_pandas(self, txn, table_name, df, paramaters, if_exists, kws):
-        logging.debug(f"Creating table {table_name} from pandas dataframe (shape: {df.shape})")
+        method = kws.pop("method", None)
+        if method is None:
+            method = txn._driver._bulk_load_method()
+        if method == "register" and kws:
+            logging.debug(f"Options {list(kws)} not supported by the register bulk load method, using executemany")
+            method = "executemany"
+        logging.debug(f"Creating table {table_name} from pandas dataframe (shape: {df.shape}, method: {method})")
+        if method == "register":
+            return txn._driver._create_table_from_registered(txn, table_name, df, if_exists)
+        try:
+            to_sql_method = _to_sql_methods[method]
+        except KeyError:
+            raise ValueError(f"Unsupported bulk load method {method}")
         chunksize = txn._driver._pop_kw(kws, "chunksize", DEFAULT_CHUNKSIZE)
         schema, table_name = split_table_name(table_name)
-        df.to_sql(table_name, txn._conn,
-                  schema=schema, if_exists=if_exists,
-                  index=False, chunksize=chunksize,
-                  **kws)
+        if method == "executemany" and txn._conn.dialect.name == "sqlite":
+            tuning = _sqlite_bulk_load_pragmas(txn._conn)
+        else:
+            tuning = contextlib.nullcontext()
+        with tuning:
+            df.to_sql(table_name, txn._conn,
+                      schema=schema, if_exists=if_exists,
+                      index=False, chunksize=chunksize,
+                      method=to_sql_method, **kws)
 
     def create_table_from_records(self, txn, table_name, records, paramaters, if_exists, kws):
         df = pandas.DataFrame.from_records(records)
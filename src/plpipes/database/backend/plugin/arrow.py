@@ -0,0 +1,4 @@
+from plpipes.database.backend.arrow import ArrowBackend
+from plpipes.plugin import plugin
+
+plugin(ArrowBackend)
@@ -0,0 +1,13 @@
+from plpipes.database.backend.arrow import ArrowBackend, DEFAULT_CHUNKSIZE
+from plpipes.plugin import plugin
+
+def _record_batch_reader(txn, sql, parameters, chunksize):
+    cursor = txn._driver._run(txn, sql, parameters)
+    if hasattr(cursor, "to_arrow_reader"):
+        return cursor.to_arrow_reader(chunksize or DEFAULT_CHUNKSIZE)
+    return cursor.fetch_record_batch(chunksize or DEFAULT_CHUNKSIZE)
+
+@plugin
+class ArrowDuckDBNativeBackend(ArrowBackend):
+    def _record_batch_reader(self, txn, sql, parameters, chunksize, kws):
+        return _record_batch_reader(txn, sql, parameters, chunksize)
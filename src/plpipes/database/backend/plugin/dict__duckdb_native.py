@@ -0,0 +1,19 @@
+from plpipes.database.backend import Backend
+from plpipes.plugin import plugin
+
+@plugin
+class DictDuckDBNativeBackend(Backend):
+    def query(self, txn, sql, parameters, kws):
+        cursor = txn._driver._run(txn, sql, parameters)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def query_first(self, txn, sql, parameters, kws):
+        cursor = txn._driver._run(txn, sql, parameters)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in cursor.description], row))
+
+    def register_handlers(self, handlers):
+        pass
@@ -0,0 +1,38 @@
+import logging
+import pandas
+
+from plpipes.database.backend.pandas import PandasBackend, DEFAULT_CHUNKSIZE
+from plpipes.plugin import plugin
+
+# DuckDB returns data in vectors of 2048 rows
+_VECTOR_SIZE = 2048
+
+@plugin
+class PandasDuckDBNativeBackend(PandasBackend):
+    def query(self, txn, sql, parameters, kws):
+        return txn._driver._run(txn, sql, parameters).df(**kws)
+
+    def query_chunked(self, txn, sql, parameters, kws):
+        chunksize = txn._driver._pop_kw(kws, "chunksize", DEFAULT_CHUNKSIZE)
+        cursor = txn._driver._run(txn, sql, parameters)
+        vectors = max(1, chunksize // _VECTOR_SIZE)
+        tail = None
+        while True:
+            df = cursor.fetch_df_chunk(vectors, **kws)
+            if len(df) == 0:
+                break
+            if tail is not None:
+                df = pandas.concat([tail, df], ignore_index=True)
+            for start in range(0, len(df) - chunksize + 1, chunksize):
+                yield df.iloc[start:start + chunksize].reset_index(drop=True)
+            rest = len(df) % chunksize
+            tail = df.iloc[len(df) - rest:] if rest else None
+        if tail is not None:
+            yield tail.reset_index(drop=True)
+
+    def _create_table_from_pandas(self, txn, table_name, df, parameters, if_exists, kws):
+        method = kws.pop("method", "register")
+        if method != "register" or kws:
+            raise ValueError(f"Only the register bulk load method is supported by the duckdb_native driver")
+        logging.debug(f"Creating table {table_name} from pandas dataframe (shape: {df.shape})")
+        txn._driver._create_table_from_registered(txn, table_name, df, if_exists)
@@ -0,0 +1,4 @@
+from plpipes.database.backend.polars import PolarsBackend
+from plpipes.plugin import plugin
+
+plugin(PolarsBackend)
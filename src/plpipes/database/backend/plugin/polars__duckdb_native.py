@@ -0,0 +1,9 @@
+from plpipes.database.backend.polars import PolarsBackend
+from plpipes.plugin import plugin
+
+from plpipes.database.backend.plugin.arrow__duckdb_native import _record_batch_reader
+
+@plugin
+class PolarsDuckDBNativeBackend(PolarsBackend):
+    def _record_batch_reader(self, txn, sql, parameters, chunksize, kws):
+        return _record_batch_reader(txn, sql, parameters, chunksize)
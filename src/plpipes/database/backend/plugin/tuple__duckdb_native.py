@@ -0,0 +1,19 @@
+from plpipes.database.backend import Backend
+from plpipes.plugin import plugin
+
+@plugin
+class TupleDuckDBNativeBackend(Backend):
+    def query(self, txn, sql, parameters, kws):
+        return txn._driver._run(txn, sql, parameters).fetchall()
+
+    def query_first(self, txn, sql, parameters, kws):
+        return txn._driver._run(txn, sql, parameters).fetchone()
+
+    def query_first_value(self, txn, sql, parameters, kws):
+        row = self.query_first(txn, sql, parameters, kws)
+        if row is None:
+            return None
+        return row[0]
+
+    def register_handlers(self, handlers):
+        pass
@@ -0,0 +1,22 @@
+import logging
+import polars
+
+from plpipes.database.backend.arrow import ArrowBackend
+
+class PolarsBackend(ArrowBackend):
+    """
+    Backend reading query results as `polars.DataFrame` objects.
+
+    Data is read as Arrow tables, which polars adopts without copying.
+    """
+
+    def _coerce_output(self, table):
+        return polars.from_arrow(table)
+
+    def register_handlers(self, handlers):
+        super().register_handlers(handlers)
+        handlers["create_table"].register(polars.DataFrame, self._create_table_from_polars)
+
+    def _create_table_from_polars(self, txn, table_name, df, parameters, if_exists, kws):
+        logging.debug(f"Creating table {table_name} from polars dataframe (shape: {df.shape})")
+        return self._create_table_from_arrow(txn, table_name, df.to_arrow(), parameters, if_exists, kws)
@@ -4,13 +4,61 @@ from plpipes.database.backend import Backend
 from plpipes.plugin import plugin
 from plpipes.spark import spark_session
 
+def _where_condition(where):
+    import pyspark.sql.functions as F
+    if isinstance(where, dict):
+        condition = None
+        for name, value in where.items():
+            column = F.col(name)
+            if value is None:
+                c = column.isNull()
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                c = column.isin(list(value))
+            else:
+                c = column == value
+            condition = c if condition is None else condition & c
+        return condition
+    # Strings are parsed by Spark as SQL expressions.
+    return where
+
+def _filter_df(df, kws):
+    """
+    Applies the `columns`, `where`, `sample`, `order_by` and `limit`
+    arguments of `read_table` to a Spark dataframe, so that they are
+    pushed down by Spark into the table scan.
+    """
+    import pyspark.sql.functions as F
+    columns = kws.pop("columns", None)
+    if columns is not None:
+        df = df.select(*columns)
+    where = kws.pop("where", None)
+    if where is not None:
+        df = df.where(_where_condition(where))
+    sample = kws.pop("sample", None)
+    if sample is not None:
+        sample = float(sample)
+        if not 0 < sample <= 1:
+            raise ValueError(f"Bad value {sample} for sample, it must be a fraction in the range (0, 1]")
+        if sample < 1:
+            df = df.sample(fraction=sample)
+    order_by = kws.pop("order_by", None)
+    if order_by is not None:
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        df = df.orderBy(*[F.col(n[1:]).desc() if n.startswith("-") else F.col(n)
+                          for n in order_by])
+    limit = kws.pop("limit", None)
+    if limit is not None:
+        df = df.limit(int(limit))
+    return df
+
 class SparkBackendBase(Backend):
     def query(self, txn, sql, parameters, kws):
         df = txn._conn.sql(sql, args=parameters, **kws)
         return self._coerce_output_df(df)
 
     def read_table(self, txn, table_name, kws):
-        df = txn._conn.read.table(table_name)
+        df = _filter_df(txn._conn.read.table(table_name), kws)
         return self._coerce_output_df(df)
 
     def _coerce_output_df(self, df):
@@ -14,12 +14,14 @@ Classes:
 """
 
 import logging
+import re
 from contextlib import contextmanager
 from plpipes.util.typedict import dispatcher
 from plpipes.util.method_decorators import optional_abstract
 import plpipes.plugin
 import types
 import plpipes.database.driver.transaction
+from plpipes.database.driver.stats import QueryStats, fingerprint
 
 _backend_class_registry = plpipes.plugin.Registry("db_backend", "plpipes.database.backend.plugin")
 
@@ -30,6 +32,8 @@ class Driver(plpipes.plugin.Plugin):
     Attributes:
         _default_backend_name (str): The default backend name to use.
         _backend_subkeys (list): List of backend subkeys associated with this driver.
+        _serialize_writes (bool): Whether the database does not support concurrent writers.
+        _default_bulk_load_method (str): The method used for loading data frames into tables.
 
     Methods:
         config(): Returns the configuration for the driver.
@@ -46,10 +50,13 @@ class Driver(plpipes.plugin.Plugin):
         _query_chunked(txn, sql, parameters, backend, kws): Executes a chunked query.
         _query_group(txn, sql, parameters, by, backend, kws): Executes a grouped query.
         load_backend(name): Loads a specific backend into the driver.
+        stats(): Returns the query statistics collected by the driver.
     """
 
     _default_backend_name = "pandas"
     _backend_subkeys = []
+    _serialize_writes = False
+    _default_bulk_load_method = "to_sql"
 
     @classmethod
     def _init_plugin(klass, key):
@@ -101,6 +108,12 @@ class Driver(plpipes.plugin.Plugin):
         self._default_backend = self._backend_lookup(self._cfg.get("backend", self._default_backend_name))
         for backend_name in self._cfg.get('extra_backends', []):
             self._backend_lookup(backend_name)
+        self._query_stats = QueryStats() if self._cfg.get("stats", True) else None
+        threshold = self._cfg.get("slow_query.threshold", None)
+        self._slow_query_threshold = None if threshold is None else float(threshold)
+        self._slow_query_explain = self._cfg.get("slow_query.explain", True)
+        # See plpipes.database.tablecache.active_p:
+        self._table_cache_active = None
 
     def config(self):
         """
@@ -126,6 +139,156 @@ class Driver(plpipes.plugin.Plugin):
         logging.debug(f"looking up backend {name}")
         return self._backend_lookup(name)
 
+    def _pop_kw(self, kws, name, default=None):
+        """
+        Extracts an option from the keyword arguments falling back to
+        the database instance configuration.
+
+        Args:
+            kws: The keyword arguments dictionary. The option is removed from it.
+            name: The option name.
+            default: The value returned when the option is not found.
+
+        Returns:
+            The option value.
+        """
+        try:
+            return kws.pop(name)
+        except KeyError:
+            return self._cfg.get(name, default)
+
+    def _bulk_load_method(self):
+        """
+        Returns the method used by default for loading data frames into tables.
+
+        It can be set per database instance with the `bulk_load_method`
+        setting and otherwise depends on the driver.
+
+        Returns:
+            str: The bulk load method name.
+        """
+        return self._cfg.get("bulk_load_method", self._default_bulk_load_method)
+
+    def dispose(self):
+        """
+        Closes the connections held by the driver.
+        """
+        pass
+
+    def release_thread(self):
+        """
+        Closes the connections the driver keeps open for the calling
+        thread, if any.
+        """
+        pass
+
+    def stats(self):
+        """
+        Returns the statistics of the calls made through the driver
+        transactions, grouped by operation and statement fingerprint
+        (see `plpipes.database.driver.stats`).
+
+        Returns:
+            list: A list of dictionaries with the entries `operation`,
+            `fingerprint`, `count`, `total_time`, `max_time` and `rows`,
+            sorted by total time in descending order.
+        """
+        if self._query_stats is None:
+            return []
+        return self._query_stats.to_list()
+
+    def reset_stats(self):
+        """
+        Discards the query statistics collected so far.
+        """
+        if self._query_stats is not None:
+            self._query_stats.reset()
+
+    def attached_schema(self, db_name):
+        """
+        Returns the schema where the given database instance is
+        attached, so that its tables can be read from this database.
+
+        Args:
+            db_name (str): The database instance name.
+
+        Returns:
+            str: The schema name or None when the instance is not attached.
+        """
+        return None
+
+    def _explain_sql(self, sql):
+        """
+        Returns the statement used for retrieving the execution plan of the given query.
+
+        Args:
+            sql (str): The SQL query.
+
+        Returns:
+            str: The EXPLAIN statement.
+        """
+        return f"EXPLAIN {sql}"
+
+    def _record_call(self, txn, operation, sql, table_name, parameters, elapsed, rows):
+        """
+        Records a call made through a transaction in the query
+        statistics and logs it when it is slow. Called from the
+        `plpipes.profiling.db_call` decorator.
+
+        The call is accounted under the fingerprint of its SQL code,
+        prefixed by the name of the table it works on, if any. When the
+        data for a table is not given as SQL code (i.e. a data frame
+        passed to `create_table`), its type is used instead.
+
+        Args:
+            txn: The transaction instance.
+            operation (str): The `Transaction` method called.
+            sql: The SQL code, if any.
+            table_name (str): The table name, if any.
+            parameters: The parameters for the SQL code.
+            elapsed (float): The call latency in seconds.
+            rows (int): The number of rows read or written, if known.
+        """
+        if self._query_stats is None:
+            return
+        code = None
+        source = None
+        if isinstance(sql, str):
+            code = sql
+        elif hasattr(sql, "compile"):
+            code = str(sql)
+        elif sql is not None:
+            source = type(sql).__name__
+        if code is not None:
+            source = fingerprint(code)
+        fp = " <- ".join(str(p) for p in (table_name, source) if p is not None)
+        self._query_stats.record(operation, fp, elapsed, rows)
+        threshold = self._slow_query_threshold
+        if threshold is not None and elapsed >= threshold:
+            self._log_slow_query(txn, operation, code or fp, parameters, elapsed)
+
+    def _log_slow_query(self, txn, operation, sql, parameters, elapsed):
+        """
+        Logs a statement which took longer than the `slow_query.threshold`
+        setting, together with its execution plan when it is a query.
+
+        Args:
+            txn: The transaction instance.
+            operation (str): The `Transaction` method called.
+            sql (str): The SQL code.
+            parameters: The parameters for the SQL code.
+            elapsed (float): The call latency in seconds.
+        """
+        msg = f"Slow {operation} on database {self._name} ({elapsed:.3f}s): {sql}"
+        if self._slow_query_explain and re.match(r"\s*(select|with)\b", sql, re.IGNORECASE):
+            try:
+                rows = self._query(txn, self._explain_sql(sql), parameters, "tuple", {})
+                plan = "\n".join(" | ".join(str(v) for v in row) for row in rows)
+                msg += f"\nExecution plan:\n{plan}"
+            except Exception as ex:
+                logging.debug(f"Unable to retrieve the execution plan: {ex}")
+        logging.warning(msg)
+
     def driver_name(self):
         """
         Returns the name of the database driver.
@@ -347,6 +510,20 @@ class Driver(plpipes.plugin.Plugin):
             self._create_table(txn, table_name, chunk, parameters, if_exists, kws)
             if_exists = 'append'
 
+    @optional_abstract
+    def _create_table_from_registered(self, txn, table_name, obj, if_exists):
+        """
+        Creates a table from a data frame object registered in the
+        database engine, without serializing its rows.
+
+        Args:
+            txn: The transaction instance.
+            table_name: The name of the table to create.
+            obj: A pandas data frame or an Arrow table.
+            if_exists: Specifies how to handle the table if it already exists.
+        """
+        ...
+
     @optional_abstract
     def _create_view(self, txn, view_name, sql, parameters, if_exists, kws):
         """
@@ -2,16 +2,26 @@ import pathlib
 from plpipes.config import cfg
 from plpipes.database.driver.sqlalchemy import SQLAlchemyDriver
 
+def file_db_path(name, drv_cfg, driver):
+    """
+    Returns the path of the file backing a file based database instance.
+
+    If there is an entry for the given name in cfg["fs"] the file is
+    stored there, otherwise, it is stored in the work directory.
+    """
+    root_dir = pathlib.Path(cfg.get(f"fs.{name}", cfg["fs.work"]))
+    fn = root_dir.joinpath(drv_cfg.setdefault("file", f"{name}.{driver}")).absolute()
+    fn.parent.mkdir(exist_ok=True, parents=True)
+    return fn
+
 class FileDBDriver(SQLAlchemyDriver):
-    def __init__(self, name, drv_cfg, driver):
-        # if there is an entry for the given name in cfg["fs"] we use
-        # that, otherwise we store the db file in the work directory:
-        root_dir = pathlib.Path(cfg.get(f"fs.{name}", cfg["fs.work"]))
-        fn = root_dir.joinpath(drv_cfg.setdefault("file", f"{name}.{driver}")).absolute()
-        fn.parent.mkdir(exist_ok=True, parents=True)
 
+    _serialize_writes = True
+
+    def __init__(self, name, drv_cfg, driver, **kwargs):
+        fn = file_db_path(name, drv_cfg, driver)
         url = f"{driver}:///{fn}"
-        super().__init__(name, drv_cfg, url)
+        super().__init__(name, drv_cfg, url, **kwargs)
         self._fn = fn
 
     def backing_filename(self):
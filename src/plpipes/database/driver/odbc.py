@@ -3,6 +3,9 @@ import sqlalchemy.engine
 from plpipes.database.driver.sqlalchemy import SQLAlchemyDriver
 
 class ODBCDriver(SQLAlchemyDriver):
+
+    _default_bulk_load_method = "fast_executemany"
+
     def __init__(self, name, drv_cfg, **kwargs):
         url = sqlalchemy.engine.URL.create(drv_cfg['sql_alchemy_driver'],
                                            query={'odbc_connect': drv_cfg['connection_string']})
@@ -1,12 +1,18 @@
 from plpipes.database.driver.filedb import FileDBDriver
+from plpipes.database.sqlext import Wrap
+from plpipes.util.database import duckdb_config
 from plpipes.plugin import plugin
 
 import sqlalchemy.sql as sas
 
 @plugin
 class DuckDBDriver(FileDBDriver):
+
+    _default_bulk_load_method = "register"
+
     def __init__(self, name, drv_cfg):
-        super().__init__(name, drv_cfg, "duckdb")
+        super().__init__(name, drv_cfg, "duckdb",
+                         connect_args={"config": duckdb_config(drv_cfg)})
 
     def _list_tables_query(self):
         return sas.select(sas.column("table_name").label("name")) \
@@ -20,3 +26,15 @@ class DuckDBDriver(FileDBDriver):
                   .where(sas.and_(sas.column("table_schema") == "main",
                                   sas.column("table_type") == "VIEW"))
 
+
+    def _create_table_from_registered(self, txn, table_name, obj, if_exists):
+        # DuckDB can scan pandas and Arrow objects in place, so the
+        # table is created with a single CREATE TABLE AS statement.
+        view_name = f"_plpipes_registered_{self._next_key()}"
+        conn = txn._conn.connection.driver_connection
+        conn.register(view_name, obj)
+        try:
+            self._create_table_from_clause(txn, table_name, Wrap(f"select * from {view_name}"),
+                                           None, if_exists, {})
+        finally:
+            conn.unregister(view_name)
@@ -0,0 +1,254 @@
+import logging
+import pathlib
+import duckdb
+import duckdb_engine
+import sqlalchemy.sql as sas
+from contextlib import contextmanager
+
+from plpipes.database.driver import Driver
+from plpipes.database.driver.filedb import file_db_path
+from plpipes.database.driver.transaction import Transaction
+from plpipes.database.sqlext import CreateTableAs, CreateViewAs, DropTable, DropView, InsertIntoTableFromQuery, Wrap, read_table_select
+from plpipes.util.database import duckdb_config, split_table_name
+from plpipes.plugin import plugin
+
+_file_formats = {'.parquet': 'parquet',
+                 '.csv': 'csv',
+                 '.json': 'json'}
+
+def _file_format(path, format):
+    if format is not None:
+        return format
+    for suffix in reversed(path.suffixes):
+        try:
+            return _file_formats[suffix.lower()]
+        except KeyError:
+            pass
+    raise ValueError(f"Unable to infer file format from file name {path}")
+
+def _quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+class DuckDBNativeTransaction(Transaction):
+
+    def register(self, view_name, obj):
+        """
+        Makes a pandas dataframe or an Arrow table available as a view
+        inside the transaction without copying its data.
+
+        Args:
+            view_name (str): The name of the view.
+            obj: The pandas dataframe, polars dataframe or Arrow table.
+        """
+        self._conn.register(view_name, obj)
+
+    def unregister(self, view_name):
+        """
+        Removes a view created with `register`.
+
+        Args:
+            view_name (str): The name of the view.
+        """
+        self._conn.unregister(view_name)
+
+    def export_to_file(self, path, table_name=None, sql=None, format=None, parameters=None):
+        """
+        Exports a table or the result of a query to a file using DuckDB `COPY ... TO`.
+
+        Exactly one of `table_name` and `sql` must be given.
+
+        Args:
+            path (str): The destination file.
+            table_name (str, optional): The name of the table to export.
+            sql (str, optional): A query whose result is exported instead of a table.
+            format (str, optional): `parquet`, `csv` or `json`. Inferred from the file extension by default.
+            parameters (dict, optional): Parameters for the SQL query.
+        """
+        if (table_name is None) == (sql is None):
+            raise ValueError("Exactly one of table_name and sql must be given")
+        return self._driver._export_to_file(self, path, table_name, sql, format, parameters)
+
+    def import_from_file(self, table_name, path, format=None, if_exists="replace"):
+        """
+        Creates a table from a file using the DuckDB native readers.
+
+        Args:
+            table_name (str): The table to create.
+            path (str): The source file. Glob patterns are also accepted.
+            format (str, optional): `parquet`, `csv` or `json`. Inferred from the file extension by default.
+            if_exists (str, optional): What to do if the table already exists. Defaults to "replace".
+        """
+        return self._driver._import_from_file(self, table_name, path, format, if_exists)
+
+@plugin
+class DuckDBNativeDriver(Driver):
+    """
+    DuckDB driver using the `duckdb` Python module directly instead of
+    going through SQLAlchemy.
+
+    Data frames are registered in DuckDB without copying them and query
+    results are fetched using the DuckDB native pandas and Arrow
+    conversions.
+    """
+
+    _serialize_writes = True
+    _default_bulk_load_method = "register"
+    _transaction_factory = DuckDBNativeTransaction
+
+    @classmethod
+    def _init_plugin(klass, key):
+        super()._init_plugin(key)
+        klass._create_table.td.register(sas.elements.ClauseElement, '_create_table_from_clause')
+
+    def __init__(self, name, drv_cfg):
+        self._fn = file_db_path(name, drv_cfg, "duckdb")
+        config = duckdb_config(drv_cfg)
+        logging.debug(f"calling duckdb.connect({self._fn}, config={config})")
+        self._conn = duckdb.connect(str(self._fn), config=config)
+        # Used for rendering SQLAlchemy expressions and named parameters:
+        self._dialect = duckdb_engine.Dialect(paramstyle="qmark")
+        super().__init__(name, drv_cfg)
+
+    def backing_filename(self):
+        return self._fn
+
+    def connection(self):
+        """
+        Returns the underlying DuckDB connection.
+        """
+        return self._conn
+
+    def dispose(self):
+        self._conn.close()
+
+    @contextmanager
+    def begin(self):
+        # Every transaction uses its own cursor, so they can be run
+        # from different threads.
+        cursor = self._conn.cursor()
+        try:
+            cursor.begin()
+            try:
+                yield self._transaction_factory(self, cursor)
+            except:
+                cursor.rollback()
+                raise
+            cursor.commit()
+        finally:
+            cursor.close()
+
+    def _run(self, txn, sql, parameters=None):
+        """
+        Runs a SQL statement given either as a string or as a
+        SQLAlchemy expression. Named parameters (`:name`) are supported.
+
+        Returns:
+            The DuckDB cursor holding the results.
+        """
+        if isinstance(sql, str) and not parameters:
+            logging.debug(f"duckdb execute: {repr(sql)}")
+            return txn._conn.execute(sql)
+        compiled = Wrap(sql).compile(dialect=self._dialect, compile_kwargs={"render_postcompile": True})
+        params = compiled.construct_params(parameters)
+        args = [params[k] for k in (compiled.positiontup or [])]
+        logging.debug(f"duckdb execute: {repr(str(compiled))}, {args}")
+        return txn._conn.execute(str(compiled), args)
+
+    def _execute(self, txn, sql, parameters=None):
+        self._run(txn, sql, parameters)
+
+    def _execute_script(self, txn, sql):
+        logging.debug(f"database execute_script code: {repr(sql)}")
+        txn._conn.execute(sql)
+
+    def _list_tables_query(self):
+        return sas.select(sas.column("table_name").label("name")) \
+                  .select_from(sas.table("tables", schema="information_schema")) \
+                  .where(sas.and_(sas.column("table_schema") == "main",
+                                  sas.column("table_type") == "BASE TABLE"))
+
+    def _list_views_query(self):
+        return sas.select(sas.column("table_name").label("name")) \
+                  .select_from(sas.table("tables", schema="information_schema")) \
+                  .where(sas.and_(sas.column("table_schema") == "main",
+                                  sas.column("table_type") == "VIEW"))
+
+    def _list_tables(self, txn):
+        return txn.query(self._list_tables_query(), backend="pandas")
+
+    def _list_views(self, txn):
+        return txn.query(self._list_views_query(), backend="pandas")
+
+    def _table_exists_p(self, txn, table_name):
+        sq = self._list_tables_query().subquery()
+        q = sas.select(sas.literal(1)).where(sq.c.name == table_name)
+        return self._run(txn, q).fetchone() is not None
+
+    def _read_table(self, txn, table_name, backend, kws):
+        parameters = kws.pop("parameters", None)
+        query = read_table_select(table_name, kws)
+        return self._query(txn, query, parameters, backend, kws)
+
+    def _read_table_chunked(self, txn, table_name, backend, kws):
+        parameters = kws.pop("parameters", None)
+        query = read_table_select(table_name, kws)
+        return self._query_chunked(txn, query, parameters, backend, kws)
+
+    def _drop_table(self, txn, table_name, only_if_exists):
+        self._run(txn, DropTable(table_name, if_exists=only_if_exists))
+
+    def _create_table_from_str(self, txn, table_name, sql, parameters, if_exists, kws):
+        return self._create_table_from_clause(txn, table_name, Wrap(sql), parameters, if_exists, kws)
+
+    def _create_table_from_clause(self, txn, table_name, clause, parameters, if_exists, kws):
+        if if_exists == "append":
+            if txn.table_exists_p(table_name):
+                self._run(txn, InsertIntoTableFromQuery(table_name, clause), parameters)
+                return
+
+        if_not_exists = False
+        if if_exists == "replace":
+            self._drop_table(txn, table_name, True)
+        elif if_exists == "ignore":
+            if_not_exists = True
+        self._run(txn, CreateTableAs(table_name, clause, if_not_exists=if_not_exists), parameters)
+
+    def _create_table_from_registered(self, txn, table_name, obj, if_exists):
+        view_name = f"_plpipes_registered_{self._next_key()}"
+        txn._conn.register(view_name, obj)
+        try:
+            self._create_table_from_clause(txn, table_name, Wrap(f"select * from {view_name}"),
+                                           None, if_exists, {})
+        finally:
+            txn._conn.unregister(view_name)
+
+    def _create_view(self, txn, view_name, sql, parameters, if_exists, kws):
+        if_not_exists = False
+        if if_exists == "replace":
+            self._run(txn, DropView(view_name, if_exists=True))
+        elif if_exists == "ignore":
+            if_not_exists = True
+        self._run(txn, CreateViewAs(view_name, Wrap(sql), if_not_exists=if_not_exists), parameters)
+
+    def _copy_table(self, txn, from_table_name, to_table_name, if_exists, kws):
+        return self._create_table_from_str(txn, to_table_name,
+                                           f"select * from {from_table_name}", None,
+                                           if_exists, kws)
+
+    def _export_to_file(self, txn, path, table_name, sql, format, parameters):
+        path = pathlib.Path(path)
+        format = _file_format(path, format)
+        if sql is not None:
+            source = f"({sql})"
+        else:
+            schema, name = split_table_name(table_name)
+            source = self._dialect.identifier_preparer.format_table(sas.table(name, schema=schema))
+        path.parent.mkdir(exist_ok=True, parents=True)
+        self._run(txn, f"copy {source} to {_quote_literal(path)} (format {format})", parameters)
+
+    def _import_from_file(self, txn, table_name, path, format, if_exists):
+        format = _file_format(pathlib.Path(path), format)
+        reader = "read_csv_auto" if format == "csv" else f"read_{format}"
+        self._create_table_from_str(txn, table_name,
+                                    f"select * from {reader}({_quote_literal(path)})",
+                                    None, if_exists, {})
@@ -56,16 +56,62 @@ class InfluxDB1BDriver(Driver):
         r = self._influxdb_client.query(query_text, params=parameters, **kws)
         return self._make_result(r, backend)
 
-    def _select_all_from_table_query(self, table_name):
-        table_name = table_name.replace('"', '\\"')
-        q = f'select * from "{table_name}"'
+    def _quote_identifier(self, name):
+        name = name.replace('"', '\\"')
+        return f'"{name}"'
+
+    def _quote_value(self, value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int, float)):
+            return repr(value)
+        value = str(value).replace("\\", "\\\\").replace("'", "\\'")
+        return f"'{value}'"
+
+    def _where_condition(self, where):
+        if not isinstance(where, dict):
+            return where
+        conditions = []
+        for name, value in where.items():
+            if value is None:
+                raise ValueError("InfluxDB does not support matching NULL values")
+            if not isinstance(value, (list, tuple, set, frozenset)):
+                value = [value]
+            # InfluxQL has no IN operator.
+            alternatives = [f"{self._quote_identifier(name)} = {self._quote_value(v)}" for v in value]
+            conditions.append("(" + " OR ".join(alternatives) + ")")
+        return " AND ".join(conditions)
+
+    def _read_table_query(self, table_name, kws):
+        columns = kws.pop("columns", None)
+        if columns is None:
+            columns = "*"
+        else:
+            columns = ", ".join(self._quote_identifier(c) for c in columns)
+        q = f"select {columns} from {self._quote_identifier(table_name)}"
+        where = kws.pop("where", None)
+        if where is not None:
+            q += f" where {self._where_condition(where)}"
+        order_by = kws.pop("order_by", None)
+        if order_by is not None:
+            if isinstance(order_by, str):
+                order_by = [order_by]
+            if list(order_by) not in (["time"], ["-time"]):
+                raise ValueError("InfluxDB only supports ordering by time")
+            q += " order by time desc" if order_by[0] == "-time" else " order by time asc"
+        limit = kws.pop("limit", None)
+        if limit is not None:
+            q += f" limit {int(limit)}"
+        if kws.pop("sample", None) is not None:
+            raise ValueError("InfluxDB does not support sampling rows")
         logging.debug(f"read table query: {q}")
         return q
 
     def _read_table(self, txn, table_name, backend, kws):
+        parameters = kws.pop("parameters", None)
         return self._query(txn,
-                           self._select_all_from_table_query(table_name),
-                           None, backend, kws)
+                           self._read_table_query(table_name, kws),
+                           parameters, backend, kws)
 
     def engine(self):
         return self._influxdb_client
@@ -82,6 +128,7 @@ class InfluxDB1BDriver(Driver):
         yield self._query(txn, query_text, parameters, backend, kws)
 
     def _read_table_chunked(self, txn, table_name, backend, kws):
-        query_text = self._select_all_from_table_query(table_name)
-        return self._query_chunked(txn, query_text, None, backend, kws)
+        parameters = kws.pop("parameters", None)
+        query_text = self._read_table_query(table_name, kws)
+        return self._query_chunked(txn, query_text, parameters, backend, kws)
 
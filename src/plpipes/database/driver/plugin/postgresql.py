@@ -13,6 +13,10 @@ def first(*args):
 
 @plugin
 class PostgreSQLDriver(SQLAlchemyDriver):
+
+    _default_bulk_load_method = "copy"
+    _adbc_paramstyle = "numeric_dollar"
+
     def __init__(self, name, drv_cfg):
         cs = urlparse(drv_cfg.get("connection_string", "postgresql:"))
         try:
@@ -41,3 +45,8 @@ class PostgreSQLDriver(SQLAlchemyDriver):
         logging.debug(f"SQLAlchemy PostgreSQL url: {url}")
 
         super().__init__(name, drv_cfg, url)
+
+    def _adbc_connect(self):
+        import adbc_driver_postgresql.dbapi
+        uri = self._url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return adbc_driver_postgresql.dbapi.connect(uri, autocommit=True)
@@ -1,4 +1,5 @@
 import logging
+import threading
 from plpipes.database.driver import Driver
 from plpipes.database.driver.transaction import Transaction
 import sqlalchemy as sa
@@ -6,11 +7,77 @@ import sqlalchemy.sql as sas
 from contextlib import contextmanager
 from plpipes.util.method_decorators import optional_abstract
 
-from plpipes.database.sqlext import CreateTableAs, CreateViewAs, DropTable, DropView, Wrap, InsertIntoTableFromQuery
+from plpipes.database.sqlext import CreateTableAs, CreateViewAs, DropTable, DropView, Wrap, InsertIntoTableFromQuery, read_table_select
+
+# Maps the entries under db.instance.*.pool to create_engine arguments
+_pool_args = {'size': 'pool_size',
+              'overflow': 'max_overflow',
+              'recycle': 'pool_recycle',
+              'pre_ping': 'pool_pre_ping',
+              'timeout': 'pool_timeout',
+              'use_lifo': 'pool_use_lifo'}
+
+_pool_classes = {'queue': 'QueuePool',
+                 'null': 'NullPool',
+                 'static': 'StaticPool',
+                 'singleton_thread': 'SingletonThreadPool'}
+
+class _ThreadConnections:
+    """
+    Registry of the connections kept open per thread (the sticky
+    connections and the ADBC ones).
+
+    Unlike `threading.local`, it allows closing the connections of
+    other threads, so that they can be released when the driver is
+    disposed or when their threads are gone.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, kind):
+        with self._lock:
+            entry = self._entries.get(threading.get_ident())
+            return None if entry is None else entry[1].get(kind)
+
+    def set(self, kind, conn):
+        thread = threading.current_thread()
+        with self._lock:
+            dead = self._reap()
+            self._entries.setdefault(thread.ident, (thread, {}))[1][kind] = conn
+        _close_all(dead)
+
+    def pop_current(self):
+        """Removes and returns the connections of the calling thread."""
+        with self._lock:
+            entry = self._entries.pop(threading.get_ident(), None)
+        return [] if entry is None else list(entry[1].values())
+
+    def pop_all(self):
+        """Removes and returns the connections of all the threads."""
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        return [conn for _, conns in entries.values() for conn in conns.values()]
+
+    def _reap(self):
+        # Thread identifiers may be reused once a thread is gone, so
+        # entries are also checked against the thread object.
+        dead = [ident for ident, (thread, _) in self._entries.items()
+                if not thread.is_alive()]
+        return [conn for ident in dead for conn in self._entries.pop(ident)[1].values()]
+
+def _close_all(conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception as ex:
+            logging.warning(f"Unable to close database connection: {ex}")
 
 class SQLAlchemyDriver(Driver):
 
     _transaction_factory = Transaction
+    _adbc_paramstyle = "qmark"
 
     @classmethod
     def _init_plugin(klass, key):
@@ -21,15 +88,98 @@ class SQLAlchemyDriver(Driver):
         super().__init__(name, drv_cfg)
         self._url = url
 
+        pool_cfg = drv_cfg.cd("pool")
+        kwargs = {**kwargs, **self._pool_engine_args(pool_cfg)}
+        self._sticky = pool_cfg.get("sticky", False)
+        self._thread_conns = _ThreadConnections()
+
         logging.debug(f"calling sqlalchemy.create_engine(url={url}, kwargs={kwargs})")
         self._engine = sa.create_engine(url, **kwargs)
 
+        self._pool_counters = {'connects': 0, 'checkouts': 0, 'checkins': 0}
+        self._pool_counters_lock = threading.Lock()
+        for event_name in ('connect', 'checkout', 'checkin'):
+            sa.event.listen(self._engine, event_name, self._pool_counter_cb(event_name + 's'))
+
+    def _pool_engine_args(self, pool_cfg):
+        args = {}
+        for key, arg in _pool_args.items():
+            if key in pool_cfg:
+                args[arg] = pool_cfg[key]
+        if "class" in pool_cfg:
+            class_name = pool_cfg["class"]
+            try:
+                args["poolclass"] = getattr(sa.pool, _pool_classes[class_name])
+            except KeyError:
+                raise ValueError(f"Unsupported pool class {class_name} for database instance {self._name}")
+        return args
+
+    def _pool_counter_cb(self, counter):
+        # Pool events are fired from any thread using the engine.
+        def cb(*_):
+            with self._pool_counters_lock:
+                self._pool_counters[counter] += 1
+        return cb
+
+    def _connect(self):
+        """
+        Returns a context manager yielding a connection.
+
+        In sticky mode, every thread reuses its own connection across
+        transactions. A fresh connection is used when the sticky one
+        is already inside a transaction (i.e. for nested `begin` calls).
+        """
+        if self._sticky:
+            conn = self._thread_conns.get("conn")
+            if conn is None or conn.closed or conn.invalidated:
+                conn = self._engine.connect()
+                self._thread_conns.set("conn", conn)
+            if not conn.in_transaction():
+                return _NoClose(conn)
+        return self._engine.connect()
+
     @contextmanager
     def begin(self):
-        with self._engine.connect() as conn:
+        with self._connect() as conn:
             with conn.begin():
                 yield self._transaction_factory(self, conn)
 
+    def pool_stats(self):
+        """
+        Returns statistics about the connection pool.
+
+        Returns:
+            dict: The pool class and status and counters for the
+            connections opened, checked out and checked in.
+        """
+        pool = self._engine.pool
+        with self._pool_counters_lock:
+            counters = dict(self._pool_counters)
+        stats = {'class': type(pool).__name__,
+                 'status': pool.status(),
+                 'sticky': self._sticky,
+                 **counters}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if method is not None:
+                stats[name] = method()
+        return stats
+
+    def release_thread(self):
+        """
+        Closes the connections kept open for the calling thread (the
+        sticky and ADBC ones), returning them to the pool.
+        """
+        _close_all(self._thread_conns.pop_current())
+
+    def dispose(self):
+        """
+        Closes all the connections in the pool, including the ones kept
+        open for every thread.
+        """
+        _close_all(self._thread_conns.pop_all())
+        self._engine.dispose()
+
     def _execute(self, txn, sql, parameters=None):
         txn._conn.execute(Wrap(sql), parameters)
 
@@ -38,13 +188,9 @@ class SQLAlchemyDriver(Driver):
         txn._conn.execute(Wrap(sql))
 
     def _read_table(self, txn, table_name, backend, kws):
-        try:
-            column_names = kws.pop("columns")
-            columns = [sas.column(n) for n in column_names]
-        except KeyError:
-            columns = ["*"]
-        query = sas.select(*columns).select_from(sas.table(table_name))
-        return self._query(txn, query, None, backend, kws)
+        parameters = kws.pop("parameters", None)
+        query = read_table_select(table_name, kws)
+        return self._query(txn, query, parameters, backend, kws)
 
     def _drop_table(self, txn, table_name, only_if_exists):
         txn._conn.execute(DropTable(table_name, if_exists=only_if_exists))
@@ -114,11 +260,90 @@ class SQLAlchemyDriver(Driver):
         return self._url
 
     def _read_table_chunked(self, txn, table_name, backend, kws):
-        return self._query_chunked(txn, f"select * from {table_name}", None, backend, kws)
+        parameters = kws.pop("parameters", None)
+        query = read_table_select(table_name, kws)
+        return self._query_chunked(txn, query, parameters, backend, kws)
 
-    def _pop_kw(self, kws, name, default=None):
-        try:
-            return kws.pop(name)
-        except KeyError:
-            return self._cfg.get(name, default)
+    def _streaming_sql(self, txn, sql, chunksize):
+        """
+        Prepares a query for being read in chunks.
+
+        On PostgreSQL, the statement is configured to use a server
+        side cursor, so that the client does not buffer the full
+        result set. This can be controlled with the `stream_results`
+        setting.
+
+        Other databases supporting server side cursors (i.e. MySQL)
+        do not allow running other statements on the connection until
+        the result set has been fully read, which would break sticky
+        connections and interleaved reads and writes, so there
+        `stream_results` has to be enabled explicitly.
+
+        Args:
+            txn: The transaction instance.
+            sql: The SQL query, as a string or as a SQLAlchemy expression.
+            chunksize: The number of rows per chunk.
+
+        Returns:
+            The SQLAlchemy statement.
+        """
+        statement = Wrap(sql)
+        dialect = txn._conn.dialect
+        default = dialect.name == "postgresql"
+        if dialect.supports_server_side_cursors and self._cfg.get("stream_results", default):
+            statement = statement.execution_options(stream_results=True, max_row_buffer=chunksize)
+        return statement
+
+    def _adbc_connect(self):
+        """
+        Opens an ADBC connection to the database.
+
+        Returns:
+            The ADBC DB-API connection or None when ADBC is not supported by the driver.
+        """
+        return None
+
+    def _adbc_cursor(self, txn, sql, parameters):
+        """
+        Runs a query through ADBC when it is enabled for the database
+        instance (`adbc` setting).
+
+        ADBC connections are kept per thread and are not part of the
+        SQLAlchemy transactions, so uncommitted changes would not be
+        seen by the queries run through them. Because of that, ADBC is
+        only used while the transaction has not changed the database
+        (see `Transaction.written_p`).
+
+        Returns:
+            The ADBC cursor holding the result set or None when ADBC is not available.
+        """
+        if not self._cfg.get("adbc", False) or txn.written_p():
+            return None
+        conn = self._thread_conns.get("adbc_conn")
+        if conn is None:
+            conn = self._adbc_connect()
+            if conn is None:
+                return None
+            self._thread_conns.set("adbc_conn", conn)
+        dialect = self._engine.dialect.__class__(paramstyle=self._adbc_paramstyle)
+        compiled = Wrap(sql).compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+        params = compiled.construct_params(parameters)
+        args = [params[k] for k in (compiled.positiontup or [])]
+        logging.debug(f"running query through ADBC: {compiled}")
+        cursor = conn.cursor()
+        cursor.execute(str(compiled), args)
+        return cursor
+
+
+class _NoClose:
+    """
+    Context manager yielding a connection without closing it at exit.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
 
+    def __exit__(self, *_):
+        return False
@@ -1,29 +1,41 @@
-from plpipes.database.driver.filedb import FileDBDriver
+from plpipes.database.driver.filedb import FileDBDriver, file_db_path
 
 from plpipes.database.driver.transaction import Transaction
-from plpipes.database.sqlext import Wrap
+from plpipes.database.sqlext import Wrap, AsSubquery
 
+from plpipes.util.database import sqlite_pragmas, sqlite_attachments
+from plpipes.config import cfg
+
+import functools
+import logging
 import sqlalchemy as sa
 import sqlalchemy.sql as sas
+from sqlalchemy import event
 
 import plpipes.plugin
 extension_register = plpipes.plugin.Registry("db_backend_sqlite_extension", "plpipes.database.driver.sqlite.extension")
 
-class _SQLiteMapAsPandas:
-    def __init__(self):
-        self.rows = []
+def _select_args(sql, by, args):
+    # Only the columns required are read from the database.
+    columns = [sas.column(c) for c in [*by, *args]]
+    return sas.select(*columns).select_from(AsSubquery(Wrap(sql)))
 
-    def step(self, *row):
-        self.rows.append(row)
+# The following functions are defined at the module level so that
+# they can be pickled when groups are processed in a process pool.
 
-    def finalize(self):
-        try:
-            df = pandas.DataFrame(self.rows, columns=list(args))
-            r = self.process_pandas(df)
-            return json.dumps(r)
-        except Exception as ex:
-            logging.error(f"Exception caught: {ex}")
-            raise ex
+def _select_columns(function, n_by, df):
+    # The group columns come first, see `_select_args`.
+    return function(df.iloc[:, n_by:])
+
+def _map_group(function, by, args, out, df):
+    keys = [df[c].iat[0] for c in by]
+    r = function(df if args is None else df.iloc[:, len(by):])
+    if hasattr(r, "columns"):
+        return r
+    r = list(r)
+    if out is not None and len(r) != len(out):
+        raise ValueError(f"Wrong number of items returned by function, {len(r)} found, {len(out)} expected")
+    return (*keys, *r)
 
 class SQLiteTransaction(Transaction):
     def create_function(self, name, nargs, pyfunc):
@@ -32,9 +44,29 @@ class SQLiteTransaction(Transaction):
 class SQLiteDriver(FileDBDriver):
 
     _transaction_factory = SQLiteTransaction
+    _default_bulk_load_method = "executemany"
 
     def __init__(self, name, drv_cfg):
-        super().__init__(name, drv_cfg, "sqlite")
+        sqlite_cfg = drv_cfg.cd("sqlite")
+        self._attached = sqlite_attachments(sqlite_cfg)
+        kwargs = {}
+        if self._attached:
+            # URI filenames are required for attaching databases in
+            # read-only mode.
+            kwargs["connect_args"] = {"uri": True}
+        super().__init__(name, drv_cfg, "sqlite", **kwargs)
+
+        self._pragmas = sqlite_pragmas(sqlite_cfg)
+        self._attach_mmap_size = int(sqlite_cfg.get("attach_mmap_size", 1073741824))
+        if self._pragmas or self._attached:
+            logging.debug(f"SQLite pragmas for database {name}: {self._pragmas}, attached: {self._attached}")
+            attach_uris = {schema: self._attach_uri(instance)
+                           for instance, schema in self._attached.items()}
+
+            @event.listens_for(self._engine, "connect")
+            def set_pragmas(conn, cr):
+                self._set_pragmas(conn)
+                self._attach(conn, attach_uris)
 
         self._extensions = []
         for extension_name in drv_cfg.get("extensions", []):
@@ -42,87 +74,210 @@ class SQLiteDriver(FileDBDriver):
             self._extensions.append(extension_class(self, extension_name, drv_cfg))
 
 
+    def _set_pragmas(self, conn):
+        cursor = conn.cursor()
+        try:
+            for name, value in self._pragmas:
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+    def _attach_uri(self, instance):
+        inst_cfg = cfg.cd(f"db.instance.{instance}")
+        driver = inst_cfg.get("driver", "sqlite")
+        if driver not in ("sqlite", "spatialite"):
+            raise ValueError(f"Database instance {instance} can not be attached to {self._name}, "
+                             f"it uses the {driver} driver")
+        fn = file_db_path(instance, inst_cfg, "sqlite")
+        # An empty file is a valid empty database:
+        fn.touch(exist_ok=True)
+        return fn.as_uri() + "?mode=ro"
+
+    def _attach(self, conn, attach_uris):
+        cursor = conn.cursor()
+        try:
+            for schema, uri in attach_uris.items():
+                cursor.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+                cursor.execute(f"PRAGMA {schema}.mmap_size = {self._attach_mmap_size}")
+        finally:
+            cursor.close()
+
+    def attached_schema(self, db_name):
+        """
+        Returns the schema where the given database instance is attached, if any.
+
+        Args:
+            db_name (str): The database instance name.
+
+        Returns:
+            str: The schema name or None.
+        """
+        return self._attached.get(db_name)
+
+    def _reads_only_from_schema_p(self, txn, sql, schema):
+        """
+        Checks that all the tables read by the SQL code resolve to the
+        given attached schema when the code is run in this database.
+
+        Unqualified table names are looked up in the main, temp and
+        attached schemas in order, so the code can be run in place of
+        the attached database only when the tables it reads are not
+        found anywhere else.
+
+        Args:
+            txn: The transaction instance.
+            sql (str): The SQL code.
+            schema (str): The attached schema name.
+
+        Returns:
+            bool: True when the SQL code can be run in this database.
+        """
+        from plpipes.util.sqlrefs import table_references
+        reads, _ = table_references(sql)
+        schemas = ["main", "temp", *self._attached.values()]
+        for name in reads:
+            if "." in name:
+                return False
+            for s in schemas:
+                found = txn.query_first_value(f"select count(*) from {s}.sqlite_master "
+                                              "where type in ('table', 'view') and name = :name collate nocase",
+                                              {"name": name})
+                if found and s != schema:
+                    logging.debug(f"Table {name} found in schema {s}, it shadows {schema}.{name}")
+                    return False
+                if not found and s == schema:
+                    return False
+        return True
+
+    def _drop_table(self, txn, table_name, only_if_exists):
+        if self._attached and only_if_exists and not self._table_exists_p(txn, table_name):
+            # Unqualified names are also looked up in the attached
+            # databases, which are read-only.
+            return
+        super()._drop_table(txn, table_name, only_if_exists)
+
+    def _adbc_connect(self):
+        import adbc_driver_sqlite.dbapi
+        conn = adbc_driver_sqlite.dbapi.connect(str(self._fn), autocommit=True)
+        self._set_pragmas(conn)
+        self._attach(conn, {schema: self._attach_uri(instance)
+                            for instance, schema in self._attached.items()})
+        return conn
+
     def _execute_script(self, txn, sql):
         import sqlparse
         for statement in sqlparse.split(sql):
             txn._conn.execute(Wrap(statement))
 
+    def _explain_sql(self, sql):
+        return f"EXPLAIN QUERY PLAN {sql}"
+
     def _create_function(self, txn, name, nargs, pyfunc):
         txn._conn.connection.create_function(name, nargs, pyfunc)
 
     def create_table_from_query_group_and_map(self,
                                               name, sql, by,
-                                              function, args, out,
-                                              if_exists):
-        n_out = len(out)
-
-        class _C(_SQLiteMapAsPandas):
-            def process_pandas(self, df):
-                r = function(df)
-                if len(r) != n_out:
-                    raise ValueError(f"Wrong number of items returned by function, {len(r)} found, {n_out} expected")
-                return r
-
-        key = self._next_key()
-        agg_name = f"_map_to_pandas_aggregate_XXX{key}"
-        out_name = f"_aggregate_output_column_XXX{key}"
-
-        extractors = [f"""json_extract({out_name}, "$[{ix}]") as {col_name}"""
-                      for ix, col_name in enumerate(out)]
-
-        full_sql = f"""
-        create table {name} as
-          select {','.join([*by, *extractors])}
-          from (
-            select {','.join([*by, ''])}
-                   {agg_name}({', '.join(args)}) as {out_name}
-            from (
-              {sql}
-            )
-            group by {', '.join(by)}
-         )"""
-
-        logging.debug(f"SQL code: {repr(full_sql)}")
-
-        with self.connection() as conn:
-            if if_exists:
-                self.execute(f"drop table if exists {name}")
-            conn.connection.create_aggregate(agg_name, len(args), _C)
-            try:
-                conn.execute(full_sql)
-            finally:
-                conn.connection.create_aggregate(agg_name, len(args), None)
+                                              function, args=None, out=None,
+                                              if_exists="replace", parameters=None,
+                                              workers=None, executor="thread", **kws):
+        """
+        Runs a query, splits the results in groups and creates a table
+        with the values returned by the given function for every group.
+
+        The rows arrive sorted from the database and are split into
+        dataframes in bulk (see `query_group`), which are dispatched to a
+        pool of workers (see `plpipes.database.map_groups`). The results
+        are collected and written into the new table through the
+        regular `create_table` bulk loading path.
+
+        Args:
+            name (str): The name of the table to create.
+            sql (str): The SQL query.
+            by (list): The columns to group by.
+            function (callable): Function called with the dataframe of
+                every group. It must return either a sequence of values
+                for the `out` columns or a dataframe, which is appended
+                to the table as is.
+            args (list, optional): The columns passed to the function.
+                Defaults to all of them.
+            out (list, optional): The names of the output columns.
+            if_exists (str, optional): What to do if the table already exists.
+            parameters (dict, optional): The parameters for the SQL query.
+            workers (int, optional): Maximum number of concurrent workers.
+                When neither it nor `executor` are given, the groups are
+                processed in the calling thread.
+            executor (str, optional): Either `thread` (default) or
+                `process`. In the later case, the function must be picklable.
+            **kws: Additional keyword arguments passed to `query_group`
+                (i.e. `chunksize`).
+
+        Returns:
+            int: The number of rows written.
+        """
+        import pandas
+
+        if isinstance(by, str):
+            by = [by]
+        if isinstance(if_exists, bool):
+            # Backward compatibility with the old flag argument.
+            if_exists = "replace" if if_exists else "fail"
+
+        if args is not None:
+            sql = _select_args(sql, by, args)
+        mapper = functools.partial(_map_group, function, by, args, out)
+        results = self._map_groups(sql, mapper, parameters, by, workers, executor, kws)
+
+        rows = [r for r in results if not isinstance(r, pandas.DataFrame)]
+        frames = [r for r in results if isinstance(r, pandas.DataFrame)]
+        if rows or not frames:
+            if out is None:
+                raise ValueError("out is required when the function does not return dataframes")
+            frames.insert(0, pandas.DataFrame(rows, columns=[*by, *out]))
+        df = frames[0] if len(frames) == 1 else pandas.concat(frames, ignore_index=True)
+
+        with self.begin() as txn:
+            txn.create_table(name, df, if_exists=if_exists)
+        return len(df)
 
     def query_group_and_map(self,
                             sql, by,
-                            function, args):
-
-        class _C(_MapAsPandas):
-            def process_pandas(self, df):
-                function(df)
-                return 1
-
-        key = self._next_key()
-        agg_name = f"_map_to_pandas_aggregate_XXX{_last_key}"
-
-        full_sql = f"""
-select sum({agg_name}({', '.join(args)}))
-from (
-  {sql}
-)
-group by {', '.join(by)}
-"""
-        logging.debug(f"SQL code: {repr(full_sql)}")
-
-        if exists:
-            self.execute(f"drop table if exists {name}")
-
-        with self.connection() as conn:
-            conn.connection.create_aggregate(agg_name, len(args), _C)
-            try:
-                self.query(full_sql)
-            finally:
-                conn.connection.create_aggregate(agg_name, len(args), None)
+                            function, args=None, parameters=None,
+                            workers=None, executor="thread", **kws):
+        """
+        Runs a query, splits the results in groups and calls the given
+        function for every group.
+
+        Args:
+            sql (str): The SQL query.
+            by (list): The columns to group by.
+            function (callable): Function called with the dataframe of every group.
+            args (list, optional): The columns passed to the function.
+                Defaults to all of them.
+            parameters (dict, optional): The parameters for the SQL query.
+            workers (int, optional): Maximum number of concurrent workers.
+                When not given, the groups are processed in the calling thread.
+            executor (str, optional): Either `thread` (default) or `process`.
+            **kws: Additional keyword arguments passed to `query_group`.
+
+        Returns:
+            list: The values returned by the function, in the groups order.
+        """
+        if isinstance(by, str):
+            by = [by]
+        if args is not None:
+            sql = _select_args(sql, by, args)
+            function = functools.partial(_select_columns, function, len(by))
+        return self._map_groups(sql, function, parameters, by, workers, executor, kws)
+
+    def _map_groups(self, sql, function, parameters, by, workers, executor, kws):
+        from plpipes.database import map_groups
+        with self.begin() as txn:
+            if workers is None and executor == "thread":
+                # Handing every group to a thread costs more than most
+                # functions take to process it.
+                return [function(df) for df in txn.query_group(sql, parameters, by, **kws)]
+            return map_groups(sql, function, parameters, db=txn, by=by,
+                              workers=workers, executor=executor, **kws)
 
     def _list_tables_query(self):
         return sas.select(sas.column("name")).select_from(sas.table("sqlite_master")).where(sas.column("type") == "table")
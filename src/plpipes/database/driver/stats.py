@@ -0,0 +1,94 @@
+"""
+This module implements the query statistics collected by the database
+drivers.
+
+Statements are grouped by fingerprint, that is the SQL text with
+comments removed, whitespace collapsed and literal values replaced by
+`?`, so that statements differing only in their parameters are
+accounted together.
+"""
+
+import functools
+import re
+import threading
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Returns the normalized form of the given SQL statement.
+
+    Args:
+        sql (str): The SQL statement.
+
+    Returns:
+        str: The statement fingerprint.
+    """
+    sql = _COMMENT_RE.sub(" ", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(?, ...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+class QueryStats:
+    """
+    Thread-safe accumulator of statistics per operation and statement
+    fingerprint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, operation, fp, elapsed, rows=None):
+        """
+        Records a call.
+
+        Args:
+            operation (str): The `Transaction` method called (i.e. `query`).
+            fp (str): The statement fingerprint or the table name for
+                operations not involving SQL code.
+            elapsed (float): The call latency in seconds.
+            rows (int, optional): The number of rows returned.
+        """
+        key = (operation, fp)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"operation": operation,
+                                              "fingerprint": fp,
+                                              "count": 0,
+                                              "total_time": 0.0,
+                                              "max_time": 0.0,
+                                              "rows": 0}
+            entry["count"] += 1
+            entry["total_time"] += elapsed
+            if elapsed > entry["max_time"]:
+                entry["max_time"] = elapsed
+            if rows is not None:
+                entry["rows"] += rows
+
+    def to_list(self):
+        """
+        Returns the statistics collected so far.
+
+        Returns:
+            list: A list of dictionaries with the entries `operation`,
+            `fingerprint`, `count`, `total_time`, `max_time` and `rows`,
+            sorted by total time in descending order.
+        """
+        with self._lock:
+            entries = [dict(e) for e in self._entries.values()]
+        return sorted(entries, key=lambda e: e["total_time"], reverse=True)
+
+    def reset(self):
+        """
+        Discards the statistics collected so far.
+        """
+        with self._lock:
+            self._entries.clear()
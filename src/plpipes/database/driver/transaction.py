@@ -1,3 +1,9 @@
+import logging
+
+from plpipes.profiling import db_call
+from plpipes.database import tablecache
+from plpipes.action import buildstate
+
 class Transaction:
     """
     The Transaction class represents a database transaction.
@@ -21,6 +27,8 @@ class Transaction:
         """
         self._driver = driver
         self._conn = conn
+        # Set by the methods changing the database, see `written_p`.
+        self._written = False
 
     def driver(self):
         """
@@ -35,6 +43,37 @@ class Transaction:
         """Returns the name of the database."""
         return self._driver._name
 
+    def written_p(self):
+        """
+        Checks whether the transaction may have changed the database,
+        that is, whether any of its `execute`, `execute_script`,
+        `create_table`, `create_view`, `drop_table` or `copy_table`
+        methods has been called.
+
+        Changes done directly through the connection object are not
+        tracked.
+
+        Returns:
+            bool: True if the transaction may have uncommitted changes.
+        """
+        return self._written
+
+    def _note_write(self, *table_names, replace=False):
+        self._written = True
+        for table_name in table_names:
+            buildstate.note_write(self._driver._name, table_name, replace)
+
+    def _note_sql_write(self, sql):
+        self._written = True
+        if isinstance(sql, str) and buildstate.tracking_writes_p():
+            from plpipes.util.sqlrefs import table_references
+            try:
+                _, writes = table_references(sql)
+            except Exception as ex:
+                logging.debug(f"Unable to find the tables written by SQL code: {ex}")
+                return
+            self._note_write(*writes)
+
     def connection(self):
         """
         Returns the database connection object associated with this transaction.
@@ -44,6 +83,7 @@ class Transaction:
         """
         return self._conn
 
+    @db_call(sql="sql")
     def execute(self, sql, parameters=None):
         """
         Executes an SQL statement with optional parameters.
@@ -52,8 +92,10 @@ class Transaction:
             sql (str): The SQL statement to execute.
             parameters (dict, optional): A dictionary containing values to fill in SQL statement placeholders.
         """
+        self._note_sql_write(sql)
         self._driver._execute(self, sql, parameters)
 
+    @db_call(sql="sql_script")
     def execute_script(self, sql_script):
         """
         Executes a script containing multiple SQL statements.
@@ -61,8 +103,10 @@ class Transaction:
         Args:
             sql_script (str): The SQL script to execute.
         """
+        self._note_sql_write(sql_script)
         return self._driver._execute_script(self, sql_script)
 
+    @db_call(sql="sql_or_df", table="table_name", rows_written="sql_or_df")
     def create_table(self, table_name, sql_or_df, parameters=None, if_exists="replace", **kws):
         """
         Creates a new table in the database.
@@ -73,9 +117,26 @@ class Transaction:
             parameters (dict, optional): A dictionary containing values to fill in SQL statement placeholders.
             if_exists (str, optional): How to handle the table if it already exists. Valid options are "fail", "replace", and "append".
             **kws: Additional keyword arguments to pass to the driver.
-        """
+
+        Note:
+            Tables configured to be stored in the table cache are
+            written as Parquet or Arrow files instead (see
+            `plpipes.database.tablecache`).
+        """
+        self._note_write(table_name, replace=(if_exists == "replace"))
+        fmt = tablecache.table_format(self._driver, table_name)
+        if fmt is None:
+            found = tablecache.lookup(self._driver, table_name)
+            if found is not None:
+                if if_exists == "replace":
+                    tablecache.drop(self._driver, table_name)
+                else:
+                    fmt = found[1]
+        if fmt is not None:
+            return tablecache.create_table(self, table_name, sql_or_df, parameters, if_exists, fmt)
         return self._driver._create_table(self, table_name, sql_or_df, parameters, if_exists, kws)
 
+    @db_call(sql="sql", table="view_name")
     def create_view(self, view_name, sql, parameters=None, if_exists="replace", **kws):
         """
         Creates a new view in the database.
@@ -87,8 +148,10 @@ class Transaction:
             if_exists (str, optional): How to handle the view if it already exists. Valid options are "fail", "replace", and "append".
             **kws: Additional keyword arguments to pass to the driver.
         """
+        self._note_write(view_name)
         return self._driver._create_view(self, view_name, sql, parameters, if_exists, kws)
 
+    @db_call(table="table_name", rows_read=True)
     def read_table(self, table_name, backend=None, **kws):
         """
         Reads a table from the database into a DataFrame.
@@ -101,8 +164,12 @@ class Transaction:
         Returns:
             DataFrame: A DataFrame containing the table data.
         """
+        found = tablecache.lookup(self._driver, table_name)
+        if found is not None:
+            return tablecache.read_table(self._driver, *found, backend, kws)
         return self._driver._read_table(self, table_name, backend, kws)
 
+    @db_call(table="table_name", chunked=True)
     def read_table_chunked(self, table_name, backend=None, **kws):
         """
         Reads a table from the database in chunks.
@@ -112,8 +179,12 @@ class Transaction:
             backend (optional): The backend to use for reading the table. If None, the default backend for the driver is used.
             **kws: Additional keyword arguments to pass to the backend.
         """
+        found = tablecache.lookup(self._driver, table_name)
+        if found is not None:
+            return tablecache.read_table_chunked(self._driver, *found, backend, kws)
         return self._driver._read_table_chunked(self, table_name, backend, kws)
 
+    @db_call(sql="sql", rows_read=True)
     def query(self, sql, parameters=None, backend=None, **kws):
         """
         Executes an SQL query and returns the result as a DataFrame.
@@ -129,6 +200,7 @@ class Transaction:
         """
         return self._driver._query(self, sql, parameters, backend, kws)
 
+    @db_call(sql="sql", rows_read="first")
     def query_first(self, sql, parameters=None, backend=None, **kws):
         """
         Executes an SQL query and returns the first row of the result.
@@ -144,6 +216,7 @@ class Transaction:
         """
         return self._driver._query_first(self, sql, parameters, backend, kws)
 
+    @db_call(sql="sql", rows_read="first")
     def query_first_value(self, sql, parameters=None, backend="tuple", **kws):
         """
         Executes an SQL query and returns the first value from the result.
@@ -159,6 +232,7 @@ class Transaction:
         """
         return self._driver._query_first_value(self, sql, parameters, backend, kws)
 
+    @db_call(sql="sql", chunked=True)
     def query_chunked(self, sql, parameters=None, backend=None, **kws):
         """
         Executes an SQL query and returns the result as an iterator over chunks of rows.
@@ -174,6 +248,7 @@ class Transaction:
         """
         return self._driver._query_chunked(self, sql, parameters, backend, kws)
 
+    @db_call(sql="sql", chunked=True)
     def query_group(self, sql, parameters=None, by=None, backend=None, **kws):
         """
         Executes an SQL query and returns the result as a DataFrame grouped by one or more columns.
@@ -190,6 +265,7 @@ class Transaction:
         """
         return self._driver._query_group(self, sql, parameters, by, backend, kws)
 
+    @db_call(table="table_name")
     def drop_table(self, table_name, only_if_exists=True):
         """
         Drops a table from the database.
@@ -198,8 +274,12 @@ class Transaction:
             table_name (str): The name of the table to drop.
             only_if_exists (bool, optional): If True, the table is only dropped if it exists. Otherwise, an error is raised if the table does not exist.
         """
+        self._note_write(table_name, replace=True)
+        if tablecache.drop(self._driver, table_name):
+            only_if_exists = True
         return self._driver._drop_table(self, table_name, only_if_exists)
 
+    @db_call()
     def list_tables(self):
         """
         Lists the tables in the database.
@@ -209,6 +289,7 @@ class Transaction:
         """
         return self._driver._list_tables(self)
 
+    @db_call()
     def list_views(self):
         """
         Lists the views in the database.
@@ -218,6 +299,7 @@ class Transaction:
         """
         return self._driver._list_views(self)
 
+    @db_call(table="table_name")
     def table_exists_p(self, table_name):
         """
         Checks whether a table exists in the database.
@@ -228,8 +310,11 @@ class Transaction:
         Returns:
             bool: True if the table exists, False otherwise.
         """
+        if tablecache.lookup(self._driver, table_name) is not None:
+            return True
         return self._driver._table_exists_p(self, table_name)
 
+    @db_call(table="to_table_name", rows_written=True)
     def copy_table(self, from_table_name, to_table_name, if_exists="replace", **kws):
         """
         Copies the contents of one table to another.
@@ -248,4 +333,5 @@ class Transaction:
         """
         if from_table_name == to_table_name:
             raise ValueError("source and destination tables must be different")
+        self._note_write(to_table_name, replace=(if_exists == "replace"))
         return self._driver._copy_table(self, from_table_name, to_table_name, if_exists, kws)
@@ -9,6 +9,8 @@ from sqlalchemy.sql.expression import ClauseElement, Executable, FromClause
 import sqlalchemy.sql
 import logging
 
+from plpipes.util.database import split_table_name
+
 class _CreateSomethingAs(Executable, ClauseElement):
     """
     Base class for creating a table or view from a select statement.
@@ -196,3 +198,105 @@ def Wrap(str_or_something):
     if isinstance(str_or_something, str):
         return sqlalchemy.sql.text(str_or_something)
     return str_or_something
+
+class RandomFraction(sqlalchemy.sql.expression.ColumnElement):
+    """
+    Class for generating a random number uniformly distributed in the
+    range [0, 1) on every row, using the function available in the
+    target database.
+    """
+    inherit_cache = True
+    type = sqlalchemy.Float()
+
+@compiles(RandomFraction)
+def _random_fraction(element, compiler, **kwargs):
+    return "random()"
+
+@compiles(RandomFraction, "sqlite")
+def _random_fraction_sqlite(element, compiler, **kwargs):
+    # SQLite random() returns a 64 bit signed integer.
+    return "(0.5 + random() / 18446744073709551616.0)"
+
+@compiles(RandomFraction, "mysql")
+@compiles(RandomFraction, "mariadb")
+def _random_fraction_mysql(element, compiler, **kwargs):
+    return "rand()"
+
+@compiles(RandomFraction, "mssql")
+def _random_fraction_mssql(element, compiler, **kwargs):
+    # rand() is evaluated only once per query in SQL Server unless
+    # seeded per row.
+    return "rand(checksum(newid()))"
+
+def _order_by_column(name):
+    if name.startswith("-"):
+        return sqlalchemy.sql.column(name[1:]).desc()
+    return sqlalchemy.sql.column(name)
+
+def _where_condition(where):
+    if isinstance(where, str):
+        return sqlalchemy.sql.text(where)
+    if isinstance(where, dict):
+        conditions = []
+        for name, value in where.items():
+            column = sqlalchemy.sql.column(name)
+            if value is None:
+                conditions.append(column.is_(None))
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                conditions.append(column.in_(list(value)))
+            else:
+                conditions.append(column == value)
+        return sqlalchemy.sql.and_(*conditions)
+    return where
+
+def read_table_select(table_name, kws):
+    """
+    Builds the select statement for reading a table.
+
+    The arguments `columns`, `where`, `order_by`, `limit` and `sample`
+    are taken (and removed) from `kws`:
+
+    - `columns`: list of column names to read.
+    - `where`: SQL condition as a string, SQLAlchemy expression or a
+      dictionary mapping column names to values (lists are matched
+      with `IN` and `None` with `IS NULL`).
+    - `order_by`: column name or list of column names, prefixed by `-`
+      for descending order.
+    - `limit`: maximum number of rows to read.
+    - `sample`: fraction of the rows to read, picked at random.
+
+    :param table_name: Name of the table.
+    :param kws: Dictionary of keyword arguments.
+    :return: A SQLAlchemy select statement.
+    """
+    columns = kws.pop("columns", None)
+    if columns is None:
+        columns = ["*"]
+    else:
+        columns = [sqlalchemy.sql.column(n) for n in columns]
+    schema, name = split_table_name(table_name)
+    query = sqlalchemy.sql.select(*columns).select_from(sqlalchemy.sql.table(name, schema=schema))
+
+    where = kws.pop("where", None)
+    if where is not None:
+        query = query.where(_where_condition(where))
+
+    sample = kws.pop("sample", None)
+    if sample is not None:
+        sample = float(sample)
+        if not 0 < sample <= 1:
+            raise ValueError(f"Bad value {sample} for sample, it must be a fraction in the range (0, 1]")
+        if sample < 1:
+            query = query.where(RandomFraction() < sample)
+
+    order_by = kws.pop("order_by", None)
+    if order_by is not None:
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        query = query.order_by(*[_order_by_column(n) for n in order_by])
+
+    limit = kws.pop("limit", None)
+    if limit is not None:
+        query = query.limit(int(limit))
+
+    return query
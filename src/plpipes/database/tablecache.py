@@ -0,0 +1,405 @@
+"""
+This module implements the storage of selected tables as Parquet or
+Arrow IPC files instead of inside the database.
+
+Tables are stored as directories containing one or more files (one
+per chunk written) under the `table_cache` file system section
+(defaults to `work/table-cache`), in a subdirectory per database
+instance.
+
+Which tables are stored in this way is configured per database
+instance, with the `table_cache` entry mapping table names (or `*`)
+to a format (`parquet` or `arrow`), or per action, with the
+`table_cache` entry of the action configuration, which can be a
+format name (applied to all the tables created by the action in the
+`work` database) or a mapping as above, optionally including a `db`
+entry with the name of the database instance it applies to (defaults
+to `work`).
+
+Writing a table is done with vectorized calls to `pyarrow` and
+reading it with memory mapped I/O, reading only the columns
+requested and skipping the data discarded by the given filters.
+
+Cached tables are transparent for `Transaction` methods as
+`create_table`, `read_table`, `table_exists_p` and `drop_table`, but
+they are not visible from SQL code.
+"""
+
+import contextvars
+import itertools
+import logging
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+# Maps format names to pyarrow dataset formats and file extensions:
+_formats = {"parquet": ("parquet", "parquet"),
+            "arrow": ("ipc", "arrow"),
+            "ipc": ("ipc", "arrow"),
+            "feather": ("ipc", "arrow")}
+
+_action_formats = contextvars.ContextVar("plpipes.database.tablecache.action_formats", default=None)
+
+@contextmanager
+def action_formats(spec):
+    """
+    Context manager setting the formats for the tables created inside
+    it, as given in the `table_cache` entry of an action configuration.
+
+    The formats only apply to the tables created in the `work`
+    database or in the one given in the `db` entry of the spec.
+
+    Args:
+        spec (str or dict): A format name or a dictionary mapping table names to formats.
+    """
+    if not spec:
+        yield
+        return
+    if isinstance(spec, str):
+        spec = {"*": spec}
+    else:
+        spec = dict(spec)
+    # The instance name is resolved here, so that the spec follows
+    # the redirections in place when the action runs (i.e. inside
+    # loops with isolated databases).
+    from plpipes.database import _resolve
+    db = _resolve(spec.pop("db", None))
+    token = _action_formats.set((db, spec))
+    try:
+        yield
+    finally:
+        _action_formats.reset(token)
+
+def _key(table_name):
+    return table_name.lower()
+
+def _action_spec(driver):
+    formats = _action_formats.get()
+    if formats is not None and formats[0] == driver._name:
+        return formats[1]
+    return None
+
+def active_p(driver):
+    """
+    Checks whether the table cache may be in use for the given
+    driver, so that the lookups done by the `Transaction` methods can
+    be skipped when it is not.
+
+    That is the case when some action with `table_cache` set for the
+    database instance is being run, when the database instance has `table_cache` set or
+    when the cache directory for the instance already exists (i.e.
+    it was written by an action in a previous run). The last two
+    conditions are checked only once per driver.
+
+    Args:
+        driver: The database driver.
+    """
+    if _action_spec(driver) is not None:
+        return True
+    active = driver._table_cache_active
+    if active is None:
+        active = bool(driver._cfg.to_tree("table_cache")) or _root(driver).is_dir()
+        driver._table_cache_active = active
+    return active
+
+def table_format(driver, table_name):
+    """
+    Returns the format used for storing the given table when it is
+    created or None when it is stored in the database.
+
+    Args:
+        driver: The database driver.
+        table_name (str): The table name.
+    """
+    if not active_p(driver):
+        return None
+    spec = _action_spec(driver)
+    if spec is not None:
+        fmt = spec.get(table_name, spec.get(_key(table_name), spec.get("*")))
+    else:
+        fmt = driver._cfg.get(f"table_cache.{_key(table_name)}", None)
+        if fmt is None:
+            fmt = driver._cfg.get("table_cache.*", None)
+    if fmt is None or fmt in ("db", "database"):
+        return None
+    if fmt not in _formats:
+        raise ValueError(f"Unsupported table cache format {fmt} for table {table_name}")
+    return fmt
+
+def _root(driver):
+    from plpipes.filesystem import assign_section
+    return assign_section("table_cache", relpath="table-cache") / driver._name
+
+def _table_path(driver, table_name, fmt):
+    return _root(driver) / f"{_key(table_name)}.{_formats[fmt][1]}"
+
+def lookup(driver, table_name):
+    """
+    Looks for the files of a cached table.
+
+    Returns:
+        tuple: The table directory and its format or None when the table is not cached.
+    """
+    if not active_p(driver):
+        return None
+    root = _root(driver)
+    if not root.is_dir():
+        return None
+    for fmt in ("parquet", "arrow"):
+        path = root / f"{_key(table_name)}.{_formats[fmt][1]}"
+        if path.is_dir():
+            return path, fmt
+    return None
+
+def drop(driver, table_name):
+    """
+    Removes the files of a cached table.
+
+    Returns:
+        bool: Whether the table was cached.
+    """
+    found = lookup(driver, table_name)
+    if found is None:
+        return False
+    _remove(found[0])
+    return True
+
+def _remove(path):
+    # Renaming first makes the removal atomic for readers.
+    trash = path.with_name(f".{path.name}.{uuid.uuid4().hex}.trash")
+    os.replace(path, trash)
+    shutil.rmtree(trash)
+
+def _to_arrow(data):
+    import pyarrow
+    if isinstance(data, pyarrow.Table):
+        return data
+    if isinstance(data, pyarrow.RecordBatch):
+        return pyarrow.Table.from_batches([data])
+    if hasattr(data, "to_arrow"):
+        # polars
+        return data.to_arrow()
+    if isinstance(data, list):
+        return pyarrow.Table.from_pylist(data)
+    return pyarrow.Table.from_pandas(data, preserve_index=False)
+
+def _write_file(table, path, fmt):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    if _formats[fmt][0] == "parquet":
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(table, tmp_path)
+    else:
+        import pyarrow.feather
+        pyarrow.feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+def create_table(txn, table_name, sql_or_df, parameters, if_exists, fmt):
+    """
+    Creates a cached table.
+
+    Args:
+        txn: The transaction, used for running the query when the table is created from SQL code.
+        table_name (str): The table name.
+        sql_or_df: A query, a dataframe (pandas, polars or Arrow), a list of records or an iterator over dataframes.
+        parameters (dict, optional): The parameters for the query.
+        if_exists (str): What to do if the table already exists.
+        fmt (str): The table format.
+
+    Returns:
+        int: The number of rows written.
+    """
+    driver = txn._driver
+    found = lookup(driver, table_name)
+    if found is not None:
+        if if_exists == "fail":
+            raise ValueError(f"Table {table_name} already exists")
+        if if_exists == "ignore":
+            return 0
+    elif if_exists != "append" and txn.table_exists_p(table_name):
+        if if_exists == "fail":
+            raise ValueError(f"Table {table_name} already exists")
+        if if_exists == "ignore":
+            return 0
+
+    if isinstance(sql_or_df, str) or hasattr(sql_or_df, "compile"):
+        chunks = txn.query_chunked(sql_or_df, parameters, backend="arrow")
+    elif isinstance(sql_or_df, list) or hasattr(sql_or_df, "columns") or hasattr(sql_or_df, "schema"):
+        chunks = [sql_or_df]
+    else:
+        chunks = sql_or_df
+
+    path = _table_path(driver, table_name, fmt)
+    ext = _formats[fmt][1]
+    if if_exists == "append" and found is not None:
+        path, fmt = found
+        ext = _formats[fmt][1]
+        start = len(list(path.glob(f"part-*.{ext}")))
+        target = path
+    else:
+        start = 0
+        target = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        target.mkdir(parents=True)
+        driver._table_cache_active = True
+
+    rows = 0
+    try:
+        for ix, chunk in zip(itertools.count(start), chunks):
+            table = _to_arrow(chunk)
+            _write_file(table, target / f"part-{ix:05d}.{ext}", fmt)
+            rows += table.num_rows
+        if target is not path:
+            if not any(target.iterdir()):
+                # Empty iterator, an empty table is stored so that it
+                # can still be read.
+                import pyarrow
+                _write_file(pyarrow.table({}), target / f"part-00000.{ext}", fmt)
+            if found is not None:
+                _remove(found[0])
+            os.replace(target, path)
+    except BaseException:
+        if target is not path:
+            shutil.rmtree(target, ignore_errors=True)
+        raise
+
+    # The table may also exist in the database, drop it so that it
+    # is not shadowed.
+    if found is None and if_exists != "append":
+        driver._drop_table(txn, table_name, True)
+    logging.debug(f"Table {table_name} stored as {fmt} in {path} ({rows} rows)")
+    return rows
+
+def _dataset(path, fmt):
+    import pyarrow.dataset
+    import pyarrow.fs
+    return pyarrow.dataset.dataset(str(path), format=_formats[fmt][0],
+                                   filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True))
+
+def _filter_expression(filters, where):
+    import pyarrow.compute as pc
+    if isinstance(filters, list):
+        import pyarrow.parquet
+        filters = pyarrow.parquet.filters_to_expression(filters)
+    if isinstance(where, dict):
+        conditions = []
+        for name, value in where.items():
+            field = pc.field(name)
+            if value is None:
+                conditions.append(field.is_null())
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                conditions.append(field.isin(list(value)))
+            else:
+                conditions.append(field == value)
+        where = None
+        for condition in conditions:
+            where = condition if where is None else where & condition
+    elif isinstance(where, str):
+        raise ValueError("SQL conditions can not be used for reading cached tables, "
+                         "use a dictionary or a pyarrow expression instead")
+    if filters is None:
+        return where
+    if where is None:
+        return filters
+    return filters & where
+
+def _scan_args(kws):
+    kws = dict(kws)
+    columns = kws.pop("columns", None)
+    filters = _filter_expression(kws.pop("filters", None), kws.pop("where", None))
+    order_by = kws.pop("order_by", None)
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    if order_by is not None:
+        order_by = [(n[1:], "descending") if n.startswith("-") else (n, "ascending")
+                    for n in order_by]
+    limit = kws.pop("limit", None)
+    sample = kws.pop("sample", None)
+    if sample is not None:
+        sample = float(sample)
+        if not 0 < sample <= 1:
+            raise ValueError(f"Bad value {sample} for sample, it must be a fraction in the range (0, 1]")
+        if sample == 1:
+            sample = None
+    chunksize = kws.pop("chunksize", 100000)
+    if kws:
+        raise ValueError(f"Unsupported arguments for reading cached table: {', '.join(kws)}")
+    return columns, filters, order_by, limit, sample, chunksize
+
+def _sample(table, sample):
+    if sample is None:
+        return table
+    import numpy
+    return table.filter(numpy.random.random(table.num_rows) < sample)
+
+def _convert(table, backend):
+    if backend == "arrow":
+        return table
+    if backend == "polars":
+        import polars
+        return polars.from_arrow(table)
+    if backend == "pandas":
+        return table.to_pandas()
+    raise ValueError(f"Backend {backend} is not supported for cached tables")
+
+def _backend_name(driver, backend):
+    if backend is not None:
+        return backend
+    return driver._cfg.get("backend", driver._default_backend_name)
+
+def read_table(driver, path, fmt, backend, kws):
+    """
+    Reads a cached table.
+
+    Args:
+        driver: The database driver.
+        path (pathlib.Path): The table directory.
+        fmt (str): The table format.
+        backend (str, optional): The backend used for returning the data (`pandas`, `polars` or `arrow`).
+        kws (dict): Additional keyword arguments. `columns`, `order_by`,
+            `limit` and `sample` are supported as for database tables,
+            `where` as a dictionary or as a `pyarrow.compute.Expression`,
+            and `filters` as a `pyarrow.compute.Expression` or a list of
+            tuples as accepted by `pyarrow.parquet.read_table`.
+
+    Returns:
+        The table data.
+    """
+    columns, filters, order_by, limit, sample, _ = _scan_args(kws)
+    table = _sample(_dataset(path, fmt).to_table(columns=columns, filter=filters), sample)
+    if order_by is not None:
+        table = table.sort_by(order_by)
+    if limit is not None:
+        table = table.slice(0, int(limit))
+    return _convert(table, _backend_name(driver, backend))
+
+def read_table_chunked(driver, path, fmt, backend, kws):
+    """
+    Reads a cached table in chunks of `chunksize` rows.
+
+    Accepts the same arguments as `read_table`.
+
+    Yields:
+        The table data in chunks.
+    """
+    import pyarrow
+    columns, filters, order_by, limit, sample, chunksize = _scan_args(kws)
+    backend = _backend_name(driver, backend)
+    dataset = _dataset(path, fmt)
+    if order_by is not None:
+        # Sorting requires the full table.
+        table = _sample(dataset.to_table(columns=columns, filter=filters), sample).sort_by(order_by)
+        batches = table.to_batches(max_chunksize=chunksize)
+    else:
+        batches = dataset.to_batches(columns=columns, filter=filters, batch_size=chunksize)
+    remaining = None if limit is None else int(limit)
+    for batch in batches:
+        if remaining is not None and remaining <= 0:
+            break
+        table = pyarrow.Table.from_batches([batch])
+        if order_by is None:
+            table = _sample(table, sample)
+        if remaining is not None:
+            table = table.slice(0, remaining)
+            remaining -= table.num_rows
+        if table.num_rows:
+            yield _convert(table, backend)
@@ -31,3 +31,9 @@ class CloudAccessError(CloudError):
     Exception raised for access-related errors when interacting with cloud services.
     """
     pass
+
+class ActionError(Exception):
+    """
+    Exception raised when some action in a group of actions fails.
+    """
+    pass
@@ -5,7 +5,6 @@ import os
 import logging
 import pathlib
 import datetime
-import friendlydateparser
 
 _initialized = False
 
@@ -58,11 +57,23 @@ def init(*configs, config_files=[]):
 
     list_configuration_files_not_found = []
 
+    # Every configuration directory is listed once instead of probing
+    # for every candidate file name:
+    dir_entries = {}
+    def exists(path):
+        dir = path.parent
+        if dir not in dir_entries:
+            try:
+                dir_entries[dir] = set(os.listdir(dir))
+            except OSError:
+                dir_entries[dir] = set()
+        return path.name in dir_entries[dir]
+
     global_cfg_dir = Path.home() / ".config/plpipes"
     for suffix in ("", "-secrets"):
         for ext in ("json", "yml", "yaml"):
             path = global_cfg_dir / f"plpipes{suffix}.{ext}"
-            if path.exists():
+            if exists(path):
                 cfg.merge_file(path, frame=2)
             else:
                 list_configuration_files_not_found.append(path)
@@ -86,7 +97,7 @@ def init(*configs, config_files=[]):
                         stem_part = stem       if stem_key else "common"
                         dir       = config_dir if dir_key  else default_dir
                         path      = dir / f"{stem_part}{secrets_part}{env_part}.{ext}"
-                        if path.exists():
+                        if exists(path):
                             cfg.merge_file(path, frame=2)
                         else:
                             list_configuration_files_not_found.append(path)
@@ -129,7 +140,13 @@ def init_run_as_of_date():
         None
     """
     date = cfg.setdefault('run.as_of_date', 'now')
-    as_of_date = friendlydateparser.parse_datetime(date)
+    if date == 'now':
+        # The date parser is slow to load, so it is skipped for the
+        # common case.
+        as_of_date = datetime.datetime.now()
+    else:
+        import friendlydateparser
+        as_of_date = friendlydateparser.parse_datetime(date)
     as_of_date = as_of_date.astimezone(datetime.timezone.utc)
     cfg['run.as_of_date_normalized'] = as_of_date.strftime("%Y%m%dT%H%M%SZ0")
 
@@ -0,0 +1,291 @@
+"""
+This module implements the collection of per-action statistics and
+the optional profiling of actions.
+
+When `run.stats` is enabled, a record is appended to
+`profile/actions.jsonl` under the `work` directory for every action
+run, containing:
+
+- `wall`: the wall-clock time in seconds.
+- `cpu`: the CPU time consumed by the process in seconds.
+- `peak_rss`: the peak resident set size of the process in bytes.
+- `rows_read` and `rows_written`: the rows read from and written to
+  the databases through `Transaction` methods.
+- `sql_count` and `sql_time`: the number of database calls and the
+  time spent on them.
+- `http_bytes`: the bytes transferred over HTTP by the framework
+  downloaders (and by any code calling `add`).
+
+The counters of an action include those of its children. CPU time and
+peak RSS are measured for the whole process, so they also include
+whatever other actions were run in parallel.
+
+When `run.profile` is enabled, the actions are also run under a
+profiler (`cProfile` by default, or `pyinstrument` when
+`run.profile_tool` says so) and its output is saved in
+`profile/<run_id>/` under the `work` directory. Nested actions are
+included in the profile of the outermost action run in the same
+thread.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import pathlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from plpipes.config import cfg
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_COUNTERS = ("rows_read", "rows_written", "sql_count", "sql_time", "http_bytes")
+
+_collectors = contextvars.ContextVar("plpipes.profiling.collectors", default=())
+_in_db_call = contextvars.ContextVar("plpipes.profiling.in_db_call", default=False)
+_profiling_thread = contextvars.ContextVar("plpipes.profiling.profiling_thread", default=None)
+
+_run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+_output_lock = threading.Lock()
+
+class _Collector:
+    """
+    Accumulates the counters of an action run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+
+    def add(self, counters):
+        with self._lock:
+            for k, v in counters.items():
+                self.counters[k] += v
+
+def add(**counters):
+    """
+    Adds the given values to the counters of the actions being run.
+
+    Args:
+        **counters: The counter values, i.e. `http_bytes=1024`.
+    """
+    collectors = _collectors.get()
+    for collector in collectors:
+        collector.add(counters)
+
+def _peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere:
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def _work_dir():
+    return pathlib.Path(cfg["fs.work"]) / "profile"
+
+def _save_record(record):
+    path = _work_dir() / "actions.jsonl"
+    line = json.dumps(record, default=str) + "\n"
+    with _output_lock:
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with open(path, "a", encoding="utf8") as f:
+            f.write(line)
+
+@contextmanager
+def _profiler(name):
+    thread_id = threading.get_ident()
+    if _profiling_thread.get() == thread_id:
+        # Already inside the profile of some parent action.
+        yield
+        return
+
+    tool = cfg.get("run.profile_tool", "cprofile")
+    path = _work_dir() / _run_id / name
+    path.parent.mkdir(exist_ok=True, parents=True)
+    if tool == "pyinstrument":
+        import pyinstrument
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    elif tool == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as ex:
+            logging.warning(f"Unable to profile action {name}: {ex}")
+            yield
+            return
+    else:
+        raise ValueError(f"Unsupported profiling tool {tool}")
+
+    token = _profiling_thread.set(thread_id)
+    try:
+        yield
+    finally:
+        _profiling_thread.reset(token)
+        if tool == "pyinstrument":
+            profiler.stop()
+            fn = path.with_name(name + ".html")
+            fn.write_text(profiler.output_html(), encoding="utf8")
+        else:
+            profiler.disable()
+            fn = path.with_name(name + ".prof")
+            profiler.dump_stats(fn)
+        logging.info(f"Profile for action {name} saved to {fn}")
+
+@contextmanager
+def action_stats(name):
+    """
+    Context manager collecting the statistics of an action run.
+
+    It does nothing unless `run.stats` or `run.profile` are enabled.
+
+    Args:
+        name (str): The action name.
+    """
+    profile = cfg.get("run.profile", False)
+    if not (profile or cfg.get("run.stats", False)):
+        yield
+        return
+
+    collector = _Collector()
+    token = _collectors.set(_collectors.get() + (collector,))
+    started_at = time.time()
+    wall0 = time.perf_counter()
+    cpu0 = time.process_time()
+    error = None
+    try:
+        if profile:
+            with _profiler(name):
+                yield
+        else:
+            yield
+    except BaseException as ex:
+        error = str(ex) or type(ex).__name__
+        raise
+    finally:
+        _collectors.reset(token)
+        record = {"run": _run_id,
+                  "action": name,
+                  "started_at": started_at,
+                  "wall": time.perf_counter() - wall0,
+                  "cpu": time.process_time() - cpu0,
+                  "peak_rss": _peak_rss(),
+                  **collector.counters}
+        if error is not None:
+            record["error"] = error
+        logging.debug(f"Statistics for action {name}: {record}")
+        try:
+            _save_record(record)
+        except OSError as ex:
+            logging.warning(f"Unable to save statistics for action {name}: {ex}")
+
+def _rows(obj):
+    if obj is None or isinstance(obj, (str, bytes)):
+        return 0
+    try:
+        return len(obj)
+    except TypeError:
+        return 0
+
+def _counted_chunks(chunks, collectors, elapsed, done):
+    # Database calls made by the driver while producing the chunks are
+    # part of this one.
+    rows = 0
+    try:
+        it = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            token = _in_db_call.set(True)
+            try:
+                chunk = next(it)
+            except StopIteration:
+                return
+            finally:
+                _in_db_call.reset(token)
+                chunk_time = time.perf_counter() - start
+                elapsed += chunk_time
+                counters = {"sql_time": chunk_time}
+                for collector in collectors:
+                    collector.add(counters)
+            n = _rows(chunk)
+            rows += n
+            counters = {"rows_read": n}
+            for collector in collectors:
+                collector.add(counters)
+            yield chunk
+    finally:
+        done(elapsed, rows)
+
+def db_call(sql=None, table=None, rows_read=False, chunked=False, rows_written=None):
+    """
+    Decorator for `Transaction` methods updating the database counters
+    of the actions being run and the query statistics of the driver
+    (see `Driver._record_call`).
+
+    Calls made while another database call is in progress (i.e.
+    `read_table` calling `query`) are not counted separately.
+
+    Args:
+        sql (str, optional): The name of the argument holding the SQL code.
+        table (str, optional): The name of the argument holding the table name.
+        rows_read (bool or str): Whether the method returns the rows
+            read, or `first` when it returns a single row or None.
+        chunked (bool): Whether the method returns an iterator over chunks of rows.
+        rows_written (bool or str, optional): Whether the method returns the
+            number of rows written or, when it does not, the name of the
+            argument holding them.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        operation = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(txn, *args, **kwargs):
+            collectors = _collectors.get()
+            driver = txn._driver
+            if not (collectors or driver._query_stats is not None) or _in_db_call.get():
+                return method(txn, *args, **kwargs)
+
+            arguments = signature.bind(txn, *args, **kwargs).arguments
+
+            def done(elapsed, rows):
+                driver._record_call(txn, operation, arguments.get(sql), arguments.get(table),
+                                    arguments.get("parameters"), elapsed, rows)
+
+            start = time.perf_counter()
+            token = _in_db_call.set(True)
+            try:
+                result = method(txn, *args, **kwargs)
+            finally:
+                _in_db_call.reset(token)
+            elapsed = time.perf_counter() - start
+            counters = {"sql_count": 1,
+                        "sql_time": elapsed}
+            rows = None
+            if chunked:
+                result = _counted_chunks(result, collectors, elapsed, done)
+            elif rows_read == "first":
+                rows = counters["rows_read"] = 0 if result is None else 1
+            elif rows_read:
+                rows = counters["rows_read"] = _rows(result)
+            elif rows_written is not None:
+                if isinstance(result, int) and not isinstance(result, bool):
+                    rows = counters["rows_written"] = result
+                elif isinstance(rows_written, str):
+                    rows = counters["rows_written"] = _rows(arguments.get(rows_written))
+            for collector in collectors:
+                collector.add(counters)
+            if not chunked:
+                done(elapsed, rows)
+            return result
+        return wrapper
+    return decorator
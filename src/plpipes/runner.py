@@ -102,6 +102,21 @@ def arg_parser(**kwargs):
     parser.add_argument('-e', '--env',
                         metavar="ENVIRONMENT",
                         help="Select environment (dev, pre, pro, etc.)")
+    parser.add_argument('-i', '--incremental',
+                        help="Skip actions whose inputs have not changed since the last run",
+                        action='store_true')
+    parser.add_argument('-f', '--force',
+                        help="Run all the actions even when incremental runs are enabled",
+                        action='store_true')
+    parser.add_argument('--reset-checkpoints',
+                        help="Discard the checkpoint journals of loop actions, running all their iterations again",
+                        action='store_true')
+    parser.add_argument('--stats',
+                        help="Save statistics about every action run under the work directory",
+                        action='store_true')
+    parser.add_argument('--profile',
+                        help="Run the actions under a profiler, saving its output under the work directory",
+                        action='store_true')
     return parser
 
 def parse_args_and_init(arg_parser, args=None):
@@ -144,6 +159,16 @@ def parse_args_and_init(arg_parser, args=None):
     if opts.debug:
         config_extra.append({"logging.level": "debug"})
         config_extra.append({"logging.level_file": "debug"})
+    if opts.incremental:
+        config_extra.append({"run.incremental": True})
+    if opts.force:
+        config_extra.append({"run.force": True})
+    if opts.reset_checkpoints:
+        config_extra.append({"run.reset_checkpoints": True})
+    if opts.stats:
+        config_extra.append({"run.stats": True})
+    if opts.profile:
+        config_extra.append({"run.profile": True})
 
     plpipes.init.init(*config_extra, config_files=opts.config)
 
@@ -173,10 +198,27 @@ def main(args=None):
         args: The command line arguments to parse (defaults to None).
     """
     parser = arg_parser()
+    parser.add_argument('-u', '--upstream',
+                        help="Also run the actions the given ones depend on",
+                        action='store_true')
+    parser.add_argument('--downstream',
+                        help="Also run the actions depending on the given ones",
+                        action='store_true')
+    parser.add_argument('-j', '--jobs',
+                        metavar="N",
+                        type=int,
+                        help="Run up to N actions in parallel following the dependency graph")
     parser.add_argument('actions', nargs="*",
                         metavar="ACTION", default=["default"])
     opts = parse_args_and_init(parser, args)
 
-    for action in opts.actions:
-        logging.info(f"Executing action {action}")
-        plpipes.action.run(action)
+    if opts.upstream or opts.downstream or opts.jobs:
+        logging.info(f"Executing actions {', '.join(opts.actions)} following the dependency graph")
+        plpipes.action.runner.run_with_dependencies(opts.actions,
+                                                    upstream=opts.upstream,
+                                                    downstream=opts.downstream,
+                                                    workers=opts.jobs or 1)
+    else:
+        for action in opts.actions:
+            logging.info(f"Executing action {action}")
+            plpipes.action.run(action)
@@ -1,6 +1,107 @@
+import re
+
 def split_table_name(table_name):
     if "." in table_name:
         schema, table_name = table_name.split(".", 1)
     else:
         schema = None
     return (schema, table_name)
+
+def duckdb_config(drv_cfg):
+    """
+    Returns the DuckDB configuration options for a database instance.
+
+    They are taken from the `config` entry, and the common `threads`
+    and `memory_limit` settings can also be given at the top level.
+    """
+    config = dict(drv_cfg.get("config", {}))
+    for key in ("threads", "memory_limit"):
+        if key in drv_cfg:
+            config[key] = drv_cfg[key]
+    return config
+
+# Performance presets for SQLite database instances:
+_sqlite_presets = {
+    # Safe for concurrent readers and writers, fsyncing only at
+    # checkpoints:
+    "fast": {"journal_mode": "WAL",
+             "synchronous": "NORMAL",
+             "cache_size": -65536,
+             "mmap_size": 268435456,
+             "temp_store": "MEMORY"},
+    # Gives up durability on power loss or OS crashes in exchange for
+    # speed, for databases that can be rebuilt running the pipeline
+    # again:
+    "bulk_build": {"journal_mode": "WAL",
+                   "synchronous": "OFF",
+                   "cache_size": -262144,
+                   "mmap_size": 1073741824,
+                   "temp_store": "MEMORY"}
+}
+
+# page_size must be set before changing the journal mode to WAL.
+_sqlite_pragma_names = ("page_size", "journal_mode", "synchronous",
+                        "cache_size", "mmap_size", "temp_store")
+
+def sqlite_pragmas(sqlite_cfg):
+    """
+    Returns the pragmas to be set on every connection to a SQLite
+    database instance.
+
+    They are taken from the preset named in the `preset` entry and
+    from the `page_size`, `journal_mode` (or `wal`), `synchronous`,
+    `cache_size`, `mmap_size` and `temp_store` entries, which take
+    precedence. Other pragmas can be given in the `pragmas` entry.
+
+    Returns:
+        list: A list of (name, value) pairs.
+    """
+    preset_name = sqlite_cfg.get("preset")
+    if preset_name is None:
+        pragmas = {}
+    else:
+        try:
+            pragmas = dict(_sqlite_presets[preset_name])
+        except KeyError:
+            raise ValueError(f"Unknown SQLite preset {preset_name}")
+
+    if "wal" in sqlite_cfg:
+        pragmas["journal_mode"] = "WAL" if sqlite_cfg["wal"] else "DELETE"
+    for name in _sqlite_pragma_names:
+        if name in sqlite_cfg:
+            pragmas[name] = sqlite_cfg[name]
+    pragmas.update(sqlite_cfg.to_tree("pragmas") or {})
+
+    pairs = []
+    for name in [*_sqlite_pragma_names, *sorted(set(pragmas) - set(_sqlite_pragma_names))]:
+        if name in pragmas:
+            value = str(pragmas[name])
+            if not re.match(r"^\w+$", name) or not re.match(r"^-?\w+$", value):
+                raise ValueError(f"Invalid SQLite pragma {name} = {value}")
+            pairs.append((name, value))
+    return pairs
+
+def sqlite_attachments(sqlite_cfg):
+    """
+    Returns the database instances to be attached in read-only mode to
+    every connection to a SQLite database instance.
+
+    They are taken from the `attach` entry, which can be a list of
+    instance names (attached under schemas of the same name) or a
+    dictionary mapping schema names to instance names.
+
+    Returns:
+        dict: Maps instance names to schema names.
+    """
+    attach = sqlite_cfg.to_tree("attach") or {}
+    if isinstance(attach, str):
+        attach = [attach]
+    if isinstance(attach, list):
+        attach = {name: name for name in attach}
+    attachments = {}
+    for schema, instance in attach.items():
+        if not re.match(r"^[a-z_]\w*$", schema, re.IGNORECASE) or \
+           schema.lower() in ("main", "temp"):
+            raise ValueError(f"Invalid schema name {schema} for attached database {instance}")
+        attachments[instance] = schema
+    return attachments
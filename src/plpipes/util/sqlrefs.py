@@ -0,0 +1,137 @@
+"""
+Helpers for finding out the tables referenced from SQL code.
+
+The analysis is done at the token level using sqlparse and follows a
+best-effort approach: it understands the common SELECT, INSERT,
+UPDATE, DELETE, CREATE and DROP forms, subqueries and CTEs, but it is
+not a full SQL parser.
+"""
+
+import sqlparse
+from sqlparse import tokens as T
+
+_STOP_KEYWORDS = {'SELECT', 'LATERAL', 'WHERE', 'ON', 'USING', 'GROUP BY', 'ORDER BY',
+                  'HAVING', 'LIMIT', 'UNION', 'UNION ALL', 'EXCEPT', 'INTERSECT',
+                  'WINDOW', 'SET', 'VALUES', 'AS', 'ONLY', 'NATURAL'}
+
+def _unquote(name):
+    if name[:1] in ('"', '`', '[') and len(name) > 1:
+        return name[1:-1]
+    return name
+
+def _is_punctuation(tok, value):
+    return tok.ttype in T.Punctuation and tok.value == value
+
+def _is_name(toks, ix, allow_keywords=False):
+    if ix >= len(toks):
+        return False
+    tok = toks[ix]
+    if tok.ttype in T.Name or tok.ttype in T.Literal.String.Symbol:
+        return True
+    if allow_keywords and tok.ttype in T.Keyword and tok.normalized not in _STOP_KEYWORDS:
+        # Words as "data" or "year" are tokenized as keywords but are
+        # also valid table names.
+        return not (ix + 1 < len(toks) and _is_punctuation(toks[ix + 1], '('))
+    return False
+
+def _read_name(toks, ix):
+    """
+    Reads a (maybe dotted) object name starting at the given token.
+
+    Returns:
+        A tuple (name, next_ix). name is None if no name was found.
+    """
+    parts = []
+    while _is_name(toks, ix, allow_keywords=not parts):
+        parts.append(_unquote(toks[ix].value))
+        ix += 1
+        if ix < len(toks) and _is_punctuation(toks[ix], '.'):
+            ix += 1
+        else:
+            break
+    if not parts:
+        return None, ix
+    return ".".join(parts), ix
+
+def _skip_alias(toks, ix):
+    if ix < len(toks) and toks[ix].ttype in T.Keyword and toks[ix].normalized == 'AS':
+        ix += 1
+    if _is_name(toks, ix):
+        ix += 1
+    return ix
+
+def _tokens(statement):
+    return [tok for tok in statement.flatten()
+            if not tok.is_whitespace and tok.ttype not in T.Comment]
+
+def _statement_references(toks):
+    reads, writes, ctes = set(), set(), set()
+    # For every open parenthesis, whether it belongs to a function call:
+    parens = []
+    deleting = False
+    ix = 0
+    while ix < len(toks):
+        tok = toks[ix]
+        kw = tok.normalized if tok.ttype in T.Keyword else None
+
+        if _is_punctuation(tok, '('):
+            parens.append(ix > 0 and toks[ix - 1].ttype in T.Name)
+        elif _is_punctuation(tok, ')'):
+            if parens:
+                parens.pop()
+        elif (_is_name(toks, ix) and ix + 2 < len(toks) and
+              toks[ix + 1].ttype in T.Keyword and toks[ix + 1].normalized == 'AS' and
+              _is_punctuation(toks[ix + 2], '(')):
+            ctes.add(_unquote(tok.value))
+        elif kw == 'DELETE':
+            deleting = True
+        elif kw == 'FROM' or (kw is not None and kw.endswith('JOIN')):
+            if parens and parens[-1]:
+                # FROM inside a function call, as in EXTRACT(YEAR FROM d)
+                ix += 1
+                continue
+            target = writes if deleting else reads
+            deleting = False
+            while True:
+                name, ix = _read_name(toks, ix + 1)
+                if name is None:
+                    break
+                if ix < len(toks) and _is_punctuation(toks[ix], '('):
+                    # table valued function
+                    break
+                target.add(name)
+                ix = _skip_alias(toks, ix)
+                if kw != 'FROM' or ix >= len(toks) or not _is_punctuation(toks[ix], ','):
+                    break
+            continue
+        elif kw in ('INTO', 'UPDATE', 'TABLE', 'VIEW'):
+            jx = ix + 1
+            if jx < len(toks) and toks[jx].ttype in T.Keyword and toks[jx].normalized in ('IF NOT EXISTS', 'IF EXISTS'):
+                jx += 1
+            name, jx = _read_name(toks, jx)
+            if name is not None:
+                writes.add(name)
+                ix = jx
+                continue
+        ix += 1
+
+    return reads - ctes, writes
+
+def table_references(sql):
+    """
+    Finds out the tables read and written by some SQL code.
+
+    Args:
+        sql (str): The SQL code. It may contain several statements.
+
+    Returns:
+        tuple: A pair of sets (reads, writes) with the table names found.
+        Tables written by some statement and read by a later one are
+        not reported as read.
+    """
+    reads, writes = set(), set()
+    for statement in sqlparse.parse(sql):
+        st_reads, st_writes = _statement_references(_tokens(statement))
+        reads |= st_reads - writes
+        writes |= st_writes
+    return reads, writes
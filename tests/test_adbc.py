@@ -0,0 +1,31 @@
+import pytest
+
+from plpipes.config import cfg
+import plpipes.database
+
+pytest.importorskip("adbc_driver_sqlite")
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def adbc_db(tmp_path):
+    name = "test_adbc"
+    cfg["fs.work"] = str(tmp_path)
+    cfg[f"db.instance.{name}.driver"] = "sqlite"
+    cfg[f"db.instance.{name}.adbc"] = True
+    yield name
+    plpipes.database.release(name)
+
+def test_uncommitted_writes_are_visible(adbc_db):
+    with plpipes.database.begin(adbc_db) as txn:
+        assert not txn.written_p()
+        assert txn.driver()._adbc_cursor(txn, "select 1", None) is not None
+        txn.execute("create table t as select 1 as a union all select 2")
+        assert txn.written_p()
+        assert txn.driver()._adbc_cursor(txn, "select 1", None) is None
+        assert txn.query("select * from t", backend="arrow").num_rows == 2
+
+def test_read_only_transactions_use_adbc(adbc_db):
+    plpipes.database.execute("create table t as select 1 as a", db=adbc_db)
+    with plpipes.database.begin(adbc_db) as txn:
+        assert txn.query("select * from t", backend="arrow").num_rows == 1
+        assert not txn.written_p()
@@ -0,0 +1,39 @@
+import types
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from plpipes.database.backend.pandas import _insert_copy, _insert_executemany
+
+def _conn(dialect, cursor):
+    return types.SimpleNamespace(dialect=dialect,
+                                 connection=types.SimpleNamespace(cursor=lambda: cursor))
+
+def test_insert_executemany():
+    cursor = mock.Mock()
+    table = types.SimpleNamespace(schema=None, name="t")
+    rows = [(1, "a"), (2, None)]
+    _insert_executemany(table, _conn(sqlite.dialect(paramstyle="qmark"), cursor), ["id", "name"], iter(rows))
+    cursor.executemany.assert_called_once_with('insert into t (id, name) values (?, ?)', rows)
+    cursor.close.assert_called_once()
+
+def test_insert_copy_psycopg2():
+    cursor = mock.Mock(spec=["copy_expert", "close"])
+    copied = {}
+    cursor.copy_expert.side_effect = lambda sql, buf: copied.update(sql=sql, data=buf.read())
+    table = types.SimpleNamespace(schema="s", name="t")
+    rows = [(1, "", 1.5), (2, None, float("nan")), (3, 'say "hi", bye', None)]
+    _insert_copy(table, _conn(postgresql.dialect(), cursor), ["id", "name", "x"], iter(rows))
+    assert copied["sql"] == "copy s.t (id, name, x) from stdin with (format csv, null '\\N')"
+    # Empty strings are quoted so that they are not read as NULL.
+    assert copied["data"] == ('"1","","1.5"\n'
+                              '"2",\\N,\\N\n'
+                              '"3","say ""hi"", bye",\\N\n')
+    cursor.close.assert_called_once()
+
+def test_insert_copy_psycopg3():
+    cursor = mock.MagicMock(spec=["copy", "close"])
+    table = types.SimpleNamespace(schema=None, name="t")
+    _insert_copy(table, _conn(postgresql.dialect(), cursor), ["name"], iter([("",), (None,)]))
+    cursor.copy.assert_called_once_with("copy t (name) from stdin with (format csv, null '\\N')")
+    cursor.copy.return_value.__enter__.return_value.write.assert_called_once_with('""\n\\N\n')
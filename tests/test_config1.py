@@ -73,3 +73,46 @@ def test_value_error(cfg):
         assert isinstance(ex, ValueError)
     else:
         assert False, "Exception missing!"
+
+def test_cache_invalidation():
+    cfg = plpipes.config.ConfigStack().root()
+    cfg.merge(yaml.safe_load(text))
+    with pytest.raises(KeyError):
+        cfg["foo.bar.g"]
+    cfg["foo.bar.g"] = 3
+    assert cfg["foo.bar.g"] == 3
+    assert cfg["foo.a"] == "a"
+    cfg["foo.a.x"] = 1
+    with pytest.raises(ValueError):
+        cfg["foo.a"]
+    with pytest.raises(KeyError):
+        cfg["foo.new.x"]
+    cfg.merge({"x": 9}, key="*.new")
+    assert cfg["foo.new.x"] == 9
+
+def test_overlay():
+    cfg = plpipes.config.ConfigStack().root()
+    cfg.merge(yaml.safe_load(text))
+    with cfg.overlay({"foo": {"number": 8}}):
+        assert cfg["foo.number"] == 8
+        with cfg.cd("foo").overlay() as foo:
+            foo["bar.d"] = "x"
+            assert cfg["foo.bar.d"] == "x"
+        assert cfg["foo.bar.d"] == "d"
+        with cfg.no_overlay():
+            assert cfg["foo.number"] == 7
+    assert cfg["foo.number"] == 7
+
+def test_cache_skips_values_read_before_invalidation():
+    cache = plpipes.config._LookupCache()
+    values = {"foo": 1}
+
+    def lookup(key):
+        value = values[key]
+        # A concurrent change lands while the lookup is in progress.
+        values[key] = 2
+        cache.invalidate(key)
+        return value
+
+    assert cache.get("foo", lookup) == 1
+    assert cache.get("foo", values.__getitem__) == 2
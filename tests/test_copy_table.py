@@ -0,0 +1,22 @@
+import pytest
+
+from plpipes.config import cfg
+import plpipes.database
+
+@pytest.fixture
+def dbs(tmp_path):
+    names = ["test_copy_src", "test_copy_real", "test_copy_dst"]
+    cfg["fs.work"] = str(tmp_path)
+    for name in names:
+        cfg[f"db.instance.{name}.driver"] = "sqlite"
+    yield names
+    for name in names:
+        plpipes.database.release(name)
+
+def test_copy_follows_redirections(dbs):
+    src, real, dst = dbs
+    plpipes.database.execute("create table t as select 1 as a union all select 2", db=real)
+    with plpipes.database.redirect({src: real}):
+        rows = plpipes.database.copy_table_between(src, dst, "t", chunksize=1)
+    assert rows == 2
+    assert plpipes.database.query("select count(*) as n from t", db=dst, backend="pandas")["n"][0] == 2
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+import plpipes.action.driver.dag as dag
+
+class _Recorder:
+    def __init__(self, delay=0.05, fail=()):
+        self._lock = threading.Lock()
+        self._delay = delay
+        self._fail = set(fail)
+        self.running = 0
+        self.max_running = 0
+        self.order = []
+
+    def __call__(self, name):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(self._delay)
+            if name in self._fail:
+                raise RuntimeError(f"{name} failed")
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.order.append(name)
+
+@pytest.fixture
+def recorder(monkeypatch):
+    rec = _Recorder()
+    monkeypatch.setattr(dag, "_run_action", rec)
+    monkeypatch.setattr(dag.plpipes.database, "serialize_writes_p", lambda db: db == "work")
+    return rec
+
+def test_independent_actions_run_in_parallel(recorder):
+    names = ["a", "b", "c", "d"]
+    dag.run_graph(names, {n: [] for n in names}, {n: [] for n in names}, workers=4)
+    assert recorder.max_running == 4
+    assert sorted(recorder.order) == names
+
+def test_writes_into_serialized_db(recorder):
+    names = ["a", "b", "c"]
+    writes = {"a": ["work"], "b": ["work"], "c": ["other"]}
+    dag.run_graph(names, {n: [] for n in names}, writes, workers=4)
+    assert recorder.max_running == 2
+    assert recorder.order.index("a") < recorder.order.index("b")
+
+def test_dependencies_are_honored(recorder):
+    names = ["a", "b", "c"]
+    deps = {"a": [], "b": ["a"], "c": ["a", "b"]}
+    dag.run_graph(names, deps, {n: [] for n in names}, workers=4)
+    assert recorder.order == ["a", "b", "c"]
+
+def test_cycles_are_rejected(recorder):
+    with pytest.raises(ValueError):
+        dag.run_graph(["a", "b"], {"a": ["b"], "b": ["a"]}, {"a": [], "b": []})
+
+def test_failures(monkeypatch):
+    rec = _Recorder(fail=["a"])
+    monkeypatch.setattr(dag, "_run_action", rec)
+    names = ["a", "b", "c"]
+    deps = {"a": [], "b": ["a"], "c": []}
+    with pytest.raises(dag.ActionError):
+        dag.run_graph(names, deps, {n: [] for n in names}, workers=2, on_error="continue")
+    assert sorted(rec.order) == ["a", "c"]
+
+def test_jobs_without_closure_skip_the_full_graph(recorder, monkeypatch):
+    import types
+    import plpipes.action.runner as runner
+
+    refs = {"a": (set(), {("work", "t")}),
+            "b": ({("work", "t")}, {("other", "u")})}
+    actions = {name: types.SimpleNamespace(_cfg={}, table_references=lambda r=r: r)
+               for name, r in refs.items()}
+
+    def fail(refresh=False):
+        raise AssertionError("full dependency graph built")
+
+    monkeypatch.setattr(runner, "dependency_graph", fail)
+    monkeypatch.setattr(runner, "lookup", lambda name: actions[name])
+    runner.run_with_dependencies(["b", "a"], workers=2)
+    assert recorder.order == ["a", "b"]
@@ -0,0 +1,33 @@
+import pytest
+
+from plpipes.config import cfg
+import plpipes.database
+
+pytest.importorskip("duckdb_engine")
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def duckdb_db(tmp_path):
+    name = "test_duckdb_export"
+    cfg["fs.work"] = str(tmp_path)
+    cfg[f"db.instance.{name}.driver"] = "duckdb_native"
+    yield name
+    plpipes.database.release(name)
+
+def test_export_table_and_query(duckdb_db, tmp_path):
+    import pyarrow.parquet
+    with plpipes.database.begin(duckdb_db) as txn:
+        txn.execute('create table "my events" as select range as id from range(5)')
+        txn.export_to_file(tmp_path / "events.parquet", table_name="my events")
+        txn.export_to_file(tmp_path / "odd.parquet", sql="values (1), (3)")
+        txn.export_to_file(tmp_path / "main.parquet", table_name="main.my events")
+    assert pyarrow.parquet.read_table(tmp_path / "main.parquet").num_rows == 5
+    assert pyarrow.parquet.read_table(tmp_path / "events.parquet").num_rows == 5
+    assert pyarrow.parquet.read_table(tmp_path / "odd.parquet").num_rows == 2
+
+def test_export_requires_one_source(duckdb_db, tmp_path):
+    with plpipes.database.begin(duckdb_db) as txn:
+        with pytest.raises(ValueError):
+            txn.export_to_file(tmp_path / "x.csv")
+        with pytest.raises(ValueError):
+            txn.export_to_file(tmp_path / "x.csv", table_name="t", sql="select 1")
@@ -0,0 +1,115 @@
+import datetime
+
+import pytest
+
+from plpipes.config import cfg
+from plpipes.action import buildstate
+from plpipes.action.base import Action
+from plpipes.action.driver.simple import _PythonRunner
+
+class _Counter(Action):
+    def __init__(self, name, action_cfg):
+        super().__init__(name, action_cfg)
+        self.runs = 0
+
+    def do_it(self):
+        self.runs += 1
+
+    def fingerprint(self):
+        return self._fingerprint_hash().hexdigest()
+
+def _action_cfg(klass, name, tree):
+    # Configuration entries read by actions are looked up in the
+    # global configuration when checking whether they have changed.
+    acfg = cfg.cd(f"actions.test_incremental.{name}")
+    acfg.merge(tree)
+    return klass(name, acfg)
+
+@pytest.fixture
+def incremental(tmp_path):
+    cfg["fs.work"] = str(tmp_path)
+    cfg["run.incremental"] = True
+    cfg["run.force"] = False
+    buildstate._build_state = None
+    yield
+    cfg["run.incremental"] = False
+    buildstate._build_state = None
+
+def test_skip_and_rerun(incremental):
+    producer = _action_cfg(_Counter, "producer", {"writes": ["src"]})
+    consumer = _action_cfg(_Counter, "consumer", {"reads": ["src"], "writes": ["out"]})
+
+    producer.run()
+    consumer.run()
+    consumer.run()
+    assert consumer.runs == 1
+
+    # An upstream table has changed.
+    producer._cfg["version"] = 2
+    producer.run()
+    assert producer.runs == 2
+    consumer.run()
+    assert consumer.runs == 2
+
+    # The configuration has changed.
+    consumer._cfg["threshold"] = 7
+    consumer.run()
+    consumer.run()
+    assert consumer.runs == 3
+
+    cfg["run.force"] = True
+    consumer.run()
+    assert consumer.runs == 4
+
+def test_python_script_fingerprint(tmp_path):
+    script = tmp_path / "script.py"
+    script.write_text("pass\n")
+    files = {"files": {"py": str(script)}}
+    assert _action_cfg(_PythonRunner, "undeclared", files).fingerprint() is None
+    assert _action_cfg(_PythonRunner, "declared", {**files, "reads": ["src"]}).fingerprint() is not None
+    assert _action_cfg(_PythonRunner, "explicit", {**files, "incremental": True}).fingerprint() is not None
+
+def test_canonical_json():
+    assert buildstate.canonical_json({"b": {2, 1}, "a": datetime.date(2024, 1, 1)}) == \
+        buildstate.canonical_json({"a": datetime.date(2024, 1, 1), "b": {1, 2}})
+    assert buildstate.canonical_json(datetime.date(2024, 1, 1)) != buildstate.canonical_json("2024-01-01")
+    with pytest.raises(buildstate.UnhashableValueError):
+        buildstate.canonical_json(object())
+
+def test_tables_written_by_python_actions(incremental, tmp_path):
+    from plpipes.action.runner import lookup
+    import plpipes.database
+
+    actions = tmp_path / "actions"
+    (actions / "test_incremental_py").mkdir(parents=True)
+    (actions / "test_incremental_py" / "producer.py").write_text(
+        "import plpipes.database\n"
+        "from plpipes.config import cfg\n"
+        "plpipes.database.create_table('src', [{'v': cfg['test_incremental.value']}])\n")
+    (actions / "test_incremental_py" / "consumer.table.sql").write_text("select v from src\n")
+    cfg["fs.actions"] = str(actions)
+    cfg["test_incremental.value"] = 1
+    try:
+        producer = lookup("test_incremental_py.producer")
+        consumer = lookup("test_incremental_py.consumer")
+
+        def result():
+            return plpipes.database.query_first_value("select v from consumer")
+
+        producer.run()
+        consumer.run()
+        assert result() == 1
+
+        # The producer declares no writes, it is run every time and it
+        # rewrites the table read by the consumer.
+        cfg["test_incremental.value"] = 2
+        producer.run()
+        consumer.run()
+        assert result() == 2
+
+        # Nothing has changed since, the consumer is skipped.
+        plpipes.database.execute("update consumer set v = 99")
+        consumer.run()
+        assert result() == 99
+    finally:
+        plpipes.database.release("work")
@@ -0,0 +1,135 @@
+import pytest
+
+from plpipes.config import cfg
+from plpipes.action.base import Action
+from plpipes.action.registry import register_class
+from plpipes.action.runner import lookup
+import plpipes.database
+
+DB = "test_loop"
+
+class _Writer(Action):
+    def do_it(self):
+        value = cfg["test_loop.value"]
+        n = plpipes.database.query_first_value("select count(*) from src", db=DB)
+        plpipes.database.create_table("out", [{"value": value, "n": n}], db=DB, if_exists="append")
+
+register_class("test_loop_writer", _Writer)
+
+@pytest.fixture
+def loop_db(tmp_path):
+    cfg["fs.work"] = str(tmp_path)
+    cfg["fs.actions"] = str(tmp_path / "actions")
+    cfg[f"db.instance.{DB}.driver"] = "sqlite"
+    plpipes.database.execute("create table src as select 1 as a union all select 2", db=DB)
+    yield DB
+    plpipes.database.release(DB)
+
+def _loop(name, **settings):
+    acfg = cfg.cd(f"actions.{name}")
+    acfg.merge({"type": "loop",
+                "sequence": [".write"],
+                "iterator": {"value": {"type": "values",
+                                       "target": "test_loop.value",
+                                       "values": [1, 2, 3]}},
+                "children": {"write": {"type": "test_loop_writer"}},
+                **settings})
+    return lookup(name)
+
+def _out(db):
+    return sorted(tuple(r) for r in plpipes.database.query("select value, n from out", db=db).itertuples(index=False))
+
+def test_parallel_matches_serial(loop_db):
+    _loop("test_loop_serial").run()
+    serial = _out(loop_db)
+    assert serial == [(1, 2), (2, 2), (3, 2)]
+    plpipes.database.drop_table("out", db=loop_db)
+
+    parallel = _loop("test_loop_parallel", parallel=2, isolate_db=loop_db)
+    parallel.run()
+    assert _out(loop_db) == serial
+    # Running it again gives the same result.
+    parallel.run()
+    assert _out(loop_db) == serial
+
+class _Recorder(Action):
+    calls = []
+    fail_at = None
+
+    def do_it(self):
+        call = (cfg["test_loop.outer"], cfg["test_loop.inner"])
+        if call == self.fail_at:
+            raise RuntimeError(f"Failing at {call}")
+        self.calls.append(call)
+
+register_class("test_loop_recorder", _Recorder)
+
+def _nested_loop(name):
+    def iterator(target, values):
+        return {"type": "values", "target": target, "values": values}
+    acfg = cfg.cd(f"actions.{name}")
+    acfg.merge({"type": "loop",
+                "checkpoint": True,
+                "sequence": [".inner"],
+                "iterator": {"outer": iterator("test_loop.outer", [1, 2])},
+                "children": {"inner": {"type": "loop",
+                                       "checkpoint": True,
+                                       "sequence": [".record"],
+                                       "iterator": {"inner": iterator("test_loop.inner", ["a", "b"])},
+                                       "children": {"record": {"type": "test_loop_recorder"}}}}})
+    return lookup(name)
+
+@pytest.fixture
+def recorder(tmp_path):
+    cfg["fs.work"] = str(tmp_path)
+    cfg["fs.actions"] = str(tmp_path / "actions")
+    cfg["run.reset_checkpoints"] = False
+    _Recorder.calls = []
+    _Recorder.fail_at = None
+    yield _Recorder
+    cfg["run.reset_checkpoints"] = False
+
+def test_nested_loop_checkpoints(recorder):
+    loop = _nested_loop("test_loop_nested")
+    recorder.fail_at = (2, "b")
+    with pytest.raises(RuntimeError):
+        loop.run()
+    assert recorder.calls == [(1, "a"), (1, "b"), (2, "a")]
+
+    # Resuming runs only the iterations not completed yet.
+    recorder.calls = []
+    recorder.fail_at = None
+    loop.run()
+    assert recorder.calls == [(2, "b")]
+
+    loop.run()
+    assert recorder.calls == [(2, "b")]
+
+    cfg["run.reset_checkpoints"] = True
+    recorder.calls = []
+    loop.run()
+    assert recorder.calls == [(1, "a"), (1, "b"), (2, "a"), (2, "b")]
+
+    cfg["run.reset_checkpoints"] = False
+    recorder.calls = []
+    loop.run()
+    assert recorder.calls == []
+
+class _Replacer(Action):
+    def do_it(self):
+        value = cfg["test_loop.value"]
+        plpipes.database.create_table("last", [{"value": value}], db=DB)
+
+register_class("test_loop_replacer", _Replacer)
+
+def test_parallel_replace_matches_serial(loop_db):
+    def last():
+        return plpipes.database.query("select value from last", db=loop_db)["value"].tolist()
+
+    children = {"write": {"type": "test_loop_replacer"}}
+    _loop("test_loop_replace_serial", children=children).run()
+    assert last() == [3]
+    plpipes.database.drop_table("last", db=loop_db)
+
+    _loop("test_loop_replace_parallel", children=children, parallel=2, isolate_db=loop_db).run()
+    assert last() == [3]
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from plpipes.config import cfg
+import plpipes.database
+
+@pytest.fixture
+def pooled_db(tmp_path):
+    name = "test_pool"
+    cfg["fs.work"] = str(tmp_path)
+    cfg[f"db.instance.{name}.driver"] = "sqlite"
+    cfg[f"db.instance.{name}.pool.size"] = 2
+    cfg[f"db.instance.{name}.pool.sticky"] = True
+    yield name
+    plpipes.database.release(name)
+
+def test_pool_settings(pooled_db):
+    driver = plpipes.database.lookup(pooled_db)
+    stats = driver.pool_stats()
+    assert stats["class"] == "QueuePool"
+    assert stats["size"] == 2
+    assert stats["sticky"] is True
+
+def test_sticky_connection_is_reused(pooled_db):
+    for _ in range(5):
+        plpipes.database.query_first_value("select 1", db=pooled_db)
+    stats = plpipes.database.lookup(pooled_db).pool_stats()
+    assert stats["checkouts"] == 1
+    assert stats["checkedout"] == 1
+    plpipes.database.release_thread()
+    assert plpipes.database.lookup(pooled_db).pool_stats()["checkedout"] == 0
+
+def test_sticky_connections_of_finished_threads_are_released(pooled_db):
+    driver = plpipes.database.lookup(pooled_db)
+
+    def worker():
+        plpipes.database.query_first_value("select 1", db=pooled_db)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+        t.join()
+    # The connection of every finished thread is returned when the
+    # next one is opened, so at most the last one is still out.
+    assert driver.pool_stats()["checkedout"] <= 1
+    driver.dispose()
+    assert driver.pool_stats()["checkedout"] == 0
+
+def test_pool_counters_are_thread_safe(pooled_db):
+    cfg[f"db.instance.{pooled_db}.pool.sticky"] = False
+    plpipes.database.release(pooled_db)
+    driver = plpipes.database.lookup(pooled_db)
+
+    def worker():
+        for _ in range(50):
+            plpipes.database.query_first_value("select 1", db=pooled_db)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = driver.pool_stats()
+    assert stats["checkouts"] == stats["checkins"] == 200
+
+@pytest.mark.parametrize("dialect_name, setting, expected", [
+    ("postgresql", None, True),
+    ("postgresql", False, False),
+    ("mysql", None, False),
+    ("mysql", True, True),
+])
+def test_stream_results_defaults(tmp_path, dialect_name, setting, expected):
+    import importlib
+    import types
+    dialect = importlib.import_module(f"sqlalchemy.dialects.{dialect_name}").dialect()
+    # Set by the MySQL dialects when they connect to the server.
+    dialect.supports_server_side_cursors = True
+    name = f"test_stream_{dialect_name}_{setting}".lower()
+    cfg["fs.work"] = str(tmp_path)
+    cfg[f"db.instance.{name}.driver"] = "sqlite"
+    if setting is not None:
+        cfg[f"db.instance.{name}.stream_results"] = setting
+    try:
+        driver = plpipes.database.lookup(name)
+        txn = types.SimpleNamespace(_conn=types.SimpleNamespace(dialect=dialect))
+        statement = driver._streaming_sql(txn, "select 1", 100)
+        assert statement.get_execution_options().get("stream_results", False) is expected
+    finally:
+        plpipes.database.release(name)
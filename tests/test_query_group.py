@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+_ROWS = ("with recursive r(i) as (select 0 union all select i + 1 from r where i < 99) "
+         "select i, case when i < 3 then null when i < 60 then 1 else i / 10 end as k from r")
+
+@pytest.mark.parametrize("chunksize", [1, 2, 7, 1000])
+def test_query_group_arrow(tmp_path, chunksize):
+    from plpipes.config import cfg
+    import plpipes.database
+
+    cfg["fs.work"] = str(tmp_path)
+    cfg["db.instance.test_query_group.driver"] = "sqlite"
+    try:
+        plpipes.database.execute(f"create table t as {_ROWS}", db="test_query_group")
+        groups = [(g.column("k")[0].as_py(), g.column("i").to_pylist())
+                  for g in plpipes.database.query_group("select * from t", by=["k"],
+                                                        db="test_query_group", backend="arrow",
+                                                        chunksize=chunksize)]
+        expected = [(None, list(range(3))), (1, list(range(3, 60)))]
+        expected += [(k, list(range(k * 10, k * 10 + 10))) for k in range(6, 10)]
+        assert [(k, sorted(i)) for k, i in groups] == expected
+    finally:
+        plpipes.database.release("test_query_group")
@@ -0,0 +1,42 @@
+from plpipes.database.driver.stats import fingerprint, QueryStats
+
+def test_fingerprint():
+    assert fingerprint("select *\n  from t -- comment\n where a = 1 and b = 'x''y'") == \
+        "select * from t where a = ? and b = ?"
+    assert fingerprint("select * from t2 where id in (1, 2, 3)") == \
+        "select * from t2 where id in (?, ...)"
+
+def test_query_stats():
+    stats = QueryStats()
+    stats.record("query", "select 1", 0.5, 1)
+    stats.record("query", "select 1", 1.5, 1)
+    stats.record("execute", "delete from t", 0.1)
+    first, second = stats.to_list()
+    assert first == {"operation": "query", "fingerprint": "select 1",
+                     "count": 2, "total_time": 2.0, "max_time": 1.5, "rows": 2}
+    assert second["operation"] == "execute" and second["rows"] == 0
+    stats.reset()
+    assert stats.to_list() == []
+
+def test_driver_stats(tmp_path):
+    from plpipes.config import cfg
+    import plpipes.database
+
+    name = "test_query_stats"
+    cfg["fs.work"] = str(tmp_path)
+    cfg[f"db.instance.{name}.driver"] = "sqlite"
+    try:
+        plpipes.database.create_table("a", "select 1 as v", db=name)
+        plpipes.database.create_table("a", "select 1 as v union all select 2", db=name)
+        plpipes.database.create_table("b", [{"v": 1}, {"v": 2}, {"v": 3}], db=name)
+        plpipes.database.read_table("b", db=name)
+        stats = {(e["operation"], e["fingerprint"]): e
+                 for e in plpipes.database.lookup(name).stats()}
+        assert stats["create_table", "a <- select ? as v"]["count"] == 1
+        assert stats["create_table", "a <- select ? as v union all select ?"]["count"] == 1
+        assert stats["create_table", "b <- list"]["rows"] == 3
+        assert stats["read_table", "b"]["rows"] == 3
+        # Calls made from inside other calls are not accounted.
+        assert not any(op == "query" for op, _ in stats)
+    finally:
+        plpipes.database.release(name)
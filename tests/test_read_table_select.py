@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy.dialects import sqlite
+
+from plpipes.database.sqlext import read_table_select
+
+def _sql(kws):
+    query = read_table_select("t", kws)
+    return " ".join(str(query.compile(dialect=sqlite.dialect(),
+                                      compile_kwargs={"literal_binds": True})).split())
+
+def test_read_table_select():
+    kws = {"columns": ["a", "b"], "where": {"a": [1, 2], "b": None},
+           "order_by": ["-a", "b"], "limit": 10, "chunksize": 100}
+    assert _sql(kws) == \
+        "SELECT a, b FROM t WHERE a IN (1, 2) AND b IS NULL ORDER BY a DESC, b LIMIT 10 OFFSET 0"
+    assert kws == {"chunksize": 100}
+    assert _sql({"where": "a > 3"}) == "SELECT * FROM t WHERE a > 3"
+
+def test_read_table_select_sample():
+    assert "random()" in _sql({"sample": 0.25})
+    assert _sql({"sample": 1}) == "SELECT * FROM t"
+    with pytest.raises(ValueError):
+        read_table_select("t", {"sample": 2})
+
+def test_read_table_select_qualified_name():
+    query = read_table_select("main.t", {})
+    assert str(query.compile(dialect=sqlite.dialect())) == "SELECT * \nFROM main.t"
+
+def test_read_qualified_tables(tmp_path):
+    from plpipes.config import cfg
+    import plpipes.database
+
+    cfg["fs.work"] = str(tmp_path)
+    cfg["db.instance.test_qualified_input.driver"] = "sqlite"
+    cfg["db.instance.test_qualified.driver"] = "sqlite"
+    cfg["db.instance.test_qualified.sqlite.attach"] = ["test_qualified_input"]
+    try:
+        plpipes.database.execute("create table a as select 1 as v union all select 2",
+                                 db="test_qualified_input")
+        plpipes.database.execute("create table b as select 3 as v", db="test_qualified")
+        with plpipes.database.begin("test_qualified") as txn:
+            chunks = list(txn.read_table_chunked("main.b", chunksize=1))
+            assert sum(len(c) for c in chunks) == 1
+            chunks = list(txn.read_table_chunked("test_qualified_input.a", chunksize=1))
+            assert sum(len(c) for c in chunks) == 2
+            assert len(txn.read_table("test_qualified_input.a", where={"v": 2})) == 1
+    finally:
+        plpipes.database.release("test_qualified")
+        plpipes.database.release("test_qualified_input")
@@ -0,0 +1,41 @@
+import pytest
+
+from plpipes.util.sqlrefs import table_references
+
+def test_select():
+    assert table_references("select g, sum(x) from ta group by g") == ({"ta"}, set())
+
+def test_joins():
+    reads, _ = table_references("select * from a left join b on a.id = b.id cross join main.c")
+    assert reads == {"a", "b", "main.c"}
+
+def test_from_list_with_aliases():
+    reads, _ = table_references("select * from a as x, b y, c")
+    assert reads == {"a", "b", "c"}
+
+def test_subquery():
+    reads, _ = table_references("select * from (select * from a) as t where id in (select id from b)")
+    assert reads == {"a", "b"}
+
+def test_cte():
+    reads, _ = table_references("with q as (select * from a) select * from q join b using (id)")
+    assert reads == {"a", "b"}
+
+def test_function_from():
+    reads, _ = table_references("select extract(year from d) from a")
+    assert reads == {"a"}
+
+def test_create_table():
+    assert table_references("create table if not exists t as select * from a") == ({"a"}, {"t"})
+
+def test_script():
+    sql = """
+    create table t as select * from a;
+    insert into u select * from t;
+    delete from v where x = 1;
+    update w set x = 2;
+    """
+    assert table_references(sql) == ({"a"}, {"t", "u", "v", "w"})
+
+def test_quoted():
+    assert table_references('select * from "my table"') == ({"my table"}, set())
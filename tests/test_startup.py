@@ -0,0 +1,45 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pytest
+
+# Modules that must not be loaded just by importing plpipes or the
+# runner; they are only imported when the features using them are.
+_HEAVY_MODULES = ["friendlydateparser", "httpx", "sqlalchemy", "pandas", "jinja2", "duckdb"]
+
+# Startup budget for importing the runner, in milliseconds. Timings
+# are too noisy for a regular test run, so the benchmark only runs
+# when the PLPIPES_STARTUP_BUDGET_MS environment variable is set. When
+# PLPIPES_STARTUP_HISTORY points to a file, every measurement is
+# appended to it, so that the startup time can be tracked over time.
+_BUDGET_MS = os.environ.get("PLPIPES_STARTUP_BUDGET_MS")
+
+_SRC = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+
+def _run_python(*args):
+    env = {**os.environ, "PYTHONPATH": os.path.abspath(_SRC)}
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+@pytest.mark.parametrize("module", ["plpipes", "plpipes.runner"])
+def test_no_heavy_imports(module):
+    out = _run_python("-c", f"import sys, {module}; print(' '.join(sys.modules))").stdout
+    loaded = set(out.split())
+    assert [m for m in _HEAVY_MODULES if m in loaded] == []
+
+@pytest.mark.skipif(not _BUDGET_MS, reason="PLPIPES_STARTUP_BUDGET_MS is not set")
+def test_startup_budget():
+    budget_ms = float(_BUDGET_MS)
+    err = _run_python("-X", "importtime", "-c", "import plpipes.runner").stderr
+    m = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| plpipes\.runner$", err, re.MULTILINE)
+    assert m, "import time for plpipes.runner not found"
+    ms = int(m.group(1)) / 1000
+    history = os.environ.get("PLPIPES_STARTUP_HISTORY")
+    if history:
+        with open(history, "a") as f:
+            f.write(json.dumps({"time": time.time(), "python": sys.version.split()[0],
+                                "import_ms": ms}) + "\n")
+    assert ms < budget_ms, f"plpipes.runner import took {ms:.1f}ms, budget is {budget_ms}ms"
@@ -0,0 +1,61 @@
+import pytest
+
+from plpipes.config import cfg
+from plpipes.action.base import Action
+from plpipes.action.registry import register_class
+from plpipes.action.runner import lookup
+import plpipes.database
+from plpipes.database import tablecache
+
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def cache_db(tmp_path):
+    name = "test_tablecache"
+    cfg["fs.work"] = str(tmp_path)
+    cfg["fs.actions"] = str(tmp_path / "actions")
+    cfg[f"db.instance.{name}.driver"] = "sqlite"
+    yield name
+    plpipes.database.release(name)
+
+def test_inactive_without_configuration(cache_db, monkeypatch):
+    driver = plpipes.database.lookup(cache_db)
+    assert not tablecache.active_p(driver)
+
+    def fail(driver):
+        raise AssertionError("table cache root looked up")
+
+    monkeypatch.setattr(tablecache, "_root", fail)
+    plpipes.database.create_table("t", [{"a": 1}], db=cache_db)
+    assert plpipes.database.table_exists_p("t", db=cache_db)
+    assert len(plpipes.database.read_table("t", db=cache_db)) == 1
+
+def test_tables_cached_by_actions_are_found(cache_db):
+    with tablecache.action_formats({"db": cache_db, "*": "parquet"}):
+        plpipes.database.create_table("t", [{"a": 1}, {"a": 2}], db=cache_db)
+    assert len(plpipes.database.read_table("t", db=cache_db)) == 2
+
+    # A new driver finds the cache directory written in a previous run.
+    plpipes.database.release(cache_db)
+    assert plpipes.database.table_exists_p("t", db=cache_db)
+    assert len(plpipes.database.read_table("t", db=cache_db)) == 2
+
+class _Writer(Action):
+    def do_it(self):
+        plpipes.database.create_table("t", [{"a": 1}], db="test_tablecache")
+
+register_class("test_tablecache_writer", _Writer)
+
+def test_action_formats_apply_to_one_db(cache_db):
+    driver = plpipes.database.lookup(cache_db)
+    cfg["actions.test_tablecache_work.type"] = "test_tablecache_writer"
+    cfg["actions.test_tablecache_work.table_cache"] = "parquet"
+    lookup("test_tablecache_work").run()
+    assert tablecache.lookup(driver, "t") is None
+    assert plpipes.database.table_exists_p("t", db=cache_db)
+
+    cfg.cd("actions.test_tablecache_other").merge({"type": "test_tablecache_writer",
+                                                   "table_cache": {"db": cache_db, "t": "arrow"}})
+    lookup("test_tablecache_other").run()
+    assert tablecache.lookup(driver, "t")[1] == "arrow"
+    assert len(plpipes.database.read_table("t", db=cache_db)) == 1